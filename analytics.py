@@ -0,0 +1,506 @@
+"""
+Utilization analytics over registrations.
+
+A registration of a coworking space takes a seat from its start date for the
+length of its membership (``storage.MEMBERSHIP_DAYS``; other types take one
+day). ``UtilizationAnalytics`` reports, for a date range, the seats taken per
+day by space and by membership type as utilization of the spaces' capacity:
+per space with percentiles of its daily utilization, per membership type, per
+week and per day with a rolling average.
+
+Each space and each membership type has a day calendar (``Calendar``): an
+``array`` of the seats taken minus those freed on every day. All registrations
+are loaded as columns (space, membership type, first and freed day) and
+counted into the calendars at once, with a ``Counter`` of ``group * days +
+day`` keys built by ``map(operator.add/mul/sub, ...)`` over the columns. The
+running sum of a calendar (``itertools.accumulate``) is the seats taken each
+day, and prefix sums of those give the totals of weeks and rolling windows, so
+a report costs a few passes in C over the days of each space, however many
+registrations there are. The calendars are built once and then updated by the
+routes that add registrations and spaces, through a ``stats.StatsCache``.
+Like ``build``, they only count the registrations of spaces that exist: those
+of a deleted space are counted out again.
+
+Registrations are only ever appended, in id order, so the analytics note the
+last id they counted. Commits made elsewhere (e.g. by another worker) are
+caught up with by ``catch_up``: the spaces are compared with storage and only
+the registrations after that id are read, newest first, and counted in bulk.
+"""
+
+from array import array
+from collections import Counter
+from datetime import date
+from itertools import accumulate, compress, repeat
+from operator import add, and_, is_not, mul, sub, truediv
+
+from stats import utilization
+from storage import MEMBERSHIP_DAYS
+
+# Percentiles of the daily utilization of each space, and across spaces
+PERCENTILES = (50, 90, 99)
+
+# Days a calendar grows by beyond a day that doesn't fit, so that it rarely
+# grows again
+CALENDAR_SLACK = 366
+
+# Registrations read per page when catching up with other workers
+CATCH_UP_PAGE_SIZE = 1000
+
+
+def percentile(sorted_values, percent):
+    """Return the ``percent`` percentile (nearest rank) of ``sorted_values``."""
+    if not sorted_values:
+        return 0
+    rank = -(-len(sorted_values) * percent // 100)  # ceiling
+    return sorted_values[max(rank, 1) - 1]
+
+
+def prefix_sums(values):
+    """Return ``[0, values[0], values[0] + values[1], ...]``."""
+    return array("q", accumulate(values, initial=0))
+
+
+def _zeros(count):
+    return array("i", bytes(4 * count))
+
+
+def _ordinal(start_date):
+    """Return the date ordinal of a ``YYYY-MM-DD`` date, or None."""
+    try:
+        return date.fromisoformat(start_date or "").toordinal()
+    except ValueError:
+        return None
+
+
+def day_counts(groups, days):
+    """
+    Count the ``(group, day)`` pairs of the columns ``groups`` and ``days``
+    (not empty). Returns ``(counts, origin, stride)``: ``counts`` maps
+    ``group * stride + day - origin`` to the number of pairs.
+    """
+    origin = min(days)
+    stride = max(days) - origin + 1
+    keys = map(add, map(mul, groups, repeat(stride)), map(sub, days, repeat(origin)))
+    return Counter(keys), origin, stride
+
+
+class Calendar:
+    """Counts by group and day (date ordinal), an ``array`` per group."""
+
+    def __init__(self):
+        self.origin = 0  # date ordinal of the first day
+        self.length = 0
+        self.groups = []
+
+    def add(self, group, day, count=1):
+        self._cover(group, day, day)
+        self.groups[group][day - self.origin] += count
+
+    def add_counts(self, counted, count=1):
+        """Add the ``day_counts()`` ``counted`` (``count=-1`` subtracts them)."""
+        counts, origin, stride = counted
+        group_count = max(counts) // stride + 1
+        self._cover(group_count - 1, origin, origin + stride - 1)
+        length = self.length
+        offset = origin - self.origin
+        dense = array("q", bytes(8 * group_count * length))
+        for key, occurrences in counts.items():
+            group, day = divmod(key, stride)
+            dense[group * length + offset + day] = occurrences
+        operator = add if count > 0 else sub
+        self.groups[:group_count] = [
+            array(
+                "i",
+                map(
+                    operator,
+                    self.groups[group],
+                    dense[group * length : (group + 1) * length],
+                ),
+            )
+            for group in range(group_count)
+        ]
+
+    def _cover(self, group, first, last):
+        """Grow the calendar to count ``group`` from day ``first`` to ``last``."""
+        while group >= len(self.groups):
+            self.groups.append(_zeros(self.length))
+        if not self.length:
+            self.origin = first
+        before = after = 0
+        if first < self.origin:
+            before = self.origin - first + CALENDAR_SLACK
+        if last >= self.origin + self.length:
+            after = last + CALENDAR_SLACK - (self.origin + self.length)
+        if before or after:
+            self.groups = [
+                _zeros(before) + counts + _zeros(after) for counts in self.groups
+            ]
+            self.origin -= before
+            self.length += before + after
+
+    def total(self, group, first, stop):
+        """Return the sum of the counts of ``group`` from ``first`` to ``stop``."""
+        if group >= len(self.groups):
+            return 0
+        low = max(first - self.origin, 0)
+        high = max(stop - self.origin, 0)
+        return sum(self.groups[group][low:high])
+
+    def count(self, group):
+        """Return the sum of all the counts of ``group``."""
+        return sum(self.groups[group]) if group < len(self.groups) else 0
+
+    def running(self, group, first, stop):
+        """
+        Return the running sums of the counts of ``group`` (from the start of
+        the calendar) on the days from ``first`` to ``stop``.
+        """
+        days = stop - first
+        if group >= len(self.groups):
+            return _zeros(days)
+        counts = self.groups[group]
+        low = min(max(first - self.origin, 0), self.length)
+        high = min(max(stop - self.origin, 0), self.length)
+        running = accumulate(counts[low:high], initial=sum(counts[:low]))
+        next(running)
+        # Nothing is counted before or after the calendar
+        before = min(max(self.origin - first, 0), days)
+        after = days - before - max(high - low, 0)
+        return _zeros(before) + array("i", running) + _zeros(after)
+
+
+class UtilizationAnalytics:
+    """Seats taken by day in each space and by each membership type."""
+
+    def __init__(self, revision=None):
+        self.revision = revision
+        self.spaces = []  # index -> {"space_id", "name", "capacity"}, None if deleted
+        self.space_index = {}  # space id -> index
+        self.membership_types = []  # index -> membership type
+        self.membership_index = {}  # membership type -> index
+        # Seats taken minus seats freed, and registrations starting, each day
+        self.space_changes = Calendar()
+        self.space_starts = Calendar()
+        self.membership_changes = Calendar()
+        self.membership_starts = Calendar()
+        # Registrations up to this id are counted
+        self.last_registration_id = 0
+
+    @classmethod
+    def build(cls, storage):
+        """Load the registrations of every space in ``storage``."""
+        analytics = cls(storage.revision())
+        for space_id, space in storage.list_spaces().items():
+            analytics.set_space(space_id, space)
+        columns = [
+            (
+                registration["space_id"],
+                registration.get("membership_type"),
+                registration.get("start_date"),
+            )
+            for registration in analytics._seen(storage.iter_registrations())
+            if not registration.get("is_meeting_room")
+        ]
+        if columns:
+            analytics._add_all(*zip(*columns))
+        return analytics
+
+    def catch_up(self, storage):
+        """
+        Count what was committed to ``storage`` since these analytics were
+        updated. Returns False if registrations were replaced rather than
+        appended, and the analytics must be built again.
+        """
+        page, before_id = storage.page_registrations(CATCH_UP_PAGE_SIZE)
+        if (page[0]["id"] if page else 0) < self.last_registration_id:
+            return False
+        new = []
+        while True:
+            unseen = [
+                registration
+                for registration in page
+                if registration["id"] > self.last_registration_id
+            ]
+            new += unseen
+            if before_id is None or len(unseen) < len(page):
+                break
+            page, before_id = storage.page_registrations(CATCH_UP_PAGE_SIZE, before_id)
+
+        spaces = storage.list_spaces()
+        for space in self.spaces:
+            if space is not None and space["space_id"] not in spaces:
+                self.set_space(
+                    space["space_id"],
+                    None,
+                    storage.iter_registrations(space_id=space["space_id"]),
+                )
+        for space_id, space in spaces.items():
+            index = self.space_index.get(space_id)
+            if index is None or self.spaces[index] is None:
+                registrations = storage.iter_registrations(space_id=space_id)
+            else:
+                registrations = ()
+            self.set_space(space_id, space, registrations)
+
+        columns = [
+            (
+                registration["space_id"],
+                registration.get("membership_type"),
+                registration.get("start_date"),
+            )
+            for registration in self._seen(reversed(new))
+            if not registration.get("is_meeting_room")
+        ]
+        if columns:
+            self._add_all(*zip(*columns))
+        return True
+
+    def _seen(self, registrations):
+        """Yield ``registrations`` (in id order), noting the last id."""
+        for registration in registrations:
+            self.last_registration_id = registration["id"]
+            yield registration
+
+    def set_space(self, space_id, space, registrations=()):
+        """
+        Account for a new, changed or (with ``space=None``) deleted space. When
+        a space is deleted or added (back), its ``registrations`` in storage
+        (those up to ``last_registration_id``) are counted out of or into the
+        calendars.
+        """
+        index = self.space_index.get(space_id)
+        existed = index is not None and self.spaces[index] is not None
+        if space is not None:
+            space = {
+                "space_id": space_id,
+                "name": space["name"],
+                "capacity": space["capacity"],
+            }
+        if index is None:
+            if space is None:
+                return
+            index = self.space_index[space_id] = len(self.spaces)
+            self.spaces.append(None)
+        if existed and space is None:
+            self._add_registrations(registrations, -1)
+        self.spaces[index] = space
+        if space is not None and not existed:
+            self._add_registrations(registrations)
+
+    def add_registration(self, registration):
+        """Account for a new registration, once; meeting rooms are left out."""
+        if registration["id"] > self.last_registration_id:
+            self.last_registration_id = registration["id"]
+            self._add_registrations([registration])
+
+    def _add_registrations(self, registrations, count=1):
+        for registration in registrations:
+            if registration["id"] > self.last_registration_id:
+                break
+            if not registration.get("is_meeting_room"):
+                self._add(
+                    registration["space_id"],
+                    registration.get("membership_type"),
+                    registration.get("start_date"),
+                    count,
+                )
+
+    def _membership(self, membership_type):
+        """Return the index of ``membership_type``, adding it if it's new."""
+        membership_type = membership_type or "unspecified"
+        membership = self.membership_index.get(membership_type)
+        if membership is None:
+            membership = len(self.membership_types)
+            self.membership_index[membership_type] = membership
+            self.membership_types.append(membership_type)
+        return membership
+
+    def _add(self, space_id, membership_type, start_date, count=1):
+        index = self.space_index.get(space_id)
+        if index is None or self.spaces[index] is None:
+            return
+        start = _ordinal(start_date)
+        if start is None:
+            return
+        membership = self._membership(membership_type)
+        end = start + MEMBERSHIP_DAYS.get(membership_type, 1)
+
+        self.space_changes.add(index, start, count)
+        self.space_changes.add(index, end, -count)
+        self.space_starts.add(index, start, count)
+        self.membership_changes.add(membership, start, count)
+        self.membership_changes.add(membership, end, -count)
+        self.membership_starts.add(membership, start, count)
+
+    def _add_all(self, space_ids, membership_types, start_dates):
+        """
+        ``_add`` registrations given as columns of space ids, membership types
+        and start dates: their few distinct values are looked up once, and the
+        columns are counted into the calendars in bulk.
+        """
+        existing = {
+            space_id: index
+            for space_id, index in self.space_index.items()
+            if self.spaces[index] is not None
+        }
+        spaces = list(map(existing.get, space_ids))
+        ordinals = {start_date: _ordinal(start_date) for start_date in set(start_dates)}
+        starts = list(map(ordinals.__getitem__, start_dates))
+        valid = list(
+            map(
+                and_,
+                map(is_not, spaces, repeat(None)),
+                map(is_not, starts, repeat(None)),
+            )
+        )
+        if not all(valid):
+            spaces = list(compress(spaces, valid))
+            starts = list(compress(starts, valid))
+            membership_types = list(compress(membership_types, valid))
+        if not spaces:
+            return
+        distinct_types = set(membership_types)
+        indexes = {
+            membership_type: self._membership(membership_type)
+            for membership_type in distinct_types
+        }
+        durations = {
+            membership_type: MEMBERSHIP_DAYS.get(membership_type, 1)
+            for membership_type in distinct_types
+        }
+        memberships = array("q", map(indexes.__getitem__, membership_types))
+        spaces = array("q", spaces)
+        starts = array("q", starts)
+        ends = array(
+            "q", map(add, starts, map(durations.__getitem__, membership_types))
+        )
+
+        space_starts = day_counts(spaces, starts)
+        self.space_changes.add_counts(space_starts)
+        self.space_changes.add_counts(day_counts(spaces, ends), -1)
+        self.space_starts.add_counts(space_starts)
+        membership_starts = day_counts(memberships, starts)
+        self.membership_changes.add_counts(membership_starts)
+        self.membership_changes.add_counts(day_counts(memberships, ends), -1)
+        self.membership_starts.add_counts(membership_starts)
+
+    def report(self, first_day, last_day, window=7):
+        """
+        Return the utilization of the spaces from ``first_day`` to
+        ``last_day`` (dates, inclusive), with a rolling average over
+        ``window`` days. ``registrations`` count those starting in the range.
+        """
+        first = first_day.toordinal()
+        stop = last_day.toordinal() + 1
+        days = stop - first
+
+        capacity = 0
+        occupied = array("q", bytes(8 * days))
+        spaces = []
+        for index, space in enumerate(self.spaces):
+            if space is None:
+                continue
+            taken = self.space_changes.running(index, first, stop)
+            capacity += space["capacity"]
+            occupied = array("q", map(add, occupied, taken))
+            daily = sorted(taken)
+            seat_days = sum(daily)
+            spaces.append(
+                {
+                    **space,
+                    "registrations": self.space_starts.total(index, first, stop),
+                    "seat_days": seat_days,
+                    "utilization": utilization(seat_days, space["capacity"] * days),
+                    **{
+                        f"p{percent}": utilization(
+                            percentile(daily, percent), space["capacity"]
+                        )
+                        for percent in PERCENTILES
+                    },
+                    "peak": utilization(daily[-1], space["capacity"]),
+                }
+            )
+        totals = prefix_sums(occupied)
+        space_utilization = sorted(space["utilization"] for space in spaces)
+
+        # Membership types with no registrations left (all of deleted spaces) are
+        # left out, as they are by ``build``
+        memberships = [
+            (index, membership_type)
+            for index, membership_type in enumerate(self.membership_types)
+            if self.membership_starts.count(index)
+        ]
+        membership_totals = {
+            index: prefix_sums(self.membership_changes.running(index, first, stop))
+            for index, _ in memberships
+        }
+        membership_types = [
+            {
+                "membership_type": membership_type,
+                "registrations": self.membership_starts.total(index, first, stop),
+                "seat_days": membership_totals[index][-1],
+                "utilization": utilization(
+                    membership_totals[index][-1], capacity * days
+                ),
+                "share": utilization(membership_totals[index][-1], totals[-1]),
+            }
+            for index, membership_type in memberships
+        ]
+
+        # Weeks start on Mondays (the first may be partial); ordinal 1 is a Monday
+        bounds = [0, *range((1 - first) % 7 or 7, days, 7), days]
+        weeks = []
+        for low, high in zip(bounds, bounds[1:]):
+            week_capacity = capacity * (high - low)
+            weeks.append(
+                {
+                    "week": str(date.fromordinal(first + low)),
+                    "days": high - low,
+                    "seat_days": totals[high] - totals[low],
+                    "utilization": utilization(
+                        totals[high] - totals[low], week_capacity
+                    ),
+                    "by_membership_type": {
+                        membership_type: utilization(
+                            membership_totals[index][high]
+                            - membership_totals[index][low],
+                            week_capacity,
+                        )
+                        for index, membership_type in memberships
+                    },
+                }
+            )
+
+        # Average of the last ``window`` days (fewer at the start)
+        window = max(1, min(window, days))
+        lagged = [*repeat(0, window - 1), *totals[: days - window + 1]]
+        divisors = [*range(1, window), *repeat(window, days - window + 1)]
+        rolling = map(truediv, map(sub, totals[1:], lagged), divisors)
+        daily = [
+            {
+                "date": str(date.fromordinal(first + offset)),
+                "occupied": taken,
+                "utilization": utilization(taken, capacity),
+                "rolling_utilization": utilization(average, capacity),
+            }
+            for offset, taken, average in zip(range(days), occupied, rolling)
+        ]
+
+        return {
+            "from": str(first_day),
+            "to": str(last_day),
+            "days": days,
+            "window": window,
+            "capacity": capacity,
+            "registrations": sum(space["registrations"] for space in spaces),
+            "seat_days": totals[-1],
+            "utilization": utilization(totals[-1], capacity * days),
+            "space_percentiles": {
+                f"p{percent}": percentile(space_utilization, percent)
+                for percent in PERCENTILES
+            },
+            "spaces": spaces,
+            "membership_types": membership_types,
+            "weeks": weeks,
+            "daily": daily,
+        }
@@ -1,53 +1,308 @@
-import json
+import atexit
 import os
 import pathlib
-from datetime import datetime
-from functools import wraps
-
-from flask import Flask, flash, redirect, render_template, request, session, url_for
+import time
+from datetime import datetime, timedelta, timezone
+from functools import partial, wraps
+
+import click
+from flask import (
+    Flask,
+    Response,
+    before_render_template,
+    flash,
+    g,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    session,
+    template_rendered,
+    url_for,
+)
+
+import export
+import importer
+import serialization
+from analytics import UtilizationAnalytics
+from availability import RoomAvailability
+from bookings import BookingConflictError, booking_interval, free_slots
+from events import SeatEvents, TooManySubscribersError, format_event
+from journal_storage import JournalStorage
+from metrics import Metrics
+from page_cache import ALL, PageCache
+from seat_groups import find_groups
+from sharded_storage import ShardedStorage
+from sharded_storage import migrate_json as migrate_json_to_shards
+from snapshot_storage import SnapshotStorage
+from snapshot_storage import migrate_json as migrate_json_to_snapshot
+from sqlite_storage import SqliteStorage, migrate_json
+from stats import DashboardStats, StatsCache, utilization
+from storage import JsonStorage, SeatUnavailableError, new_space, thaw
+from timeseries import TimeSeriesStore
 
 app = Flask(__name__)
 app.secret_key = "your-secret-key-change-in-production"
+app.jinja_env.globals["utilization"] = utilization
 
 # Local data storage
 DATA_DIRECTORY = pathlib.Path(os.environ.get("DATA_DIRECTORY", "data"))
 DATA_FILE = DATA_DIRECTORY / "data.json"
+SQLITE_FILE = DATA_DIRECTORY / "data.sqlite3"
+JOURNAL_FILE = DATA_DIRECTORY / "data.journal"
+SHARDS_DIRECTORY = DATA_DIRECTORY / "shards"
+SNAPSHOT_FILE = DATA_DIRECTORY / "data.snapshot"
+OCCUPANCY_HISTORY_DIRECTORY = DATA_DIRECTORY / "occupancy"
 os.makedirs(DATA_DIRECTORY, exist_ok=True)
 
+# Storage backend: "json" (single data.json file), "journal" (data.json
+# snapshot plus an append-only journal of registrations), "sharded" (a file per
+# space, meeting room and segment of registrations), "snapshot" (a memory-mapped
+# file shared by all workers) or "sqlite"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+
+# Format the JSON backends write data.json (or the shards) in: "json" (compact), "pretty-json"
+# or "binary"; any of them is read
+DATA_FORMAT = os.environ.get("DATA_FORMAT", "json")
+
+# Seconds to merge saves before writing them to disk (0 writes on every save)
+SAVE_FLUSH_INTERVAL = float(os.environ.get("SAVE_FLUSH_INTERVAL", "0"))
+
+# Journal size in bytes after which it is folded into a new data.json snapshot
+JOURNAL_COMPACT_BYTES = int(os.environ.get("JOURNAL_COMPACT_BYTES", 1024 * 1024))
+
+# Registrations per page of the registrations listing, and the most a client
+# may ask for with ?limit=
+REGISTRATIONS_PAGE_SIZE = int(os.environ.get("REGISTRATIONS_PAGE_SIZE", 50))
+REGISTRATIONS_MAX_PAGE_SIZE = 500
+
+# Seconds between checks for seat changes made by other workers, and between
+# keepalive comments on idle seat event streams
+SEAT_EVENTS_POLL_INTERVAL = float(os.environ.get("SEAT_EVENTS_POLL_INTERVAL", "1"))
+SEAT_EVENTS_KEEPALIVE = 15
+# Open seat event streams a worker serves at most; more are refused with 503
+SEAT_EVENTS_MAX_STREAMS = int(os.environ.get("SEAT_EVENTS_MAX_STREAMS", 500))
+
+# Largest group that may search for adjacent seats, and the blocks of seats
+# offered by default and at most (?limit=)
+SEAT_GROUP_MAX_SIZE = 50
+SEAT_GROUPS_LIMIT = 5
+SEAT_GROUPS_MAX_LIMIT = 20
+
+# Opening hours of meeting rooms and the length of the slots they are booked in
+BOOKING_OPENS = os.environ.get("BOOKING_OPENS", "08:00")
+BOOKING_CLOSES = os.environ.get("BOOKING_CLOSES", "20:00")
+BOOKING_SLOT_MINUTES = int(os.environ.get("BOOKING_SLOT_MINUTES", 30))
+
+# Longest date range of a meeting room availability search, in days
+AVAILABILITY_MAX_DAYS = 92
+
+# Days of occupancy history returned by default for each bucket size, and the
+# most buckets one response may have
+OCCUPANCY_HISTORY_DAYS = {"hour": 1, "day": 31, "week": 182, "month": 365}
+OCCUPANCY_HISTORY_MAX_BUCKETS = 1000
+
+# Days of the utilization report by default and at most, and its default
+# rolling average window in days
+ANALYTICS_DAYS = 84
+ANALYTICS_MAX_DAYS = 731
+ANALYTICS_WINDOW = 7
+
+# Memory for cached pages of spaces and meeting rooms, in bytes (0 disables)
+PAGE_CACHE_BYTES = int(os.environ.get("PAGE_CACHE_BYTES", 32 * 1024 * 1024))
+
+# Record request, template and storage timings for /metrics
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+
+
+def create_storage(backend):
+    if backend == "json":
+        return JsonStorage(
+            DATA_FILE, flush_interval=SAVE_FLUSH_INTERVAL, data_format=DATA_FORMAT
+        )
+    if backend == "journal":
+        return JournalStorage(
+            DATA_FILE,
+            JOURNAL_FILE,
+            compact_threshold=JOURNAL_COMPACT_BYTES,
+            data_format=DATA_FORMAT,
+        )
+    if backend == "sharded":
+        return ShardedStorage(SHARDS_DIRECTORY, data_format=DATA_FORMAT)
+    if backend == "snapshot":
+        return SnapshotStorage(SNAPSHOT_FILE)
+    if backend == "sqlite":
+        return SqliteStorage(SQLITE_FILE)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+storage = create_storage(STORAGE_BACKEND)
+atexit.register(storage.flush)
+
+# Looked up on each call, so a replaced storage is picked up
+seat_events = SeatEvents(
+    lambda space_id: storage.get_space(space_id),
+    poll_interval=SEAT_EVENTS_POLL_INTERVAL,
+    max_subscribers=SEAT_EVENTS_MAX_STREAMS,
+)
+
+# Dashboard statistics and rendered pages, kept up to date by the routes that
+# change the data
+dashboard_stats = StatsCache(lambda: storage)
+room_availability = StatsCache(
+    lambda: storage,
+    partial(
+        RoomAvailability.build,
+        opens=BOOKING_OPENS,
+        closes=BOOKING_CLOSES,
+        slot_minutes=BOOKING_SLOT_MINUTES,
+    ),
+)
+utilization_analytics = StatsCache(
+    lambda: storage, UtilizationAnalytics.build, UtilizationAnalytics.catch_up
+)
+page_cache = PageCache(PAGE_CACHE_BYTES)
+occupancy_history = TimeSeriesStore(OCCUPANCY_HISTORY_DIRECTORY)
+
+
+def occupancy_changed(space_id, occupancy):
+    """Record the occupancy of a space (or meeting room, ``mr_<id>``)."""
+    occupancy_history.append(space_id, occupancy)
+
+
+def space_changed(space_id):
+    page_cache.invalidate("space", space_id)
+    dashboard_stats.changed(
+        lambda stats: stats.set_space(space_id, storage.get_space(space_id))
+    )
+    # Nothing to update, but the availability stays valid for the new revision
+    room_availability.changed(lambda availability: None)
+    utilization_analytics.changed(
+        lambda analytics: analytics.set_space(
+            space_id,
+            storage.get_space(space_id),
+            storage.iter_registrations(space_id=space_id),
+        )
+    )
+
+
+def meeting_room_changed(room_id):
+    page_cache.invalidate("meeting_room", room_id)
+    dashboard_stats.changed(
+        lambda stats: stats.set_meeting_room(room_id, storage.get_meeting_room(room_id))
+    )
+    room_availability.changed(
+        lambda availability: availability.set_meeting_room(
+            room_id, storage.get_meeting_room(room_id)
+        )
+    )
+    utilization_analytics.changed(lambda analytics: None)
 
-# Initialize data file if it doesn't exist
+
+def registration_added(registration):
+    space_id = registration["space_id"]
+    if registration["is_meeting_room"]:
+        page_cache.invalidate("meeting_room", space_id[3:])
+    else:
+        page_cache.invalidate("space", space_id)
+
+    def update(stats):
+        stats.add_registration(registration)
+        if registration["is_meeting_room"]:
+            room_id = space_id[3:]
+            stats.set_meeting_room(room_id, storage.get_meeting_room(room_id))
+        else:
+            stats.set_space(space_id, storage.get_space(space_id))
+
+    dashboard_stats.changed(update)
+    room_availability.changed(
+        lambda availability: availability.add_registration(registration)
+    )
+    utilization_analytics.changed(
+        lambda analytics: analytics.add_registration(registration)
+    )
+    if registration["is_meeting_room"]:
+        room = storage.get_meeting_room(space_id[3:])
+    else:
+        room = storage.get_space(space_id)
+    occupancy_changed(space_id, room["current_occupancy"])
+
+
+def cached_page(tags, version, render):
+    """
+    Return the page of the current request from the page cache, or ``render()``
+    and cache it. ``version`` identifies the data the page shows and ``tags``
+    are the ``(kind, id)`` entities it shows.
+    """
+    if PAGE_CACHE_BYTES <= 0 or "_flashes" in session:
+        # Flashed messages are part of the page
+        return render()
+    key = (request.endpoint, request.full_path, version)
+    page = page_cache.get(key)
+    if page is None:
+        page = render()
+        page_cache.put(key, page, tags)
+    return page
+
+
+# Initialize storage if it doesn't exist
 def init_data():
-    if not os.path.exists(DATA_FILE):
-        initial_data = {
-            "coworking_spaces": {},
-            "meeting_rooms": {},  # New entity for meeting rooms
-            "admins": {"admin": "password"},  # Simple auth for demo purposes
-            "registrations": [],  # Store registration forms
-        }
-        with open(DATA_FILE, "w") as f:
-            json.dump(initial_data, f, indent=2)
+    storage.init()
 
 
-# Load data from file
+# Load a private, mutable copy of the data (use it when the route saves changes)
 def load_data():
-    try:
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # If file doesn't exist, create it with default data
-        init_data()
-        with open(DATA_FILE, "r") as f:
-            data = json.load(f)
-            # Ensure meeting_rooms key exists for backward compatibility
-            if "meeting_rooms" not in data:
-                data["meeting_rooms"] = {}
-            return data
+    return storage.load()
+
+
+# Read-only view of the cached data, shared between requests without copying
+def read_data():
+    return storage.view()
 
 
 # Save data to file
 def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    storage.save(data)
+
+
+# Metrics; nothing is hooked in when they are disabled
+metrics = Metrics() if METRICS_ENABLED else None
+
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+def record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        metrics.observe_request(
+            request.endpoint or "unknown",
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+        )
+    return response
+
+
+def start_render_timer(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+
+def record_render(sender, template, context, **extra):
+    started = g.pop("render_started", None)
+    if started is not None:
+        metrics.observe_render(
+            template.name or "unknown", time.perf_counter() - started
+        )
+
+
+if metrics is not None:
+    app.before_request(start_request_timer)
+    app.after_request(record_request)
+    before_render_template.connect(start_render_timer, app)
+    template_rendered.connect(record_render, app)
+    storage.observer = partial(metrics.observe_storage, STORAGE_BACKEND)
 
 
 # Admin login required decorator
@@ -64,8 +319,9 @@ def admin_required(f):
 @app.route("/")
 @admin_required
 def index():
-    data = load_data()
-    return render_template("index.html", spaces=data["coworking_spaces"])
+    return dashboard_stats.read(
+        lambda stats: render_template("index.html", stats=stats)
+    )
 
 
 @app.route("/login", methods=["GET", "POST"])
@@ -74,8 +330,8 @@ def login():
         username = request.form["username"]
         password = request.form["password"]
 
-        data = load_data()
-        if username in data["admins"] and data["admins"][username] == password:
+        stored_password = storage.admin_password(username)
+        if stored_password is not None and stored_password == password:
             session["admin_logged_in"] = True
             session["username"] = username
             return redirect(url_for("index"))
@@ -95,53 +351,86 @@ def logout():
 @app.route("/spaces")
 @admin_required
 def spaces():
-    data = load_data()
-    return render_template("spaces.html", spaces=data["coworking_spaces"])
+    spaces = storage.list_spaces()
+    version = tuple(
+        (space_id, space_version(space)) for space_id, space in spaces.items()
+    )
+    return cached_page(
+        [("space", ALL)],
+        version,
+        lambda: render_template("spaces.html", spaces=spaces),
+    )
 
 
 @app.route("/meeting_rooms")
 @admin_required
 def meeting_rooms():
-    data = load_data()
-    return render_template("meeting_rooms.html", meeting_rooms=data["meeting_rooms"])
+    rooms = storage.list_meeting_rooms()
+    # Meeting rooms aren't versioned, but they are only a few fields
+    version = tuple((room_id, room_fields(room)) for room_id, room in rooms.items())
+    return cached_page(
+        [("meeting_room", ALL)],
+        version,
+        lambda: render_template("meeting_rooms.html", meeting_rooms=rooms),
+    )
 
 
 @app.route("/space/<space_id>")
 @admin_required
 def space_detail(space_id):
-    data = load_data()
-    if space_id not in data["coworking_spaces"]:
+    space = storage.get_space(space_id)
+    if space is None:
         flash("Space not found")
         return redirect(url_for("spaces"))
 
-    space = data["coworking_spaces"][space_id]
-
-    # Get registrations for this space
-    space_registrations = [
-        reg for reg in data["registrations"] if reg["space_id"] == space_id
-    ]
-
-    return render_template(
-        "space_detail.html",
-        space=space,
-        space_id=space_id,
-        registrations=space_registrations,
+    # The version changes with every registration for the space too
+    return cached_page(
+        [("space", space_id)],
+        space_version(space),
+        lambda: render_template(
+            "space_detail.html",
+            space=space,
+            space_id=space_id,
+            registrations=storage.space_registrations(space_id),
+        ),
     )
 
 
 @app.route("/meeting_room/<room_id>")
 @admin_required
 def meeting_room_detail(room_id):
-    data = load_data()
-    if room_id not in data["meeting_rooms"]:
+    room = storage.get_meeting_room(room_id)
+    if room is None:
         flash("Meeting room not found")
         return redirect(url_for("meeting_rooms"))
 
-    room = data["meeting_rooms"][room_id]
-
     # Get registrations for this meeting room (we'll need to modify the registration model to support this)
     # For now, we'll just show the room details
-    return render_template("meeting_room_detail.html", room=room, room_id=room_id)
+    return cached_page(
+        [("meeting_room", room_id)],
+        room_fields(room),
+        lambda: render_template("meeting_room_detail.html", room=room, room_id=room_id),
+    )
+
+
+def space_version(space):
+    """
+    Return what identifies the data of a space its pages show: its version,
+    and its uuid, as a new space may get the id of a deleted one and start
+    over at the same versions.
+    """
+    return space.get("uuid", ""), space.get("version", 0)
+
+
+def space_etag(space_id, space):
+    """Return the ETag of the seats of a space at its ``space_version``."""
+    uuid, version = space_version(space)
+    return f"{space_id}-{uuid}-{version}" if uuid else f"{space_id}-{version}"
+
+
+def room_fields(room):
+    """Return the fields of a meeting room its pages show, to version them by."""
+    return tuple((key, value) for key, value in room.items() if key != "bookings")
 
 
 @app.route("/add_space", methods=["GET", "POST"])
@@ -154,40 +443,9 @@ def add_space():
         rows = int(request.form.get("rows", 5))
         cols = int(request.form.get("cols", 5))
 
-        data = load_data()
-        new_id = str(len(data["coworking_spaces"]) + 1)
-
-        # Initialize seat layout
-        seat_layout = []
-        seats = {}
-
-        # Create a grid layout for seats
-        for r in range(rows):
-            row = []
-            for c in range(cols):
-                seat_id = f"{r+1}-{c+1}"
-                row.append(seat_id)
-                # Initialize each seat as available
-                seats[seat_id] = {
-                    "id": seat_id,
-                    "row": r + 1,
-                    "col": c + 1,
-                    "available": True,
-                    "reserved_by": None,
-                }
-            seat_layout.append(row)
-
-        data["coworking_spaces"][new_id] = {
-            "name": name,
-            "location": location,
-            "capacity": capacity,
-            "current_occupancy": 0,
-            "equipment": [],
-            "seat_layout": seat_layout,
-            "seats": seats,
-        }
-
-        save_data(data)
+        space_id = storage.add_space(new_space(name, location, capacity, rows, cols))
+        space_changed(space_id)
+        occupancy_changed(space_id, 0)
         flash("Space added successfully")
         return redirect(url_for("spaces"))
 
@@ -202,17 +460,16 @@ def add_meeting_room():
         location = request.form["location"]
         capacity = int(request.form["capacity"])
 
-        data = load_data()
-        new_id = str(len(data["meeting_rooms"]) + 1)
-
-        data["meeting_rooms"][new_id] = {
-            "name": name,
-            "location": location,
-            "capacity": capacity,
-            "current_occupancy": 0,
-        }
-
-        save_data(data)
+        room_id = storage.add_meeting_room(
+            {
+                "name": name,
+                "location": location,
+                "capacity": capacity,
+                "current_occupancy": 0,
+            }
+        )
+        meeting_room_changed(room_id)
+        occupancy_changed(f"mr_{room_id}", 0)
         flash("Meeting room added successfully")
         return redirect(url_for("meeting_rooms"))
 
@@ -222,51 +479,53 @@ def add_meeting_room():
 @app.route("/edit_meeting_room/<room_id>", methods=["GET", "POST"])
 @admin_required
 def edit_meeting_room(room_id):
-    data = load_data()
-    if room_id not in data["meeting_rooms"]:
+    room = storage.get_meeting_room(room_id)
+    if room is None:
         flash("Meeting room not found")
         return redirect(url_for("meeting_rooms"))
 
     if request.method == "POST":
-        data["meeting_rooms"][room_id]["name"] = request.form["name"]
-        data["meeting_rooms"][room_id]["location"] = request.form["location"]
-        data["meeting_rooms"][room_id]["capacity"] = int(request.form["capacity"])
-        save_data(data)
+        storage.update_meeting_room(
+            room_id,
+            name=request.form["name"],
+            location=request.form["location"],
+            capacity=int(request.form["capacity"]),
+        )
+        meeting_room_changed(room_id)
         flash("Meeting room updated successfully")
         return redirect(url_for("meeting_room_detail", room_id=room_id))
 
-    room = data["meeting_rooms"][room_id]
     return render_template("edit_meeting_room.html", room=room, room_id=room_id)
 
 
 @app.route("/edit_space/<space_id>", methods=["GET", "POST"])
 @admin_required
 def edit_space(space_id):
-    data = load_data()
-    if space_id not in data["coworking_spaces"]:
+    space = storage.get_space(space_id)
+    if space is None:
         flash("Space not found")
         return redirect(url_for("spaces"))
 
     if request.method == "POST":
-        data["coworking_spaces"][space_id]["name"] = request.form["name"]
-        data["coworking_spaces"][space_id]["location"] = request.form["location"]
-        data["coworking_spaces"][space_id]["capacity"] = int(request.form["capacity"])
-        # Preserve seat layout and seats data when editing
-        save_data(data)
+        # Only the listed fields change; the seat map is preserved
+        storage.update_space(
+            space_id,
+            name=request.form["name"],
+            location=request.form["location"],
+            capacity=int(request.form["capacity"]),
+        )
+        space_changed(space_id)
         flash("Space updated successfully")
         return redirect(url_for("space_detail", space_id=space_id))
 
-    space = data["coworking_spaces"][space_id]
     return render_template("edit_space.html", space=space, space_id=space_id)
 
 
 @app.route("/delete_space/<space_id>")
 @admin_required
 def delete_space(space_id):
-    data = load_data()
-    if space_id in data["coworking_spaces"]:
-        del data["coworking_spaces"][space_id]
-        save_data(data)
+    if storage.delete_space(space_id):
+        space_changed(space_id)
         flash("Space deleted successfully")
     else:
         flash("Space not found")
@@ -277,12 +536,13 @@ def delete_space(space_id):
 @admin_required
 def update_occupancy(space_id):
     occupancy = int(request.form["occupancy"])
-    data = load_data()
+    space = storage.get_space(space_id)
 
-    if space_id in data["coworking_spaces"]:
-        if occupancy <= data["coworking_spaces"][space_id]["capacity"]:
-            data["coworking_spaces"][space_id]["current_occupancy"] = occupancy
-            save_data(data)
+    if space is not None:
+        if occupancy <= space["capacity"]:
+            storage.update_space(space_id, current_occupancy=occupancy)
+            space_changed(space_id)
+            occupancy_changed(space_id, occupancy)
             flash("Occupancy updated successfully")
         else:
             flash("Occupancy cannot exceed capacity")
@@ -298,12 +558,8 @@ def add_equipment(space_id):
     equipment_name = request.form["equipment_name"]
     quantity = int(request.form["quantity"])
 
-    data = load_data()
-    if space_id in data["coworking_spaces"]:
-        data["coworking_spaces"][space_id]["equipment"].append(
-            {"name": equipment_name, "quantity": quantity}
-        )
-        save_data(data)
+    if storage.add_equipment(space_id, {"name": equipment_name, "quantity": quantity}):
+        space_changed(space_id)
         flash("Equipment added successfully")
 
     return redirect(url_for("space_detail", space_id=space_id))
@@ -312,15 +568,24 @@ def add_equipment(space_id):
 @app.route("/registration_form")
 @admin_required
 def registration_form():
-    data = load_data()
     # Combine coworking spaces and meeting rooms for the registration form
     all_spaces = {}
     # Add coworking spaces
-    all_spaces.update(data["coworking_spaces"])
+    all_spaces.update(storage.list_spaces())
     # Add meeting rooms with a prefix to distinguish them
-    for room_id, room in data["meeting_rooms"].items():
+    for room_id, room in storage.list_meeting_rooms().items():
         all_spaces[f"mr_{room_id}"] = room
-    return render_template("registration_form.html", spaces=all_spaces)
+    return render_template(
+        "registration_form.html",
+        spaces=all_spaces,
+        # Pre-selected by links such as the seat group search results
+        selected_space=request.args.get("space", ""),
+        selected_seat=request.args.get("seat", ""),
+        group_size=request.args.get("group_size", ""),
+        booking_opens=BOOKING_OPENS,
+        booking_closes=BOOKING_CLOSES,
+        booking_slot_minutes=BOOKING_SLOT_MINUTES,
+    )
 
 
 @app.route("/submit_registration", methods=["POST"])
@@ -337,9 +602,6 @@ def submit_registration():
     start_date = request.form["startDate"]
     additional_info = request.form["additionalInfo"]
 
-    # Load data
-    data = load_data()
-
     # Check if it's a coworking space or meeting room
     space_name = ""
     is_meeting_room = False
@@ -348,20 +610,21 @@ def submit_registration():
         # It's a meeting room (mr_ prefix)
         is_meeting_room = True
         room_id = space_id[3:]  # Remove "mr_" prefix
-        if room_id not in data["meeting_rooms"]:
+        room = storage.get_meeting_room(room_id)
+        if room is None:
             flash("Invalid meeting room selected")
             return redirect(url_for("registration_form"))
-        space_name = data["meeting_rooms"][room_id]["name"]
+        space_name = room["name"]
     else:
         # It's a coworking space
-        if space_id not in data["coworking_spaces"]:
+        space = storage.get_space(space_id)
+        if space is None:
             flash("Invalid space selected")
             return redirect(url_for("registration_form"))
-        space_name = data["coworking_spaces"][space_id]["name"]
+        space_name = space["name"]
 
     # Create registration record
     registration = {
-        "id": len(data["registrations"]) + 1,
         "first_name": first_name,
         "last_name": last_name,
         "email": email,
@@ -380,73 +643,576 @@ def submit_registration():
     if not is_meeting_room:
         selected_seat = request.form.get("selectedSeat")
         if selected_seat:
-            # Validate that the seat exists and is available
-            if (
-                selected_seat in data["coworking_spaces"][space_id]["seats"]
-                and data["coworking_spaces"][space_id]["seats"][selected_seat][
-                    "available"
-                ]
-            ):
-                # Reserve the seat
-                data["coworking_spaces"][space_id]["seats"][selected_seat][
-                    "available"
-                ] = False
-                data["coworking_spaces"][space_id]["seats"][selected_seat][
-                    "reserved_by"
-                ] = f"{first_name} {last_name}"
-                registration["selected_seat"] = selected_seat
-            else:
-                flash("Selected seat is not available")
-                return redirect(url_for("registration_form"))
-
-    # Add to registrations
-    data["registrations"].append(registration)
-
-    # Update current occupancy for the space
-    if is_meeting_room:
-        room_id = space_id[3:]  # Remove "mr_" prefix
-        data["meeting_rooms"][room_id]["current_occupancy"] += 1
-    else:
-        data["coworking_spaces"][space_id]["current_occupancy"] += 1
+            registration["selected_seat"] = selected_seat
+
+    # Meeting rooms may be booked for a time slot on the start date
+    booking_start = request.form.get("bookingStart")
+    if is_meeting_room and booking_start:
+        try:
+            start, end = booking_interval(
+                start_date,
+                booking_start,
+                request.form.get("bookingEnd", ""),
+                BOOKING_SLOT_MINUTES,
+                BOOKING_OPENS,
+                BOOKING_CLOSES,
+            )
+        except ValueError as e:
+            flash(str(e))
+            return redirect(url_for("registration_form"))
+        registration["booking_start"] = start
+        registration["booking_end"] = end
 
-    # Save data
-    save_data(data)
+    # Store the registration, reserve the seat or time slot and update current
+    # occupancy
+    try:
+        registration["id"] = storage.add_registration(registration)
+    except SeatUnavailableError:
+        flash("Selected seat is not available")
+        return redirect(url_for("registration_form"))
+    except BookingConflictError:
+        flash("The meeting room is already booked at that time")
+        return redirect(url_for("registration_form"))
+    registration_added(registration)
+    seat_events.notify()
 
     flash("Registration submitted successfully")
     return redirect(url_for("registration_form"))
 
 
+# Query arguments of registration listings and the filters they set
+REGISTRATION_FILTER_ARGS = {
+    "space": "space_id",
+    "membership_type": "membership_type",
+    "email": "email",
+    "submitted_from": "submitted_from",
+    "submitted_to": "submitted_to",
+}
+
+
+def registration_filters(args):
+    """Return the registration filters set in query ``args``."""
+    filters = {}
+    for arg, field in REGISTRATION_FILTER_ARGS.items():
+        value = args.get(arg, "").strip()
+        if not value:
+            continue
+        if field in ("submitted_from", "submitted_to"):
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"Invalid date for {arg}: {value}")
+        filters[field] = value
+    return filters
+
+
+def registrations_page(args):
+    """Return a page of registrations for query ``args`` and the next cursor."""
+    filters = registration_filters(args)
+    try:
+        limit = int(args.get("limit", REGISTRATIONS_PAGE_SIZE))
+        before = int(args["before"]) if args.get("before") else None
+    except ValueError:
+        raise ValueError("limit and before must be integers")
+    limit = max(1, min(limit, REGISTRATIONS_MAX_PAGE_SIZE))
+    return storage.page_registrations(limit, before, **filters)
+
+
 @app.route("/registrations")
 @admin_required
 def registrations():
-    data = load_data()
-    return render_template("registrations.html", registrations=data["registrations"])
+    try:
+        registrations, next_cursor = registrations_page(request.args)
+    except ValueError as e:
+        flash(str(e))
+        registrations, next_cursor = [], None
+    query = {
+        arg: value
+        for arg, value in request.args.items()
+        if arg != "before" and value.strip()
+    }
+    return render_template(
+        "registrations.html",
+        registrations=registrations,
+        next_cursor=next_cursor,
+        query=query,
+        spaces=storage.list_spaces(),
+        meeting_rooms=storage.list_meeting_rooms(),
+        email=query.get("email", ""),
+    )
+
+
+def utilization_report(args):
+    """Return the utilization report for query ``args``."""
+    try:
+        last_day = datetime.strptime(
+            args.get("to") or str(datetime.now().date()), "%Y-%m-%d"
+        ).date()
+        first_day = datetime.strptime(
+            args.get("from") or str(last_day - timedelta(days=ANALYTICS_DAYS - 1)),
+            "%Y-%m-%d",
+        ).date()
+    except ValueError:
+        raise ValueError("from and to must be YYYY-MM-DD dates")
+    if not 0 <= (last_day - first_day).days < ANALYTICS_MAX_DAYS:
+        raise ValueError(f"to must be within {ANALYTICS_MAX_DAYS} days after from")
+    try:
+        window = int(args.get("window", ANALYTICS_WINDOW))
+    except ValueError:
+        raise ValueError("window must be an integer")
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    return utilization_analytics.read(
+        lambda analytics: analytics.report(first_day, last_day, window)
+    )
+
+
+@app.route("/analytics")
+@admin_required
+def analytics():
+    try:
+        report = utilization_report(request.args)
+    except ValueError as e:
+        flash(str(e))
+        report = utilization_report({})
+    return render_template("analytics.html", report=report)
+
+
+@app.route("/api/analytics")
+@admin_required
+def api_analytics():
+    try:
+        return utilization_report(request.args)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+
+@app.route("/api/registrations")
+@admin_required
+def api_registrations():
+    try:
+        registrations, next_cursor = registrations_page(request.args)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return {"registrations": thaw(registrations), "next_cursor": next_cursor}
+
+
+@app.route("/registrations/export")
+@admin_required
+def export_registrations():
+    fmt = request.args.get("format", "csv")
+    if fmt not in export.FORMATS:
+        return {"error": f"Unknown export format: {fmt}"}, 400
+    try:
+        filters = registration_filters(request.args)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    writer, mimetype, extension = export.FORMATS[fmt]
+    chunks = writer(storage.iter_registrations(**filters))
+    filename = f"registrations.{extension}"
+    if request.args.get("gzip", "").lower() in ("1", "true", "yes"):
+        chunks = export.gzip_chunks(chunks)
+        mimetype = "application/gzip"
+        filename += ".gz"
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+def import_errors(errors):
+    return [{"line": line, "error": message} for line, message in errors]
+
+
+@app.route("/api/import", methods=["POST"])
+@admin_required
+def api_import():
+    fmt = request.args.get("format", "ndjson")
+    kind = request.args.get("type")
+    try:
+        records = importer.parse_records(
+            request.get_data(as_text=True).splitlines(keepends=True), fmt, kind
+        )
+        imported = storage.import_records(records)
+    except importer.ImportValidationError as e:
+        return {"errors": import_errors(e.errors)}, 400
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    dashboard_stats.invalidate()
+    room_availability.invalidate()
+    page_cache.clear()
+    seat_events.notify()
+    return {"imported": imported}
 
 
 @app.route("/api/meeting_rooms_count")
 @admin_required
 def api_meeting_rooms_count():
-    data = load_data()
-    return {"count": len(data["meeting_rooms"])}
+    return {"count": dashboard_stats.read(lambda stats: len(stats.meeting_rooms))}
+
+
+@app.route("/api/stats")
+@admin_required
+def api_stats():
+    return dashboard_stats.read(DashboardStats.to_json)
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if metrics is None:
+        return "Metrics are disabled\n", 404
+    # Admins can look at them in the browser; scrapers use basic auth
+    auth = request.authorization
+    if "admin_logged_in" not in session and not (
+        auth is not None
+        and auth.password
+        and storage.admin_password(auth.username) == auth.password
+    ):
+        return Response(
+            "Authentication required\n",
+            401,
+            {"WWW-Authenticate": 'Basic realm="metrics"'},
+        )
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/healthz")
+def healthz():
+    """Liveness check for the container and load balancers; needs no login."""
+    try:
+        storage.revision()
+    except Exception:
+        app.logger.exception("Health check failed")
+        return {"status": "unavailable"}, 503
+    return {"status": "ok"}
+
+
+@app.route("/api/page_cache")
+@admin_required
+def api_page_cache():
+    return page_cache.stats()
+
+
+@app.route("/api/meeting_rooms/availability")
+@admin_required
+def api_room_availability():
+    args = request.args
+    try:
+        first_day = datetime.strptime(args.get("from", ""), "%Y-%m-%d").date()
+        last_day = datetime.strptime(
+            args.get("to") or str(first_day), "%Y-%m-%d"
+        ).date()
+    except ValueError:
+        return {"error": "from and to must be YYYY-MM-DD dates"}, 400
+    if not 0 <= (last_day - first_day).days < AVAILABILITY_MAX_DAYS:
+        return {
+            "error": f"to must be within {AVAILABILITY_MAX_DAYS} days after from"
+        }, 400
+    try:
+        # The window is checked like the time slot of a booking
+        start, end = booking_interval(
+            first_day,
+            args.get("start", BOOKING_OPENS),
+            args.get("end", BOOKING_CLOSES),
+            BOOKING_SLOT_MINUTES,
+            BOOKING_OPENS,
+            BOOKING_CLOSES,
+        )
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    capacity = args.get("capacity", 0, type=int)
+
+    rooms = room_availability.read(
+        lambda availability: availability.search(
+            first_day,
+            last_day,
+            start[11:],
+            end[11:],
+            capacity,
+            args.get("location") or None,
+        )
+    )
+    return {"from": str(first_day), "to": str(last_day), "rooms": rooms}
+
+
+@app.route("/api/meeting_rooms/<room_id>/slots")
+@admin_required
+def api_room_slots(room_id):
+    date = request.args.get("date", "")
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        return {"error": "date must be a YYYY-MM-DD date"}, 400
+    bookings = storage.room_bookings(
+        room_id, f"{date}T{BOOKING_OPENS}", f"{date}T{BOOKING_CLOSES}"
+    )
+    if bookings is None:
+        return {"error": "Meeting room not found"}, 404
+    return {
+        "date": date,
+        "opens": BOOKING_OPENS,
+        "closes": BOOKING_CLOSES,
+        "slot_minutes": BOOKING_SLOT_MINUTES,
+        "bookings": [
+            {"start": start, "end": end, "registration_id": registration_id}
+            for start, end, registration_id in bookings
+        ],
+        "free": free_slots(bookings, date, BOOKING_OPENS, BOOKING_CLOSES),
+    }
+
+
+@app.route("/api/occupancy/<space_id>")
+@admin_required
+def api_occupancy_history(space_id):
+    if space_id.startswith("mr_"):
+        found = storage.get_meeting_room(space_id[3:])
+    else:
+        found = storage.get_space(space_id)
+    if found is None:
+        return {"error": "Space not found"}, 404
+    args = request.args
+    bucket = args.get("bucket", "day")
+    if bucket not in OCCUPANCY_HISTORY_DAYS:
+        return {
+            "error": f"bucket must be one of {', '.join(OCCUPANCY_HISTORY_DAYS)}"
+        }, 400
+    try:
+        last_day = datetime.strptime(
+            args.get("to") or str(datetime.now(timezone.utc).date()), "%Y-%m-%d"
+        ).date()
+        default_first_day = last_day - timedelta(
+            days=OCCUPANCY_HISTORY_DAYS[bucket] - 1
+        )
+        first_day = datetime.strptime(
+            args.get("from") or str(default_first_day), "%Y-%m-%d"
+        ).date()
+    except ValueError:
+        return {"error": "from and to must be YYYY-MM-DD dates"}, 400
+    if last_day < first_day:
+        return {"error": "to must not be before from"}, 400
+
+    # Dates are UTC days, the whole of the last one included
+    start = datetime.combine(first_day, datetime.min.time(), timezone.utc)
+    end = datetime.combine(last_day, datetime.min.time(), timezone.utc)
+    end += timedelta(days=1)
+    try:
+        points = occupancy_history.history(
+            space_id,
+            int(start.timestamp()),
+            int(end.timestamp()),
+            bucket,
+            OCCUPANCY_HISTORY_MAX_BUCKETS,
+        )
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return {
+        "space_id": space_id,
+        "bucket": bucket,
+        "from": str(first_day),
+        "to": str(last_day),
+        "current_occupancy": found["current_occupancy"],
+        "capacity": found["capacity"],
+        "points": points,
+    }
 
 
 @app.route("/api/seats/<space_id>")
 @admin_required
 def api_seats(space_id):
-    data = load_data()
+    space = storage.get_space(space_id)
+    if space is None:
+        return {"error": "Space not found"}, 404
+    since = request.args.get("since")
+    if since is not None and not since.isdigit():
+        return {"error": "since must be a space version"}, 400
+
+    # The version changes with every change to the space, so it identifies the
+    # response (for this URL); clients revalidate instead of re-downloading
+    etag = space_etag(space_id, space)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(seat_data(space, since and int(since)))
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
 
-    if space_id not in data["coworking_spaces"]:
+@app.route("/api/seats/<space_id>/groups")
+@admin_required
+def api_seat_groups(space_id):
+    space = storage.get_space(space_id)
+    if space is None:
         return {"error": "Space not found"}, 404
+    size = request.args.get("size", type=int)
+    if size is None or not 1 <= size <= SEAT_GROUP_MAX_SIZE:
+        return {"error": f"size must be between 1 and {SEAT_GROUP_MAX_SIZE}"}, 400
+    limit = request.args.get("limit", SEAT_GROUPS_LIMIT, type=int)
+    limit = max(1, min(limit, SEAT_GROUPS_MAX_LIMIT))
+
+    # Like the seats, the groups only change with the version of the space
+    version = space.get("version", 0)
+    etag = space_etag(space_id, space)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        seat_map = space.get("seat_map")
+        groups = find_groups(seat_map, size, limit) if seat_map else []
+        response = jsonify({"groups": groups, "size": size, "version": version})
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
 
-    space = data["coworking_spaces"][space_id]
 
+@app.route("/api/seats/<space_id>/events")
+@admin_required
+def api_seat_events(space_id):
+    # EventSource resends the id of the last event it got when reconnecting
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+    if since is not None and not since.isdigit():
+        return {"error": "since must be a space version"}, 400
+    try:
+        subscription = seat_events.subscribe(space_id, since and int(since))
+    except TooManySubscribersError as e:
+        return {"error": str(e)}, 503, {"Retry-After": "30"}
+    if subscription is None:
+        return {"error": "Space not found"}, 404
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = subscription.get(SEAT_EVENTS_KEEPALIVE)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event)
+                if event["event"] == "deleted":
+                    return
+        finally:
+            seat_events.unsubscribe(subscription)
+
+    response = Response(stream(), mimetype="text/event-stream")
+    response.cache_control.no_cache = True
+    # Don't let a proxy (nginx) buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def seat_data(space, since=None):
+    """
+    Return the seat layout and seats of ``space``, or with ``since`` (a version
+    of the space) only the seats changed after that version.
+    """
+    version = space.get("version", 0)
+    seat_map = space.get("seat_map")
+    if since is not None and since <= version:
+        changed = seat_map.changed_since(since) if seat_map else []
+        return {
+            "since": since,
+            "seats": {seat_id: seat_map.seat(seat_id) for seat_id in changed},
+            "version": version,
+        }
     # Return seat layout and seat information
     return {
-        "seat_layout": space.get("seat_layout", []),
-        "seats": space.get("seats", {}),
+        "seat_layout": seat_map.layout() if seat_map else [],
+        "seats": seat_map.seats() if seat_map else {},
+        "version": version,
     }
 
 
+@app.cli.command("migrate-to-sqlite")
+@click.argument("json_file", type=click.Path(exists=True), default=str(DATA_FILE))
+@click.argument("sqlite_file", type=click.Path(), default=str(SQLITE_FILE))
+def migrate_to_sqlite(json_file, sqlite_file):
+    """Copy the data from JSON_FILE into the SQLite database SQLITE_FILE."""
+    data = migrate_json(json_file, sqlite_file)
+    click.echo(
+        f"Migrated {len(data['coworking_spaces'])} spaces, "
+        f"{len(data['meeting_rooms'])} meeting rooms and "
+        f"{len(data['registrations'])} registrations to {sqlite_file}"
+    )
+
+
+@app.cli.command("migrate-to-shards")
+@click.argument("json_file", type=click.Path(exists=True), default=str(DATA_FILE))
+@click.argument("directory", type=click.Path(), default=str(SHARDS_DIRECTORY))
+def migrate_to_shards(json_file, directory):
+    """Copy the data from JSON_FILE into sharded storage in DIRECTORY."""
+    data = migrate_json_to_shards(json_file, directory, data_format=DATA_FORMAT)
+    click.echo(
+        f"Migrated {len(data['coworking_spaces'])} spaces, "
+        f"{len(data['meeting_rooms'])} meeting rooms and "
+        f"{len(data['registrations'])} registrations to {directory}"
+    )
+
+
+@app.cli.command("migrate-to-snapshot")
+@click.argument("json_file", type=click.Path(exists=True), default=str(DATA_FILE))
+@click.argument("snapshot_file", type=click.Path(), default=str(SNAPSHOT_FILE))
+def migrate_to_snapshot(json_file, snapshot_file):
+    """Copy the data from JSON_FILE into the snapshot file SNAPSHOT_FILE."""
+    data = migrate_json_to_snapshot(json_file, snapshot_file)
+    click.echo(
+        f"Migrated {len(data['coworking_spaces'])} spaces, "
+        f"{len(data['meeting_rooms'])} meeting rooms and "
+        f"{len(data['registrations'])} registrations to {snapshot_file}"
+    )
+
+
+@app.cli.command("convert-data")
+@click.argument("file", type=click.Path(exists=True), default=str(DATA_FILE))
+@click.option(
+    "--format", "fmt", type=click.Choice(serialization.FORMATS), required=True
+)
+def convert_data(file, fmt):
+    """Rewrite the data file FILE in another format."""
+    with open(file, "rb") as f:
+        old_format = serialization.detect(f.read(len(serialization.MAGIC)))
+    converted = JsonStorage(file, data_format=fmt)
+    converted.save(converted.load())
+    click.echo(
+        f"Converted {file} from {old_format} to {fmt} "
+        f"({os.path.getsize(file)} bytes)"
+    )
+
+
+@app.cli.command("import-data")
+@click.argument("file", type=click.File("r"))
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["ndjson", "csv"]),
+    help="File format (default: from the file extension).",
+)
+@click.option(
+    "--type",
+    "kind",
+    type=click.Choice(["space", "meeting_room", "registration"]),
+    help="Record type of every row (required for CSV).",
+)
+def import_data(file, fmt, kind):
+    """Import spaces, meeting rooms and registrations from FILE."""
+    if fmt is None:
+        fmt = "csv" if file.name.endswith(".csv") else "ndjson"
+    try:
+        imported = storage.import_records(importer.parse_records(file, fmt, kind))
+    except importer.ImportValidationError as e:
+        for line, message in e.errors:
+            click.echo(f"line {line}: {message}", err=True)
+        raise click.ClickException("Nothing was imported")
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"Imported {imported['spaces']} spaces, "
+        f"{imported['meeting_rooms']} meeting rooms and "
+        f"{imported['registrations']} registrations"
+    )
+
+
 if __name__ == "__main__":
+    # Development server; run it with gunicorn in production (gunicorn.conf.py)
     init_data()
     app.run(host="0.0.0.0", debug=True)
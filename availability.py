@@ -0,0 +1,122 @@
+"""
+Availability search over all meeting rooms.
+
+``RoomAvailability`` keeps an occupancy bitmap of every meeting room for every
+day it has bookings: bit ``i`` is set when the ``i``-th slot of the opening
+hours is booked. Whether a room is free for a time window is then one AND of
+the day's bitmap with the window's mask, so a search over hundreds of rooms
+and several weeks costs a few thousand integer operations instead of a look
+at every booking.
+
+The bitmaps are built from the bookings of all registrations once and then
+updated by the routes that book rooms, through a ``stats.StatsCache``.
+"""
+
+from datetime import timedelta
+
+
+def _minutes(time):
+    """Return the minutes since midnight of an ``HH:MM`` time."""
+    return int(time[:2]) * 60 + int(time[3:5])
+
+
+class RoomAvailability:
+    """Per-day occupancy bitmaps of all meeting rooms."""
+
+    def __init__(self, opens, closes, slot_minutes, revision=None):
+        self.revision = revision
+        self.opens = _minutes(opens)
+        self.slot_minutes = slot_minutes
+        self.slots = (_minutes(closes) - self.opens) // slot_minutes
+        self.rooms = {}  # room id -> {"name", "location", "capacity"}
+        self.busy = {}  # room id -> {"YYYY-MM-DD": bitmap of booked slots}
+
+    @classmethod
+    def build(cls, storage, opens, closes, slot_minutes):
+        """Compute the bitmaps of every booking in ``storage``."""
+        availability = cls(opens, closes, slot_minutes, storage.revision())
+        for room_id, room in storage.list_meeting_rooms().items():
+            availability.set_meeting_room(room_id, room)
+        for registration in storage.iter_registrations():
+            availability.add_registration(registration)
+        return availability
+
+    def set_meeting_room(self, room_id, room):
+        """Account for a new or changed meeting room."""
+        self.rooms[room_id] = {
+            "name": room["name"],
+            "location": room["location"],
+            "capacity": room["capacity"],
+        }
+
+    def add_registration(self, registration):
+        """Mark the slots a registration books (if any) as busy."""
+        start = registration.get("booking_start")
+        if not start or not registration["is_meeting_room"]:
+            return
+        end = registration["booking_end"]
+        days = self.busy.setdefault(registration["space_id"][3:], {})
+        day = start[:10]
+        days[day] = days.get(day, 0) | self._mask(start[11:], end[11:])
+
+    def _mask(self, start, end):
+        """Return the bits of the slots overlapping ``start`` to ``end`` (HH:MM)."""
+        first = max((_minutes(start) - self.opens) // self.slot_minutes, 0)
+        last = min(-((self.opens - _minutes(end)) // self.slot_minutes), self.slots)
+        if last <= first:
+            return 0
+        return (1 << last) - (1 << first)
+
+    def _time(self, slot):
+        minutes = self.opens + slot * self.slot_minutes
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def _free_intervals(self, day, free):
+        """Return the ``[start, end]`` times of the runs of set bits of ``free``."""
+        intervals = []
+        while free:
+            first = (free & -free).bit_length() - 1
+            run = free >> first
+            length = (~run & (run + 1)).bit_length() - 1
+            intervals.append(
+                [f"{day}T{self._time(first)}", f"{day}T{self._time(first + length)}"]
+            )
+            free &= ~((1 << (first + length)) - 1)
+        return intervals
+
+    def search(self, first_day, last_day, start, end, capacity=0, location=None):
+        """
+        Return the meeting rooms with at least ``capacity`` seats (at
+        ``location``, if given) that are free at some time between ``start``
+        and ``end`` (HH:MM) on a day from ``first_day`` to ``last_day`` (dates).
+
+        Each room lists its free intervals by day and whether it is ``free``
+        for the whole window on every day; those rooms come first, smallest
+        first.
+        """
+        window = self._mask(start, end)
+        days = [
+            str(first_day + timedelta(days=offset))
+            for offset in range((last_day - first_day).days + 1)
+        ]
+        results = []
+        for room_id, room in self.rooms.items():
+            if room["capacity"] < capacity:
+                continue
+            if location is not None and room["location"].lower() != location.lower():
+                continue
+            busy = self.busy.get(room_id, {})
+            slots = {}
+            free = True
+            for day in days:
+                free_slots = window & ~busy.get(day, 0)
+                free = free and free_slots == window
+                if free_slots:
+                    slots[day] = self._free_intervals(day, free_slots)
+            if slots:
+                results.append(
+                    {"room_id": room_id, **room, "free": free, "slots": slots}
+                )
+        # Sorting is stable, so rooms of the same size stay in id order
+        results.sort(key=lambda result: (not result["free"], result["capacity"]))
+        return results
@@ -0,0 +1,636 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of every route against generated datasets.
+
+Each route is driven through Flask's test client against a dataset of the
+chosen scale, and its latency percentiles, throughput and peak RSS are written
+to a JSON file that can be compared with the results of another commit::
+
+    python benchmark.py --scale small --backend json --output before.json
+    python benchmark.py --scale small --backend json --output after.json \\
+        --compare before.json
+
+Where ``fork`` is available every route runs in a child process forked after
+the dataset is loaded, so its peak RSS is its own and its writes to memory
+don't leak into the next route. Routes that change data run last.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import app as app_module
+import serialization
+from journal_storage import JournalStorage
+from seats import compact_space
+from sharded_storage import ShardedStorage
+from snapshot_storage import SnapshotStorage
+from sqlite_storage import SqliteStorage
+from storage import MEMBERSHIP_TYPES, JsonStorage, default_data, new_space
+from timeseries import TimeSeriesStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Dataset sizes: coworking spaces, seat rows and columns per space, registrations
+SCALES = {
+    "small": {"spaces": 10, "rows": 5, "cols": 5, "registrations": 100},
+    "large": {"spaces": 1000, "rows": 100, "cols": 100, "registrations": 100000},
+}
+
+# Routes that can't be timed request by request
+SKIPPED = {
+    "static": "no static files",
+    "api_seat_events": "an endless event stream",
+}
+
+
+def generate_dataset(spaces, rows, cols, registrations, seed=0):
+    """
+    Return a whole dataset with ``spaces`` spaces of ``rows`` x ``cols`` seats,
+    a meeting room per ten spaces and ``registrations`` registrations. Every
+    tenth registration books the next hour of a meeting room (twelve a day
+    from 2025-01-01); the others take the next free seat of a space while it
+    has one.
+    """
+    rng = random.Random(seed)
+    data = default_data()
+    data["coworking_spaces"] = {
+        str(i): {
+            **new_space(f"Space {i}", f"Floor {i % 10}", rows * cols, rows, cols),
+            "version": 0,
+        }
+        for i in range(1, spaces + 1)
+    }
+    data["meeting_rooms"] = {
+        str(i): {
+            "name": f"Room {i}",
+            "location": f"Floor {i % 10}",
+            "capacity": 12,
+            "current_occupancy": 0,
+        }
+        for i in range(1, max(1, spaces // 10) + 1)
+    }
+    next_seat = dict.fromkeys(data["coworking_spaces"], 0)
+    for i in range(1, registrations + 1):
+        registration = {
+            "id": i,
+            "first_name": f"First{i}",
+            "last_name": f"Last{i}",
+            "email": f"user{i}@example.com",
+            "phone": f"555-{i:06d}",
+            "company": f"Company {i % 100}",
+            "membership_type": rng.choice(MEMBERSHIP_TYPES),
+            "start_date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            "additional_info": "",
+            "submitted_at": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00",
+        }
+        if i % 10 == 0:
+            room_id = rng.choice(list(data["meeting_rooms"]))
+            room = data["meeting_rooms"][room_id]
+            bookings = room.setdefault("bookings", [])
+            day = date(2025, 1, 1) + timedelta(days=len(bookings) // 12)
+            hour = 8 + len(bookings) % 12
+            start, end = f"{day}T{hour:02d}:00", f"{day}T{hour + 1:02d}:00"
+            bookings.append([start, end, i])
+            room["current_occupancy"] += 1
+            registration.update(
+                space_id=f"mr_{room_id}",
+                space_name=room["name"],
+                is_meeting_room=True,
+                booking_start=start,
+                booking_end=end,
+            )
+        else:
+            space_id = str(rng.randint(1, spaces))
+            space = data["coworking_spaces"][space_id]
+            registration.update(
+                space_id=space_id, space_name=space["name"], is_meeting_room=False
+            )
+            seat = next_seat[space_id]
+            if seat < rows * cols:
+                next_seat[space_id] += 1
+                seat_id = f"{seat // cols + 1}-{seat % cols + 1}"
+                space["version"] += 1
+                space["seat_map"].set(
+                    seat_id, False, f"First{i} Last{i}", space["version"]
+                )
+                registration["selected_seat"] = seat_id
+            space["current_occupancy"] += 1
+        data["registrations"].append(registration)
+    return data
+
+
+def generate_history(store, space_id, capacity, days=365, seed=0):
+    """
+    Record an occupancy change of ``space_id`` every minute of the last
+    ``days`` days in ``store``, as a random walk between 0 and ``capacity``.
+    """
+    rng = random.Random(seed)
+    end = int(time.time()) // 60 * 60
+    timestamps = range(end - days * 24 * 60 * 60, end, 60)
+    values = []
+    occupancy = capacity // 2
+    for _ in timestamps:
+        occupancy = min(max(occupancy + rng.randint(-1, 1), 0), capacity)
+        values.append(occupancy)
+    store.extend(space_id, timestamps, values)
+
+
+def create_storage(backend, directory, data_format="json"):
+    if backend == "json":
+        return JsonStorage(
+            os.path.join(directory, "data.json"), data_format=data_format
+        )
+    if backend == "journal":
+        return JournalStorage(
+            os.path.join(directory, "data.json"),
+            os.path.join(directory, "data.journal"),
+            data_format=data_format,
+        )
+    if backend == "sharded":
+        return ShardedStorage(
+            os.path.join(directory, "shards"), data_format=data_format
+        )
+    if backend == "snapshot":
+        return SnapshotStorage(os.path.join(directory, "data.snapshot"))
+    if backend == "sqlite":
+        return SqliteStorage(os.path.join(directory, "data.sqlite3"))
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def free_seats(space, count):
+    """Return up to ``count`` free seat ids of ``space``."""
+    seat_map = space["seat_map"]
+    seats = []
+    for row in seat_map.layout():
+        seats.extend(seat_id for seat_id in row if seat_map.is_available(seat_id))
+        if len(seats) >= count:
+            break
+    return seats[:count]
+
+
+def registration_form(i, space_id, seat_id=None):
+    return {
+        "firstName": "Bench",
+        "lastName": f"Mark{i}",
+        "email": f"bench{i}@example.com",
+        "phone": "555-0000",
+        "company": "Bench",
+        "space": space_id,
+        "membershipType": "daily",
+        "startDate": "2025-10-01",
+        "additionalInfo": "",
+        "selectedSeat": seat_id or "",
+    }
+
+
+def routes(storage, requests):
+    """
+    Return ``(endpoint, method, make_request)`` for every route to benchmark,
+    where ``make_request(i)`` returns the path and form data of request ``i``.
+    Routes that change data come last.
+    """
+    # Listed spaces may leave out the seat map (SQLite, sharded backends)
+    spaces = storage.view()["coworking_spaces"]
+    space_ids = list(spaces)
+    space_id = space_ids[len(space_ids) // 2]
+    room_id = next(iter(storage.list_meeting_rooms()))
+    # The space with the most free seats takes the new registrations
+    roomiest = max(space_ids, key=lambda sid: spaces[sid]["seat_map"].available_count())
+    seats = free_seats(spaces[roomiest], requests + 1)
+    email = next(iter(storage.iter_registrations()))["email"]
+    year_ago = date.today() - timedelta(days=365)
+
+    def get(path):
+        return lambda i: (path, None)
+
+    return [
+        ("index", "GET", get("/")),
+        ("login", "GET", get("/login")),
+        ("spaces", "GET", get("/spaces")),
+        ("meeting_rooms", "GET", get("/meeting_rooms")),
+        ("space_detail", "GET", get(f"/space/{space_id}")),
+        ("meeting_room_detail", "GET", get(f"/meeting_room/{room_id}")),
+        ("add_space", "GET", get("/add_space")),
+        ("add_meeting_room", "GET", get("/add_meeting_room")),
+        ("edit_space", "GET", get(f"/edit_space/{space_id}")),
+        ("edit_meeting_room", "GET", get(f"/edit_meeting_room/{room_id}")),
+        ("registration_form", "GET", get("/registration_form")),
+        ("registrations", "GET", get("/registrations")),
+        ("registrations_filtered", "GET", get(f"/registrations?email={email}")),
+        ("api_registrations", "GET", get("/api/registrations?limit=100")),
+        ("export_registrations", "GET", get("/registrations/export?format=csv")),
+        ("api_meeting_rooms_count", "GET", get("/api/meeting_rooms_count")),
+        ("api_stats", "GET", get("/api/stats")),
+        ("analytics", "GET", get("/analytics?from=2025-01-01&to=2025-12-31")),
+        ("api_analytics", "GET", get("/api/analytics?from=2025-01-01&to=2025-12-31")),
+        ("api_page_cache", "GET", get("/api/page_cache")),
+        ("metrics_endpoint", "GET", get("/metrics")),
+        ("healthz", "GET", get("/healthz")),
+        ("api_seats", "GET", get(f"/api/seats/{space_id}")),
+        ("api_seats_since", "GET", get(f"/api/seats/{space_id}?since=0")),
+        ("api_seat_groups", "GET", get(f"/api/seats/{space_id}/groups?size=8")),
+        (
+            "api_occupancy_history",
+            "GET",
+            # A year of minute-by-minute history, by day
+            get(f"/api/occupancy/{space_id}?bucket=day&from={year_ago}"),
+        ),
+        (
+            "api_room_availability",
+            "GET",
+            get(
+                "/api/meeting_rooms/availability?from=2025-01-01&to=2025-01-28"
+                "&start=14:00&end=16:00&capacity=8"
+            ),
+        ),
+        (
+            "api_room_slots",
+            "GET",
+            get(f"/api/meeting_rooms/{room_id}/slots?date=2025-01-01"),
+        ),
+        # Changes
+        (
+            "submit_registration",
+            "POST",
+            lambda i: (
+                "/submit_registration",
+                registration_form(i, roomiest, seats[i] if i < len(seats) else None),
+            ),
+        ),
+        (
+            "submit_registration_meeting_room",
+            "POST",
+            # A slot on a day of its own, so that the bookings don't conflict
+            lambda i: (
+                "/submit_registration",
+                {
+                    **registration_form(i, f"mr_{room_id}"),
+                    "startDate": str(date(2030, 1, 1) + timedelta(days=i)),
+                    "bookingStart": "09:00",
+                    "bookingEnd": "10:00",
+                },
+            ),
+        ),
+        (
+            "update_occupancy",
+            "POST",
+            lambda i: (f"/update_occupancy/{space_id}", {"occupancy": "1"}),
+        ),
+        (
+            "add_equipment",
+            "POST",
+            lambda i: (
+                f"/add_equipment/{space_id}",
+                {"equipment_name": f"Item {i}", "quantity": "1"},
+            ),
+        ),
+        (
+            "edit_space_post",
+            "POST",
+            lambda i: (
+                f"/edit_space/{space_id}",
+                {"name": f"Space {i}", "location": "Here", "capacity": "100"},
+            ),
+        ),
+        (
+            "edit_meeting_room_post",
+            "POST",
+            lambda i: (
+                f"/edit_meeting_room/{room_id}",
+                {"name": f"Room {i}", "location": "Here", "capacity": "12"},
+            ),
+        ),
+        (
+            "add_meeting_room_post",
+            "POST",
+            lambda i: (
+                "/add_meeting_room",
+                {"name": f"New room {i}", "location": "Here", "capacity": "6"},
+            ),
+        ),
+        (
+            "add_space_post",
+            "POST",
+            lambda i: (
+                "/add_space",
+                {"name": f"New {i}", "location": "Here", "capacity": "25"},
+            ),
+        ),
+        (
+            "api_import",
+            "POST",
+            lambda i: (
+                "/api/import?format=ndjson",
+                json.dumps(
+                    {"type": "meeting_room", "name": f"Import {i}", "capacity": 6}
+                )
+                + "\n",
+            ),
+        ),
+        # Without fork these sign the client out and back in
+        ("logout", "GET", get("/logout")),
+        (
+            "login_post",
+            "POST",
+            lambda i: ("/login", {"username": "admin", "password": "password"}),
+        ),
+        (
+            "delete_space",
+            "GET",
+            lambda i: (f"/delete_space/{space_ids[-1 - i % len(space_ids)]}", None),
+        ),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    """Return the ``fraction`` percentile of ``sorted_values`` (nearest rank)."""
+    index = max(
+        0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1)
+    )
+    return sorted_values[index]
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes, if known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(client, method, make_request, requests):
+    """Time ``requests`` requests after a warm-up request."""
+    path, data = make_request(requests)
+    client.open(path, method=method, data=data).get_data()
+
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    for i in range(requests):
+        path, data = make_request(i)
+        start = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        response.get_data()  # streamed responses are generated here
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code in (301, 302, 303):
+            # Don't let the messages flashed by redirecting routes pile up in
+            # the session cookie
+            with client.session_transaction() as session:
+                session.pop("_flashes", None)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p90_ms": percentile(latencies, 0.9) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "throughput_rps": requests / elapsed if elapsed else None,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def isolated(function):
+    """Run ``function()`` in a forked child (if possible) and return its result."""
+    if not hasattr(os, "fork"):
+        return function()
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        status = 0
+        try:
+            result = {"result": function()}
+        except BaseException as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+            status = 1
+        with os.fdopen(write_end, "w") as f:
+            json.dump(result, f)
+        os._exit(status)
+    os.close(write_end)
+    with os.fdopen(read_end) as f:
+        result = json.load(f)
+    os.waitpid(pid, 0)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result["result"]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    backend,
+    dataset,
+    requests,
+    only=None,
+    page_cache=True,
+    data_format="json",
+    log=print,
+):
+    """Benchmark every route on a new ``backend`` storage filled with ``dataset``."""
+    results = {"routes": {}, "skipped": dict(SKIPPED)}
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        data = generate_dataset(**dataset)
+        storage = create_storage(backend, directory, data_format)
+        storage.save(data)
+        del data
+
+        app_module.storage = storage
+        app_module.occupancy_history = TimeSeriesStore(
+            os.path.join(directory, "occupancy")
+        )
+        # The space the read routes are benchmarked on (see routes())
+        space_ids = list(storage.view()["coworking_spaces"])
+        space_id = space_ids[len(space_ids) // 2]
+        generate_history(
+            app_module.occupancy_history,
+            space_id,
+            storage.get_space(space_id)["capacity"],
+        )
+        results["setup_seconds"] = time.perf_counter() - started
+        log(f"Dataset ready in {results['setup_seconds']:.1f}s")
+
+        if not page_cache:
+            app_module.PAGE_CACHE_BYTES = 0
+        client = app_module.app.test_client()
+        client.post("/login", data={"username": "admin", "password": "password"})
+
+        benchmarked = set()
+        for endpoint, method, make_request in routes(storage, requests):
+            benchmarked.add(endpoint.removesuffix("_post"))
+            if only and endpoint not in only:
+                continue
+            result = isolated(lambda: measure(client, method, make_request, requests))
+            results["routes"][endpoint] = result
+            log(
+                f"{endpoint:34} p50 {result['p50_ms']:9.2f} ms  "
+                f"p99 {result['p99_ms']:9.2f} ms  "
+                f"{result['throughput_rps'] or 0:9.1f} req/s  "
+                f"peak RSS {(result['peak_rss_bytes'] or 0) / 2**20:7.1f} MiB"
+            )
+
+        for rule in app_module.app.url_map.iter_rules():
+            if rule.endpoint not in benchmarked and rule.endpoint not in SKIPPED:
+                results["skipped"][rule.endpoint] = "no benchmark defined"
+    return results
+
+
+def run_serialization(dataset, repeat=3, log=print):
+    """
+    Time serializing ``dataset`` in every data file format and reading it back
+    the way ``JsonStorage`` does (best of ``repeat``).
+    """
+    data = generate_dataset(**dataset)
+    results = {}
+    for fmt in serialization.FORMATS:
+        dump_times, load_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            raw = serialization.dumps(data, fmt)
+            dump_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            loaded = serialization.loads(raw)
+            loaded["coworking_spaces"] = {
+                space_id: compact_space(space)
+                for space_id, space in loaded["coworking_spaces"].items()
+            }
+            load_times.append(time.perf_counter() - start)
+        results[fmt] = {
+            "bytes": len(raw),
+            "dump_ms": min(dump_times) * 1000,
+            "load_ms": min(load_times) * 1000,
+        }
+        log(
+            f"{fmt:12} {len(raw) / 2**20:9.2f} MiB  "
+            f"dump {results[fmt]['dump_ms']:9.1f} ms  "
+            f"load {results[fmt]['load_ms']:9.1f} ms"
+        )
+    return results
+
+
+def compare(results, baseline, log=print):
+    """Log the change of median latency of every route against ``baseline``."""
+    for endpoint, result in results.get("routes", {}).items():
+        before = baseline.get("routes", {}).get(endpoint)
+        if before is None or not before["p50_ms"]:
+            continue
+        change = (result["p50_ms"] / before["p50_ms"] - 1) * 100
+        log(
+            f"{endpoint:34} p50 {before['p50_ms']:9.2f} -> "
+            f"{result['p50_ms']:9.2f} ms ({change:+.0f}%)"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument(
+        "--backend",
+        choices=("json", "journal", "sharded", "snapshot", "sqlite"),
+        default="json",
+    )
+    parser.add_argument("--spaces", type=int, help="override the scale's spaces")
+    parser.add_argument("--rows", type=int, help="override the scale's seat rows")
+    parser.add_argument("--cols", type=int, help="override the scale's seat columns")
+    parser.add_argument(
+        "--registrations", type=int, help="override the scale's registrations"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=50, help="timed requests per route"
+    )
+    parser.add_argument("--route", action="append", help="only benchmark ROUTE")
+    parser.add_argument(
+        "--no-page-cache", action="store_true", help="disable the page cache"
+    )
+    parser.add_argument(
+        "--data-format",
+        choices=serialization.FORMATS,
+        default="json",
+        help="data file format of the JSON backends",
+    )
+    parser.add_argument(
+        "--serialization",
+        action="store_true",
+        help="time dumping and loading the dataset in each data file format "
+        "instead of the routes",
+    )
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="results file to compare with")
+    args = parser.parse_args(argv)
+
+    dataset = dict(SCALES[args.scale])
+    for key in dataset:
+        if getattr(args, key) is not None:
+            dataset[key] = getattr(args, key)
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "dataset": dataset,
+    }
+    description = (
+        f"{dataset['spaces']} spaces of {dataset['rows']}x{dataset['cols']} seats, "
+        f"{dataset['registrations']} registrations"
+    )
+    if args.serialization:
+        print(f"Benchmarking data file formats: {description}")
+        results["serialization"] = run_serialization(dataset)
+    else:
+        print(f"Benchmarking {args.backend} backend: {description}")
+        results.update(
+            backend=args.backend,
+            data_format=args.data_format,
+            page_cache=not args.no_page_cache,
+            **run(
+                args.backend,
+                dataset,
+                args.requests,
+                only=args.route,
+                page_cache=not args.no_page_cache,
+                data_format=args.data_format,
+            ),
+        )
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return results
+
+
+if __name__ == "__main__":
+    main()
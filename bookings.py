@@ -0,0 +1,99 @@
+"""
+Time-slot bookings of meeting rooms.
+
+A meeting room keeps its bookings as a list of non-overlapping
+``[start, end, registration_id]`` intervals sorted by start, with times as
+``YYYY-MM-DDTHH:MM`` strings (which sort chronologically)::
+
+    "bookings": [["2025-10-07T09:00", "2025-10-07T10:30", 12], ...]
+
+As the intervals don't overlap, their ends are sorted as well, so checking a
+new booking for a conflict is one binary search: only the last booking that
+starts before the new one ends can overlap it. Listing the bookings or free
+slots of a day is a binary search plus the bookings of that day, however many
+bookings the room has.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M"
+
+
+class BookingConflictError(Exception):
+    """Raised when a booking overlaps another booking of the same room."""
+
+
+def _start(booking):
+    return booking[0]
+
+
+def _end(booking):
+    return booking[1]
+
+
+def booking_interval(date, start, end, slot_minutes, opens, closes):
+    """
+    Validate a booking on ``date`` (``YYYY-MM-DD``) from ``start`` to ``end``
+    (``HH:MM``) and return its start and end times. Bookings start and end on
+    whole slots of ``slot_minutes`` within the opening hours ``opens`` to
+    ``closes``; raises ValueError otherwise.
+    """
+    try:
+        first = datetime.strptime(f"{date}T{start}", TIME_FORMAT)
+        last = datetime.strptime(f"{date}T{end}", TIME_FORMAT)
+    except ValueError:
+        raise ValueError("A booking needs a date and start and end times") from None
+    if last <= first:
+        raise ValueError("A booking must end after it starts")
+    if first.strftime("%H:%M") < opens or last.strftime("%H:%M") > closes:
+        raise ValueError(f"Meeting rooms can be booked from {opens} to {closes}")
+    if (first.hour * 60 + first.minute) % slot_minutes or (
+        last.hour * 60 + last.minute
+    ) % slot_minutes:
+        raise ValueError(f"Bookings start and end on {slot_minutes} minute slots")
+    return first.strftime(TIME_FORMAT), last.strftime(TIME_FORMAT)
+
+
+def conflict(bookings, start, end):
+    """Return the booking that overlaps ``start`` to ``end``, or None."""
+    index = bisect_left(bookings, end, key=_start)
+    if index and bookings[index - 1][1] > start:
+        return bookings[index - 1]
+    return None
+
+
+def book(bookings, start, end, registration_id):
+    """
+    Return a copy of ``bookings`` with a booking from ``start`` to ``end``
+    added. Raises ``BookingConflictError`` if it overlaps an existing one.
+    """
+    if conflict(bookings, start, end) is not None:
+        raise BookingConflictError(start, end)
+    # A new list, so that readers of the old one don't see the change
+    bookings = [list(booking) for booking in bookings]
+    insort(bookings, [start, end, registration_id], key=_start)
+    return bookings
+
+
+def overlapping(bookings, start, end):
+    """Return the bookings that overlap ``start`` to ``end``, in order."""
+    return bookings[
+        bisect_right(bookings, start, key=_end) : bisect_left(bookings, end, key=_start)
+    ]
+
+
+def free_slots(bookings, date, opens, closes):
+    """
+    Return the free ``[start, end]`` intervals of ``date`` between the opening
+    hours ``opens`` and ``closes``, given the room's ``bookings``.
+    """
+    cursor, closing = f"{date}T{opens}", f"{date}T{closes}"
+    free = []
+    for start, end, _ in overlapping(bookings, cursor, closing):
+        if start > cursor:
+            free.append([cursor, start])
+        cursor = max(cursor, end)
+    if cursor < closing:
+        free.append([cursor, closing])
+    return free
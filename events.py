@@ -0,0 +1,175 @@
+"""
+Live seat events for the registration form (Server-Sent Events).
+
+Every worker process has one ``SeatEvents`` hub. Its watcher thread checks the
+spaces that currently have subscribers - once per space, however many clients
+watch it - and turns the seats changed since the last check (see
+``SeatMap.changed_since``) into events for each subscriber's queue. Changes
+made by other workers are picked up within ``poll_interval``; a worker that
+commits a change itself calls ``notify()`` to push it right away.
+
+Subscriber queues are bounded: a client that falls too far behind gets a
+``resync`` event and reloads the seat map instead of buffering without limit.
+So is the number of subscribers of a hub (``max_subscribers``), as every open
+stream holds a connection of its worker.
+
+The hub only uses ``threading`` and ``queue``, which gunicorn's gevent workers
+patch, so there a stream waiting for events is a greenlet rather than a thread.
+"""
+
+import json
+import queue
+import threading
+
+
+class TooManySubscribersError(Exception):
+    """Raised when a hub already has as many subscribers as it takes."""
+
+
+class Subscription:
+    """The events of one client watching one space."""
+
+    def __init__(self, space_id, version, queue_size):
+        self.space_id = space_id
+        # Space version the client is up to date with
+        self.version = version
+        self.queue = queue.Queue(queue_size)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Drop what's queued: the client reloads the whole map anyway
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait({"event": "resync", "version": self.version})
+
+    def get(self, timeout):
+        """Return the next event, or None if there was none within ``timeout``."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+def seat_events(space, since):
+    """Return events for the seats of ``space`` changed after version ``since``."""
+    seat_map = space.get("seat_map")
+    if seat_map is None:
+        return []
+    return [
+        {
+            "event": "seat",
+            "version": seat_map.changed[seat_id],
+            **seat_map.seat(seat_id),
+        }
+        for seat_id in seat_map.changed_since(since)
+    ]
+
+
+class SeatEvents:
+    """Fan-out of committed seat changes to subscribed clients."""
+
+    def __init__(
+        self, get_space, poll_interval=1.0, queue_size=100, max_subscribers=None
+    ):
+        self.get_space = get_space
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscriptions = {}  # space id -> set of Subscription
+        self._versions = {}  # space id -> version the watcher has published
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._watcher = None
+
+    def subscribe(self, space_id, since=None):
+        """
+        Start watching ``space_id``. With ``since`` (a version of the space),
+        the seats changed after it are queued first, so a client that loaded
+        the map at that version misses nothing. Returns None if the space
+        doesn't exist; raises TooManySubscribersError if the hub is full.
+        """
+        space = self.get_space(space_id)
+        if space is None:
+            return None
+        version = space.get("version", 0)
+        subscription = Subscription(space_id, version, self.queue_size)
+        if since is not None and since < version:
+            for event in seat_events(space, since):
+                subscription.put(event)
+        with self._lock:
+            if (
+                self.max_subscribers is not None
+                and sum(map(len, self._subscriptions.values())) >= self.max_subscribers
+            ):
+                raise TooManySubscribersError(
+                    f"At most {self.max_subscribers} seat event streams are open"
+                )
+            self._subscriptions.setdefault(space_id, set()).add(subscription)
+            self._versions.setdefault(space_id, version)
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, daemon=True)
+                self._watcher.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.space_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.space_id, None)
+                self._versions.pop(subscription.space_id, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(map(len, self._subscriptions.values()))
+
+    def notify(self):
+        """Check for changes now instead of at the next poll."""
+        self._wakeup.set()
+
+    def _watch(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            with self._lock:
+                space_ids = list(self._subscriptions)
+            for space_id in space_ids:
+                self.publish(space_id)
+
+    def publish(self, space_id):
+        """Queue the changes of ``space_id`` since the last check for its subscribers."""
+        space = self.get_space(space_id)
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(space_id, ()))
+            published = self._versions.get(space_id)
+            if not subscriptions or published is None:
+                return
+            if space is None:
+                for subscription in subscriptions:
+                    subscription.put({"event": "deleted", "version": published})
+                return
+            version = space.get("version", 0)
+            if version <= published:
+                return
+            self._versions[space_id] = version
+            events = seat_events(space, published)
+            for subscription in subscriptions:
+                for event in events:
+                    # Already sent to clients that subscribed after this change
+                    if event["version"] > subscription.version:
+                        subscription.put(event)
+                subscription.version = max(subscription.version, version)
+
+
+def format_event(event):
+    """Format an event for a ``text/event-stream`` response."""
+    return (
+        f"id: {event['version']}\n"
+        f"event: {event['event']}\n"
+        f"data: {json.dumps(event)}\n\n"
+    )
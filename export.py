@@ -0,0 +1,94 @@
+"""
+Streaming exports of registrations.
+
+Each writer turns an iterator of registrations into an iterator of byte chunks,
+so a response can be sent while registrations are still being read and memory
+use doesn't grow with the size of the export.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+# Columns of exported registrations, in order
+REGISTRATION_FIELDS = (
+    "id",
+    "first_name",
+    "last_name",
+    "email",
+    "phone",
+    "company",
+    "space_id",
+    "space_name",
+    "membership_type",
+    "start_date",
+    "additional_info",
+    "submitted_at",
+    "is_meeting_room",
+    "selected_seat",
+    "booking_start",
+    "booking_end",
+)
+
+# Bytes collected before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+
+def _chunked(pieces):
+    """Merge small string ``pieces`` into byte chunks of about ``CHUNK_SIZE``."""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def _rows(registrations):
+    yield REGISTRATION_FIELDS
+    for registration in registrations:
+        yield [registration.get(field, "") for field in REGISTRATION_FIELDS]
+
+
+def csv_chunks(registrations):
+    """Yield ``registrations`` as CSV with a header row."""
+    line = io.StringIO()
+    writer = csv.writer(line)
+
+    def rows():
+        for row in _rows(registrations):
+            writer.writerow(row)
+            yield line.getvalue()
+            line.seek(0)
+            line.truncate()
+
+    return _chunked(rows())
+
+
+def ndjson_chunks(registrations):
+    """Yield ``registrations`` as newline-delimited JSON, one object per line."""
+    return _chunked(
+        json.dumps(registration, separators=(",", ":")) + "\n"
+        for registration in registrations
+    )
+
+
+def gzip_chunks(chunks):
+    """Compress byte ``chunks`` into a gzip stream as they come."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# Supported formats: writer, MIME type and file extension
+FORMATS = {
+    "csv": (csv_chunks, "text/csv", "csv"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson", "ndjson"),
+}
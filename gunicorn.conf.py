@@ -0,0 +1,43 @@
+"""
+Gunicorn settings for running the admin panel in production::
+
+    gunicorn --config gunicorn.conf.py app:app
+
+Gunicorn forks ``GUNICORN_WORKERS`` worker processes. They are gevent workers
+(``GUNICORN_WORKER_CLASS``), each serving up to ``GUNICORN_WORKER_CONNECTIONS``
+connections at once as greenlets: an open seat event stream mostly waits for
+events, and a thread per stream would leave none for other requests after a
+few open registration forms. With ``GUNICORN_WORKER_CLASS=gthread`` a worker
+serves requests from a pool of ``GUNICORN_THREADS`` threads instead, and
+``SEAT_EVENTS_MAX_STREAMS`` must be kept below that. Workers share nothing but
+the data files, which every storage backend locks for writes, so any number of
+them can run side by side. Waiting for those locks sleeps between attempts
+rather than blocking, so under gevent it doesn't hold up the worker's other
+connections; SQLite connections are pooled across greenlets.
+
+Send SIGHUP to the master process to reload gracefully: new workers are
+started with the current code and settings, and the old ones finish their
+requests (for up to ``GUNICORN_GRACEFUL_TIMEOUT`` seconds) before exiting.
+SIGTERM shuts down the same way.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+timeout = 60
+keepalive = 5
+accesslog = "-"
+
+# The app is imported by each worker, not by the master, so that a reload
+# picks up new code and no storage state is shared across fork()
+preload_app = False
+
+if float(os.environ.get("SAVE_FLUSH_INTERVAL", "0")) > 0 and workers > 1:
+    # Write-behind saves are only coherent with a single process writing
+    raise RuntimeError("SAVE_FLUSH_INTERVAL requires GUNICORN_WORKERS=1")
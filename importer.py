@@ -0,0 +1,259 @@
+"""
+Bulk import of coworking spaces, meeting rooms and registrations.
+
+Records are read from NDJSON (one object per line, its kind in a ``type``
+field or given for the whole file) or CSV (one kind per file). The whole batch
+is validated against the current data in one pass and applied with a single
+save; if any row is invalid nothing is imported and every error is reported
+with its line number.
+"""
+
+import csv
+import json
+from datetime import date, datetime
+
+from storage import MEMBERSHIP_TYPES, apply_registration, new_space, space_record
+
+# Largest seat grid side accepted for an imported space
+MAX_GRID_SIZE = 100
+
+
+class ImportValidationError(Exception):
+    """Raised with the list of ``(line, message)`` errors of a rejected import."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+def parse_records(lines, fmt, kind=None):
+    """
+    Parse ``lines`` of NDJSON or CSV into ``(line, kind, record)`` tuples.
+
+    A row that can't be parsed gets a ``ValueError`` as its record, so that it
+    is reported together with the validation errors of the other rows.
+    """
+    if fmt == "ndjson":
+        return list(_parse_ndjson(lines, kind))
+    if fmt == "csv":
+        if kind is None:
+            raise ValueError("CSV imports need a record kind")
+        return list(_parse_csv(lines, kind))
+    raise ValueError(f"Unknown import format: {fmt}")
+
+
+def _parse_ndjson(lines, kind):
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            yield line_number, kind, ValueError(f"invalid JSON: {e}")
+            continue
+        yield line_number, record.pop("type", kind), record
+
+
+def _parse_csv(lines, kind):
+    reader = csv.DictReader(lines)
+    for record in reader:
+        # Empty cells are missing values
+        record = {
+            key: value for key, value in record.items() if value not in ("", None)
+        }
+        yield reader.line_num, kind, record
+
+
+def _text(record, field, required=True):
+    value = record.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f"{field} is required")
+        return ""
+    return str(value).strip()
+
+
+def _integer(record, field, default=None, low=0, high=None):
+    value = record.get(field, default)
+    if value is None:
+        raise ValueError(f"{field} is required")
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer")
+    if value < low:
+        raise ValueError(f"{field} must be at least {low}")
+    if high is not None and value > high:
+        raise ValueError(f"{field} must be at most {high}")
+    return value
+
+
+def _space(record):
+    rows = _integer(record, "rows", 5, low=1, high=MAX_GRID_SIZE)
+    cols = _integer(record, "cols", 5, low=1, high=MAX_GRID_SIZE)
+    space = new_space(
+        _text(record, "name"),
+        _text(record, "location", required=False),
+        _integer(record, "capacity", rows * cols),
+        rows,
+        cols,
+    )
+    equipment = record.get("equipment", [])
+    if not isinstance(equipment, list) or not all(
+        isinstance(item, dict) and "name" in item for item in equipment
+    ):
+        raise ValueError("equipment must be a list of {name, quantity} objects")
+    space["equipment"] = [
+        {"name": item["name"], "quantity": _integer(item, "quantity", 1)}
+        for item in equipment
+    ]
+    return space
+
+
+def _meeting_room(record):
+    return {
+        "name": _text(record, "name"),
+        "location": _text(record, "location", required=False),
+        "capacity": _integer(record, "capacity"),
+        "current_occupancy": 0,
+    }
+
+
+class _Batch:
+    """Validation state of one import: what exists, plus what the batch adds."""
+
+    def __init__(self, data):
+        self.data = data
+        self.spaces = {}
+        self.rooms = {}
+        self.registrations = []
+        self.next_space_id = len(data["coworking_spaces"]) + 1
+        self.next_room_id = len(data["meeting_rooms"]) + 1
+        self.names = {}
+        for space_id, space in data["coworking_spaces"].items():
+            self._name(space["name"], space_id)
+        for room_id, room in data["meeting_rooms"].items():
+            self._name(room["name"], f"mr_{room_id}")
+        self.taken_seats = set()
+
+    def _name(self, name, space_id):
+        # A name used by several spaces can't identify one of them
+        self.names[name] = None if name in self.names else space_id
+
+    def add_space(self, space):
+        space_id = str(self.next_space_id)
+        self.next_space_id += 1
+        self.spaces[space_id] = space
+        self._name(space["name"], space_id)
+
+    def add_room(self, room):
+        room_id = str(self.next_room_id)
+        self.next_room_id += 1
+        self.rooms[room_id] = room
+        self._name(room["name"], f"mr_{room_id}")
+
+    def entity(self, space_id):
+        if space_id.startswith("mr_"):
+            room_id = space_id[3:]
+            return self.rooms.get(room_id) or self.data["meeting_rooms"].get(room_id)
+        return self.spaces.get(space_id) or self.data["coworking_spaces"].get(space_id)
+
+    def registration(self, record):
+        if record.get("space_id"):
+            space_id = str(record["space_id"])
+        else:
+            name = _text(record, "space_name")
+            if name not in self.names:
+                raise ValueError(f"unknown space {name!r}")
+            space_id = self.names[name]
+            if space_id is None:
+                raise ValueError(f"several spaces are named {name!r}")
+        entity = self.entity(space_id)
+        if entity is None:
+            raise ValueError(f"unknown space id {space_id!r}")
+
+        membership_type = _text(record, "membership_type")
+        if membership_type not in MEMBERSHIP_TYPES:
+            raise ValueError(f"membership_type must be one of {MEMBERSHIP_TYPES}")
+        start_date = _text(record, "start_date")
+        submitted_at = _text(record, "submitted_at", required=False)
+        try:
+            date.fromisoformat(start_date)
+            if submitted_at:
+                datetime.fromisoformat(submitted_at)
+        except ValueError as e:
+            raise ValueError(f"invalid date: {e}")
+
+        registration = {
+            "first_name": _text(record, "first_name"),
+            "last_name": _text(record, "last_name"),
+            "email": _text(record, "email"),
+            "phone": _text(record, "phone", required=False),
+            "company": _text(record, "company", required=False),
+            "space_id": space_id,
+            "space_name": entity["name"],
+            "membership_type": membership_type,
+            "start_date": start_date,
+            "additional_info": _text(record, "additional_info", required=False),
+            "submitted_at": submitted_at or datetime.now().isoformat(),
+            "is_meeting_room": space_id.startswith("mr_"),
+        }
+        seat_id = _text(record, "selected_seat", required=False)
+        if seat_id:
+            if registration["is_meeting_room"]:
+                raise ValueError("meeting room registrations have no seat")
+            seat_map = entity.get("seat_map")
+            if (
+                seat_map is None
+                or not seat_map.is_available(seat_id)
+                or (space_id, seat_id) in self.taken_seats
+            ):
+                raise ValueError(f"seat {seat_id} is not available")
+            self.taken_seats.add((space_id, seat_id))
+            registration["selected_seat"] = seat_id
+        self.registrations.append(registration)
+
+
+def apply_import(data, records):
+    """
+    Validate ``records`` (from ``parse_records``) against the whole dataset
+    ``data`` and add them to it.
+
+    Rows are validated in order, so registrations can refer to spaces and
+    meeting rooms earlier in the same batch, by id or by name. Raises
+    ``ImportValidationError`` before changing anything if any row is invalid;
+    otherwise returns the number of imported records of each kind.
+    """
+    batch = _Batch(data)
+    add = {
+        "space": lambda record: batch.add_space(_space(record)),
+        "meeting_room": lambda record: batch.add_room(_meeting_room(record)),
+        "registration": batch.registration,
+    }
+    errors = []
+    for line, kind, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if kind not in add:
+                raise ValueError(f"unknown record type {kind!r}")
+            add[kind](record)
+        except ValueError as e:
+            errors.append((line, str(e)))
+    if errors:
+        raise ImportValidationError(errors)
+
+    data["coworking_spaces"] = {
+        **data["coworking_spaces"],
+        **{space_id: space_record(space) for space_id, space in batch.spaces.items()},
+    }
+    data["meeting_rooms"] = {**data["meeting_rooms"], **batch.rooms}
+    for registration in batch.registrations:
+        apply_registration(data, registration)
+    return {
+        "spaces": len(batch.spaces),
+        "meeting_rooms": len(batch.rooms),
+        "registrations": len(batch.registrations),
+    }
@@ -0,0 +1,186 @@
+"""
+In-memory secondary indexes over registrations.
+
+Registrations are only ever appended, so an index remembers how many of them
+it has seen and catches up with new ones on the next lookup instead of being
+rebuilt; a list that is replaced (e.g. when the data file is re-read) gets a
+fresh index. Lookups cost O(matches) instead of a scan over all registrations.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from heapq import merge
+
+
+def submitted_date(registration):
+    """Return the ``YYYY-MM-DD`` date a registration was submitted on."""
+    return (registration.get("submitted_at") or "")[:10] or None
+
+
+# Indexed keys and how to get them from a registration
+INDEX_KEYS = {
+    "space_id": lambda registration: registration.get("space_id"),
+    "email": lambda registration: registration.get("email"),
+    "start_date": lambda registration: registration.get("start_date"),
+    "membership_type": lambda registration: registration.get("membership_type"),
+    "submitted_date": submitted_date,
+}
+
+# Filters of registration listings and exports that compare a field for equality
+EQUALITY_FILTERS = ("space_id", "membership_type", "email")
+
+
+def registration_matches(registration, filters):
+    """
+    Check a registration against listing ``filters``: ``space_id``,
+    ``membership_type`` and ``email`` must be equal, ``submitted_from`` and
+    ``submitted_to`` are an inclusive range of ``YYYY-MM-DD`` dates.
+    """
+    for field in EQUALITY_FILTERS:
+        if field in filters and registration.get(field) != filters[field]:
+            return False
+    if "submitted_from" in filters or "submitted_to" in filters:
+        day = submitted_date(registration)
+        if day is None:
+            return False
+        if "submitted_from" in filters and day < filters["submitted_from"]:
+            return False
+        if "submitted_to" in filters and day > filters["submitted_to"]:
+            return False
+    return True
+
+
+class RegistrationIndex:
+    """
+    Maps values of ``INDEX_KEYS`` to the positions of the registrations having
+    them in the indexed list. Position lists are in list (= id) order.
+    """
+
+    def __init__(self, registrations):
+        self.registrations = registrations
+        self._positions = {key: defaultdict(list) for key in INDEX_KEYS}
+        self._sorted_keys = {key: [] for key in INDEX_KEYS}
+        self.indexed = 0
+        self.refresh()
+
+    def refresh(self):
+        """Index registrations appended since the last call."""
+        registrations = self.registrations
+        for position in range(self.indexed, len(registrations)):
+            self._add(position, registrations[position])
+        self.indexed = len(registrations)
+
+    def _add(self, position, registration):
+        for key, get_value in INDEX_KEYS.items():
+            value = get_value(registration)
+            positions = self._positions[key][value]
+            if not positions and value is not None:
+                insort(self._sorted_keys[key], value)
+            positions.append(position)
+
+    def positions(self, key, value):
+        """Return positions of registrations whose ``key`` equals ``value``."""
+        return self._positions[key].get(value, [])
+
+    def positions_between(self, key, low=None, high=None, end=None, reverse=False):
+        """
+        Yield positions below ``end`` whose ``key`` is within [low, high], in
+        list order (newest first with ``reverse``). The position lists of the
+        values in range are merged lazily, so taking the first few costs the
+        number of values in range, not of positions.
+        """
+        keys = self._sorted_keys[key]
+        start = 0 if low is None else bisect_left(keys, low)
+        stop = len(keys) if high is None else bisect_right(keys, high)
+        lists = []
+        for value in keys[start:stop]:
+            positions = self._positions[key][value]
+            count = len(positions) if end is None else bisect_left(positions, end)
+            if reverse:
+                lists.append(map(positions.__getitem__, range(count - 1, -1, -1)))
+            else:
+                lists.append(positions[:count])
+        return merge(*lists, reverse=reverse)
+
+    def find(self, **criteria):
+        """Return registrations matching all equality ``criteria``, in id order."""
+        registrations = self.registrations
+        indexed_keys = [key for key in criteria if key in INDEX_KEYS]
+        if indexed_keys:
+            # Walk the shortest position list and check the other criteria directly
+            candidates = min(
+                (self.positions(key, criteria[key]) for key in indexed_keys),
+                key=len,
+            )
+        else:
+            candidates = range(len(registrations))
+        return [
+            registrations[position]
+            for position in candidates
+            if all(
+                registrations[position].get(field) == value
+                for field, value in criteria.items()
+            )
+        ]
+
+    def _candidates(self, filters, end=None, reverse=False):
+        """
+        Return positions below ``end`` that may match ``filters``, in list
+        order (newest first with ``reverse``): those of the shortest equality
+        filter, else of the submission date range, else all of them.
+        """
+        if end is None:
+            end = len(self.registrations)
+        lists = [
+            self.positions(field, filters[field])
+            for field in EQUALITY_FILTERS
+            if field in filters
+        ]
+        if lists:
+            positions = min(lists, key=len)
+            count = bisect_left(positions, end)
+            if reverse:
+                return map(positions.__getitem__, range(count - 1, -1, -1))
+            return positions[:count]
+        if "submitted_from" in filters or "submitted_to" in filters:
+            return self.positions_between(
+                "submitted_date",
+                filters.get("submitted_from"),
+                filters.get("submitted_to"),
+                end,
+                reverse,
+            )
+        return range(end - 1, -1, -1) if reverse else range(end)
+
+    def iter(self, **filters):
+        """Yield registrations matching ``filters`` in id order."""
+        registrations = self.registrations
+        for position in self._candidates(filters):
+            registration = registrations[position]
+            if registration_matches(registration, filters):
+                yield registration
+
+    def page(self, limit, before_id=None, **filters):
+        """
+        Return up to ``limit`` registrations matching ``filters`` with an id below
+        ``before_id``, newest first, and the cursor of the next page (or None).
+
+        The walk starts at the cursor's position (found by bisection) and stops
+        after ``limit`` matches, so a page costs the same however long the
+        history is.
+        """
+        registrations = self.registrations
+        end = None
+        if before_id is not None:
+            end = bisect_left(
+                registrations, before_id, key=lambda registration: registration["id"]
+            )
+
+        page = []
+        for position in self._candidates(filters, end, reverse=True):
+            registration = registrations[position]
+            if registration_matches(registration, filters):
+                if len(page) == limit:
+                    return page, page[-1]["id"]
+                page.append(registration)
+        return page, None
@@ -0,0 +1,149 @@
+"""
+Journaled JSON storage backend.
+
+Registrations (and the seat reservations they make) are appended as one JSON
+line each to a journal next to the ``data.json`` snapshot instead of rewriting
+the whole dataset, so a registration costs O(1) bytes on disk. The state is
+rebuilt from the snapshot plus a replay of the journal, and the journal is
+folded into a new snapshot in the background once it grows past a threshold.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from storage import JsonStorage, apply_registration, thaw
+
+
+class JournalStorage(JsonStorage):
+    """
+    JSON snapshot plus an append-only, newline-delimited journal of events.
+
+    Every event has a sequence number and the snapshot records the last one
+    it contains (``journal_seq``), so replaying a journal that is already part
+    of the snapshot (e.g. after a crash during compaction) is harmless.
+    """
+
+    def __init__(
+        self, path, journal_path, compact_threshold=1024 * 1024, data_format="json"
+    ):
+        super().__init__(path, data_format=data_format)
+        self.journal_path = journal_path
+        self.compact_threshold = compact_threshold
+        self._journal_offset = 0
+        self._seq = 0
+        self._compaction = None
+
+    @contextmanager
+    def _journal_lock(self):
+        """Hold the writer lock and open the journal for appending."""
+        with self._writer_lock(), open(self.journal_path, "ab") as f:
+            yield f
+
+    def _read(self):
+        data = super()._read()
+        self._journal_offset = 0
+        self._seq = data.get("journal_seq", 0)
+        return data
+
+    def _current(self):
+        with self._lock:
+            super()._current()
+            if not self._replay():
+                # The journal was compacted by another process; start over
+                self._data = None
+                super()._current()
+                self._replay()
+            return self._data
+
+    def _replay(self):
+        """Apply journal events written since the last replay."""
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            size = 0
+        if size < self._journal_offset:
+            return False
+        if size == self._journal_offset:
+            return True
+
+        start = time.perf_counter()
+        offset = self._journal_offset
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # an append in progress
+                self._journal_offset += len(line)
+                event = json.loads(line)
+                if event["seq"] <= self._seq:
+                    continue  # already part of the snapshot
+                apply_registration(self._data, event["registration"])
+                self._seq = event["seq"]
+        self.version += 1
+        if self.observer is not None:
+            self.observer(
+                "load", time.perf_counter() - start, self._journal_offset - offset
+            )
+        return True
+
+    def revision(self):
+        # Journaled registrations are commits too
+        with self._lock:
+            return self._current().get("revision", 0) + self._seq
+
+    def add_registration(self, registration):
+        with self._journal_lock() as journal:
+            data = self._current()
+            registration = apply_registration(data, registration)
+            event = {
+                "seq": self._seq + 1,
+                "op": "add_registration",
+                "registration": registration,
+            }
+            start = time.perf_counter()
+            line = json.dumps(event).encode() + b"\n"
+            try:
+                journal.write(line)
+                journal.flush()
+                os.fsync(journal.fileno())
+            except BaseException:
+                # The cache is ahead of the disk now; re-read it next time
+                self._data = None
+                raise
+            # The offset isn't advanced: the next replay reads this line back
+            # and skips it by its sequence number
+            self._seq = event["seq"]
+            self.version += 1
+            size = journal.tell()
+            if self.observer is not None:
+                self.observer("save", time.perf_counter() - start, len(line))
+
+        if size >= self.compact_threshold:
+            self._start_compaction()
+        return registration["id"]
+
+    def save(self, data):
+        with self._journal_lock() as journal:
+            self._write_snapshot(thaw(data), journal)
+
+    def _write_snapshot(self, data, journal):
+        data["journal_seq"] = self._seq
+        super().save(data)
+        # The new snapshot contains every journaled event
+        journal.truncate(0)
+        self._journal_offset = 0
+
+    def _start_compaction(self):
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            self._compaction = threading.Thread(target=self.compact, daemon=True)
+            self._compaction.start()
+
+    def compact(self):
+        """Fold the journal into a new snapshot."""
+        with self._journal_lock() as journal:
+            self._write_snapshot(self._current(), journal)
@@ -0,0 +1,146 @@
+"""
+Request, template and storage metrics in the Prometheus text format.
+
+Metrics are off unless enabled (``METRICS_ENABLED=1``); only then are the
+request hooks, template signals and storage observer installed, so a disabled
+app does no bookkeeping at all. Observing a value takes a lock and a bisect
+over the bucket bounds.
+"""
+
+import threading
+from bisect import bisect_left
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Histogram:
+    """Bucketed observations per label set, like a Prometheus histogram."""
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, labels=()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        # Counts per bucket; made cumulative when rendered
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                yield (
+                    f"{self.name}_bucket{_labels((*labels, ('le', le)))} {cumulative}"
+                )
+            yield f"{self.name}_sum{_labels(labels)} {series[-1]}"
+            yield f"{self.name}_count{_labels(labels)} {cumulative}"
+
+
+class Counter:
+    """A monotonic count per label set."""
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = {}
+
+    def inc(self, amount=1, labels=()):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._series.items()):
+            yield f"{self.name}{_labels(labels)} {value}"
+
+
+class Metrics:
+    """The metrics of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "Time to handle a request."
+        )
+        self.requests = Counter("http_requests_total", "Requests handled.")
+        self.render_duration = Histogram(
+            "template_render_duration_seconds", "Time to render a template."
+        )
+        self.storage_duration = Histogram(
+            "storage_operation_duration_seconds",
+            "Time to load or save data in storage.",
+        )
+        self.storage_bytes = Counter(
+            "storage_bytes_total", "Bytes read (load) or written (save) by storage."
+        )
+
+    def observe_request(self, endpoint, method, status, seconds):
+        with self._lock:
+            self.request_duration.observe(
+                seconds, (("endpoint", endpoint), ("method", method))
+            )
+            self.requests.inc(
+                1, (("endpoint", endpoint), ("method", method), ("status", status))
+            )
+
+    def observe_render(self, template, seconds):
+        with self._lock:
+            self.render_duration.observe(seconds, (("template", template),))
+
+    def observe_storage(self, backend, operation, seconds, size=None):
+        """Storage observer: ``operation`` is "load" or "save"."""
+        labels = (("backend", backend), ("operation", operation))
+        with self._lock:
+            self.storage_duration.observe(seconds, labels)
+            if size is not None:
+                self.storage_bytes.inc(size, labels)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                line
+                for metric in (
+                    self.request_duration,
+                    self.requests,
+                    self.render_duration,
+                    self.storage_duration,
+                    self.storage_bytes,
+                )
+                for line in metric.render()
+            ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,100 @@
+"""
+Cache of rendered pages.
+
+Pages are cached under a key made of the route, its arguments and the version
+of the data shown (e.g. the space's ``version``), so a change made by any
+worker produces a new key and the old page is never served. Every page is
+also tagged with the entities it shows; the routes that change an entity
+invalidate its pages right away, so they don't linger until evicted.
+
+The least recently used pages are evicted once the cached pages take more
+than ``max_bytes``.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+# Tag of pages that show every entity of a kind (e.g. the list of spaces)
+ALL = "*"
+
+
+class PageCache:
+    """LRU cache of rendered pages with a memory cap."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._pages = OrderedDict()  # key -> (page, size, tags)
+        self._keys = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the page cached under ``key``, or None."""
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, page, tags):
+        """Cache ``page`` under ``key``, tagged with ``(kind, id)`` pairs."""
+        size = sys.getsizeof(page)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._pages[key] = (page, size, tags)
+            self.size += size
+            for tag in tags:
+                self._keys.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._pages)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._pages.pop(key, None)
+        if entry is None:
+            return
+        _, size, tags = entry
+        self.size -= size
+        for tag in tags:
+            keys = self._keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys[tag]
+
+    def invalidate(self, kind, entity_id):
+        """Drop the pages showing entity ``entity_id`` of ``kind``."""
+        with self._lock:
+            for tag in ((kind, entity_id), (kind, ALL)):
+                for key in list(self._keys.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._pages)
+            self._pages.clear()
+            self._keys.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._pages),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
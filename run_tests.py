@@ -33,6 +33,17 @@ def run_tests():
         return False
 
 
+def run_benchmarks(args):
+    """Run the route benchmarks (see benchmark.py for the options)."""
+    print("Running benchmarks for Coworking Admin Panel...")
+    print("=" * 50)
+    result = subprocess.run([sys.executable, "benchmark.py", *args])
+    return result.returncode == 0
+
+
 if __name__ == "__main__":
-    success = run_tests()
+    if sys.argv[1:2] == ["--benchmark"]:
+        success = run_benchmarks(sys.argv[2:])
+    else:
+        success = run_tests()
     sys.exit(0 if success else 1)
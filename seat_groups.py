@@ -0,0 +1,139 @@
+"""
+Search for blocks of adjacent free seats for groups registering together.
+
+Free seats are read off a seat map's availability bitmap a row at a time as
+runs (spans of consecutive free seats). A group that fits in a run sits in one
+row; the tightest runs are offered first, so that longer runs stay free for
+larger groups. Further options are compact rectangles of ``rows`` x ``cols``
+seats: a summed-area table of free seats tells in O(1) whether a rectangle is
+entirely free, and only positions at the start of a long enough run in its top
+row are tried, so a search over a 100x100 floor takes milliseconds.
+"""
+
+import re
+from itertools import accumulate
+
+_FREE_RUN = re.compile("1+")
+
+
+def free_runs(seat_map):
+    """
+    Return for every row (0-based) the ``(start, length)`` runs of its free
+    seats, with 0-based start columns.
+    """
+    rows, cols = seat_map.rows, seat_map.cols
+    bits = int.from_bytes(seat_map.to_bytes(), "little")
+    mask = (1 << cols) - 1
+    runs = []
+    for row in range(rows):
+        # Bit c of the row is column c, so the binary string is reversed
+        row_bits = format(bits >> row * cols & mask, f"0{cols}b")[::-1]
+        runs.append(
+            [
+                (run.start(), run.end() - run.start())
+                for run in _FREE_RUN.finditer(row_bits)
+            ]
+        )
+    return runs
+
+
+def summed_area_table(runs, cols):
+    """
+    Return the summed-area table of free seats as a flat list: entry
+    ``row * (cols + 1) + col`` counts the free seats above ``row`` and left of
+    ``col`` (both 0-based and exclusive).
+    """
+    previous = [0] * (cols + 1)
+    table = list(previous)
+    for row_runs in runs:
+        free = [0] * cols
+        for start, length in row_runs:
+            free[start : start + length] = [1] * length
+        previous = [
+            above + left for above, left in zip(previous, accumulate(free, initial=0))
+        ]
+        table.extend(previous)
+    return table
+
+
+def _shapes(size, rows, cols):
+    """Rectangles of several rows, but no more rows than columns, that hold
+    ``size`` seats, with the fewest spare seats and the most compact first.
+    Only a pair of seats may sit in a single column."""
+    shapes = []
+    for height in range(2, min(rows, size) + 1):
+        width = -(-size // height)
+        if (height <= width or size == 2) and width <= cols:
+            shapes.append((height * width - size, height + width, height, width))
+    return [(height, width) for _, _, height, width in sorted(shapes)]
+
+
+def _group(shape, row, col, height, width, size):
+    seats = [
+        f"{row + 1 + offset // width}-{col + 1 + offset % width}"
+        for offset in range(size)
+    ]
+    return {"shape": shape, "rows": height, "cols": width, "seats": seats}
+
+
+def find_groups(seat_map, size, limit=5):
+    """
+    Return up to ``limit`` blocks of ``size`` adjacent free seats, best first:
+    blocks in one row (tightest fitting run first), then rectangles. Blocks
+    don't overlap each other. Each block is a dict with its ``shape`` ("row"
+    or "block"), ``rows`` and ``cols`` and the ids of its ``seats`` (row by
+    row; a rectangle with spare seats leaves them at the end).
+    """
+    if size < 1:
+        raise ValueError("A group has at least one seat")
+    rows, cols = seat_map.rows, seat_map.cols
+    runs = free_runs(seat_map)
+    groups = []
+    taken = set()
+
+    fitting = sorted(
+        (length - size, row, start)
+        for row, row_runs in enumerate(runs)
+        for start, length in row_runs
+        if length >= size
+    )
+    for _, row, start in fitting[:limit]:
+        groups.append(_group("row", row, start, 1, size, size))
+        taken.update((row, col) for col in range(start, start + size))
+    if len(groups) == limit or size == 1:
+        return groups
+
+    table = summed_area_table(runs, cols)
+    stride = cols + 1
+    widest = [max((length for _, length in row_runs), default=0) for row_runs in runs]
+    for height, width in _shapes(size, rows, cols):
+        area = height * width
+        # Rows starting enough rows that each have a run of ``width`` seats
+        deep = [0] * (rows + 1)
+        for row in range(rows - 1, -1, -1):
+            deep[row] = deep[row + 1] + 1 if widest[row] >= width else 0
+        for row in range(rows - height + 1):
+            if deep[row] < height:
+                continue
+            top, bottom = row * stride, (row + height) * stride
+            for start, length in runs[row]:
+                for col in range(start, start + length - width + 1):
+                    free = (
+                        table[bottom + col + width]
+                        - table[top + col + width]
+                        - table[bottom + col]
+                        + table[top + col]
+                    )
+                    if free != area:
+                        continue
+                    cells = [
+                        (row + offset // width, col + offset % width)
+                        for offset in range(size)
+                    ]
+                    if taken.intersection(cells):
+                        continue
+                    groups.append(_group("block", row, col, height, width, size))
+                    taken.update(cells)
+                    if len(groups) == limit:
+                        return groups
+    return groups
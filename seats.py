@@ -0,0 +1,218 @@
+"""
+Compact seat maps for coworking spaces.
+
+A space's seats form a ``rows`` x ``cols`` grid with ids ``"<row>-<col>"``
+(1-based). Instead of one dict per seat, a ``SeatMap`` keeps one availability
+bit per seat in a ``bytearray`` plus a sparse map of who holds each reserved
+seat, so a 100x100 floor costs about 1.3 KB plus its reservations, and checking
+a seat is O(1). In the data file it is stored as::
+
+    "seat_map": {"rows": 2, "cols": 2, "available": "<base64 bitmap>",
+                 "holders": {"1-2": "John Doe"}, "changed": {"1-2": 3}}
+
+``changed`` records the space version in which each seat last changed, so the
+seats changed since a version a client has seen can be sent on their own.
+
+``layout()``, ``seat()`` and ``seats()`` present the map in the old
+``seat_layout``/``seats`` shape for the seat API and templates.
+"""
+
+import base64
+
+
+class SeatMap:
+    """Availability bitmap and reserved-seat holders of a seat grid."""
+
+    __slots__ = ("rows", "cols", "_available", "holders", "changed")
+
+    def __init__(self, rows, cols, available=None, holders=None, changed=None):
+        self.rows = rows
+        self.cols = cols
+        if available is None:
+            # Every seat available; bits past the last seat stay clear
+            available = bytearray(b"\xff" * (rows * cols // 8))
+            if rows * cols % 8:
+                available.append((1 << rows * cols % 8) - 1)
+        self._available = available
+        self.holders = {} if holders is None else holders
+        self.changed = {} if changed is None else changed
+
+    def _index(self, seat_id):
+        """Return the bit index of ``seat_id``, or None if it isn't in the grid."""
+        row, _, col = str(seat_id).partition("-")
+        if not (row.isdigit() and col.isdigit()):
+            return None
+        row, col = int(row), int(col)
+        if not (1 <= row <= self.rows and 1 <= col <= self.cols):
+            return None
+        return (row - 1) * self.cols + col - 1
+
+    def __contains__(self, seat_id):
+        return self._index(seat_id) is not None
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    def is_available(self, seat_id):
+        """Return whether ``seat_id`` exists and is free."""
+        index = self._index(seat_id)
+        return index is not None and bool(
+            self._available[index >> 3] & 1 << (index & 7)
+        )
+
+    def available_count(self):
+        return sum(bin(byte).count("1") for byte in self._available)
+
+    def unavailable(self):
+        """Yield ``(seat_id, holder)`` for every seat that isn't available."""
+        size = len(self)
+        for byte_index, byte in enumerate(self._available):
+            if byte == 0xFF:
+                continue
+            for index in range(byte_index * 8, min(byte_index * 8 + 8, size)):
+                if not byte & 1 << (index & 7):
+                    row, col = divmod(index, self.cols)
+                    seat_id = f"{row + 1}-{col + 1}"
+                    yield seat_id, self.holders.get(seat_id)
+
+    def copy(self):
+        return SeatMap(
+            self.rows,
+            self.cols,
+            bytearray(self._available),
+            dict(self.holders),
+            dict(self.changed),
+        )
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def set(self, seat_id, available, holder=None, version=None):
+        """
+        Mark an existing seat as available or reserved (by ``holder``), as a
+        change made in space ``version`` if given.
+        """
+        index = self._index(seat_id)
+        if index is None:
+            raise KeyError(seat_id)
+        if version is not None:
+            self.changed[seat_id] = version
+        if available:
+            self._available[index >> 3] |= 1 << (index & 7)
+            self.holders.pop(seat_id, None)
+        else:
+            self._available[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+            if holder is not None:
+                self.holders[seat_id] = holder
+            else:
+                self.holders.pop(seat_id, None)
+
+    def reserved(self, seat_id, holder, version=None):
+        """Return a copy of this map with ``seat_id`` reserved by ``holder``."""
+        seat_map = self.copy()
+        seat_map.set(seat_id, False, holder, version)
+        return seat_map
+
+    def changed_since(self, version):
+        """Return the ids of seats changed after space ``version``."""
+        return [
+            seat_id for seat_id, changed in self.changed.items() if changed > version
+        ]
+
+    # Adapters to the dict-per-seat shape
+
+    def layout(self):
+        """Return seat ids row by row, like the old ``seat_layout``."""
+        return [
+            [f"{row}-{col}" for col in range(1, self.cols + 1)]
+            for row in range(1, self.rows + 1)
+        ]
+
+    def seat(self, seat_id):
+        """Return one seat as a dict, like an entry of the old ``seats``."""
+        row, col = divmod(self._index(seat_id), self.cols)
+        return {
+            "id": seat_id,
+            "row": row + 1,
+            "col": col + 1,
+            "available": self.is_available(seat_id),
+            "reserved_by": self.holders.get(seat_id),
+        }
+
+    def seats(self):
+        """Return all seats as dicts by id, like the old ``seats``."""
+        return {seat_id: self.seat(seat_id) for row in self.layout() for seat_id in row}
+
+    # Serialization
+
+    def to_bytes(self):
+        """Return the availability bitmap (bit ``i`` of byte ``i // 8`` per seat)."""
+        return bytes(self._available)
+
+    def to_json(self):
+        return {
+            "rows": self.rows,
+            "cols": self.cols,
+            "available": base64.b64encode(self._available).decode("ascii"),
+            "holders": self.holders,
+            "changed": self.changed,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data["rows"],
+            data["cols"],
+            bytearray(base64.b64decode(data["available"])),
+            dict(data.get("holders", {})),
+            dict(data.get("changed", {})),
+        )
+
+    @classmethod
+    def from_seats(cls, seat_layout, seats):
+        """Convert the old ``seat_layout``/``seats`` shape to a seat map."""
+        seat_map = cls(len(seat_layout), max(map(len, seat_layout), default=0))
+        for row in seat_layout:
+            for seat_id in row:
+                seat = seats.get(seat_id)
+                if seat_id in seat_map and (seat is None or not seat["available"]):
+                    seat_map.set(seat_id, False, seat and seat.get("reserved_by"))
+        return seat_map
+
+    def __eq__(self, other):
+        if not isinstance(other, SeatMap):
+            return NotImplemented
+        return (
+            self.rows == other.rows
+            and self.cols == other.cols
+            and self._available == other._available
+            and self.holders == other.holders
+            and self.changed == other.changed
+        )
+
+    def __repr__(self):
+        return (
+            f"SeatMap({self.rows}x{self.cols}, "
+            f"{len(self) - self.available_count()} reserved)"
+        )
+
+
+def compact_space(space):
+    """
+    Return ``space`` with its seats as a ``SeatMap`` under ``seat_map``.
+
+    Spaces in the old ``seat_layout``/``seats`` shape (and seat maps read from
+    JSON) are converted; anything else is returned unchanged.
+    """
+    seat_map = space.get("seat_map")
+    if isinstance(seat_map, dict):
+        return {**space, "seat_map": SeatMap.from_json(seat_map)}
+    if seat_map is None and space.get("seat_layout"):
+        seat_map = SeatMap.from_seats(space["seat_layout"], space.get("seats", {}))
+        space = {
+            key: value
+            for key, value in space.items()
+            if key not in ("seat_layout", "seats")
+        }
+        return {**space, "seat_map": seat_map}
+    return space
@@ -0,0 +1,127 @@
+"""
+On-disk formats of the JSON storage backends' data file.
+
+- ``json``: compact JSON (no indentation or spaces after separators)
+- ``pretty-json``: JSON indented by two spaces, as data files used to be
+- ``binary``: a snapshot with a version header and length-prefixed sections::
+
+      b"CWKSNAP" <version: u8>
+      <length: u32> <dataset as compact JSON, seat bitmaps left out>
+      <length: u32> <seat bitmap> ...   one per seat map, in the order of
+                                        their "available" section numbers
+
+  Seat bitmaps are stored as raw bytes instead of base64, and registrations
+  as rows of values under their list of keys instead of repeating the keys in
+  every record. Everything else is parsed by the C JSON parser in one go.
+
+``loads`` detects the format from the data, so a data file can be converted
+(see the ``convert-data`` command) without changing how it is read.
+"""
+
+import json
+import struct
+
+from seats import SeatMap
+
+FORMATS = ("json", "pretty-json", "binary")
+
+MAGIC = b"CWKSNAP"
+VERSION = 1
+_LENGTH = struct.Struct("<I")
+
+
+def _encode(value):
+    """Serialize the non-JSON values of the dataset (``json.dump`` default)."""
+    if isinstance(value, SeatMap):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def detect(raw):
+    """Return the format of serialized data ``raw`` (bytes)."""
+    return "binary" if raw.startswith(MAGIC) else "json"
+
+
+def dumps(data, fmt="json"):
+    """Serialize the dataset ``data`` to bytes in format ``fmt``."""
+    if fmt == "json":
+        return json.dumps(data, separators=(",", ":"), default=_encode).encode()
+    if fmt == "pretty-json":
+        return json.dumps(data, indent=2, default=_encode).encode()
+    if fmt == "binary":
+        return _dump_binary(data)
+    raise ValueError(f"Unknown data format: {fmt}")
+
+
+def loads(raw):
+    """
+    Deserialize a dataset from bytes in any of the formats. Seat maps of JSON
+    data are left as dicts (see ``seats.compact_space``).
+    """
+    if detect(raw) == "binary":
+        return _load_binary(raw)
+    return json.loads(raw)
+
+
+def _dump_binary(data):
+    bitmaps = []
+
+    def encode(value):
+        if isinstance(value, SeatMap):
+            bitmaps.append(value.to_bytes())
+            return {
+                "rows": value.rows,
+                "cols": value.cols,
+                "available": len(bitmaps) - 1,
+                "holders": value.holders,
+                "changed": value.changed,
+            }
+        return _encode(value)
+
+    shapes = {}
+    rows = []
+    for registration in data.get("registrations", ()):
+        keys = tuple(registration)
+        shape = shapes.setdefault(keys, len(shapes))
+        rows.append([shape, *registration.values()])
+    data = {**data, "registrations": {"keys": list(shapes), "rows": rows}}
+
+    document = json.dumps(data, separators=(",", ":"), default=encode).encode()
+    parts = [MAGIC, bytes([VERSION]), _LENGTH.pack(len(document)), document]
+    for bitmap in bitmaps:
+        parts += [_LENGTH.pack(len(bitmap)), bitmap]
+    return b"".join(parts)
+
+
+def _load_binary(raw):
+    version = raw[len(MAGIC)]
+    if version != VERSION:
+        raise ValueError(f"Unsupported data file version: {version}")
+    view = memoryview(raw)
+    offset = len(MAGIC) + 1
+    sections = []
+    while offset < len(raw):
+        (length,) = _LENGTH.unpack_from(raw, offset)
+        offset += _LENGTH.size
+        if offset + length > len(raw):
+            raise ValueError("Truncated data file")
+        sections.append(view[offset : offset + length])
+        offset += length
+    if not sections:
+        raise ValueError("Truncated data file")
+
+    data = json.loads(bytes(sections[0]))
+    table = data.get("registrations", {"keys": [], "rows": []})
+    keys = table["keys"]
+    data["registrations"] = [dict(zip(keys[row[0]], row[1:])) for row in table["rows"]]
+    for space in data.get("coworking_spaces", {}).values():
+        seat_map = space.get("seat_map")
+        if seat_map is not None:
+            space["seat_map"] = SeatMap(
+                seat_map["rows"],
+                seat_map["cols"],
+                bytearray(sections[1 + seat_map["available"]]),
+                seat_map.get("holders", {}),
+                seat_map.get("changed", {}),
+            )
+    return data
@@ -0,0 +1,446 @@
+"""
+Sharded JSON storage backend.
+
+Instead of one data file holding everything, every coworking space (with its
+seats) and every meeting room has a file of its own, registrations are split
+into segments of a fixed number of records, and a small index file lists the
+shards together with a summary of each space and meeting room::
+
+    index.json
+    coworking_spaces/<id>.<generation>.json
+    meeting_rooms/<id>.<generation>.json
+    registrations/<segment>.<generation>.json
+
+A change rewrites only the shards it touches plus the index, and the listing
+pages are served from the index alone. Shards are never overwritten: a changed
+shard is written under a new generation (the revision of the commit) and the
+index is then atomically replaced to point at it, so readers in other
+processes always see a consistent set of files.
+"""
+
+import copy
+import os
+import time
+
+import serialization
+from seats import compact_space
+from storage import (
+    CAS_RETRIES,
+    ConflictError,
+    JsonStorage,
+    Storage,
+    booked_room,
+    default_data,
+    freeze,
+    replace_file,
+    space_record,
+    thaw,
+)
+
+SPACES = "coworking_spaces"
+MEETING_ROOMS = "meeting_rooms"
+REGISTRATIONS = "registrations"
+
+# Fields of spaces and meeting rooms that are only in their shard, not in the
+# summary listed in the index
+DETAIL_FIELDS = ("seat_map", "equipment", "bookings")
+
+# Registrations per segment file; appending a registration rewrites one segment
+SEGMENT_SIZE = 1000
+
+
+def summary(record):
+    """Return the fields of a space or meeting room that the index lists."""
+    return {key: value for key, value in record.items() if key not in DETAIL_FIELDS}
+
+
+def _empty_index(segment_size):
+    return {
+        "revision": 0,
+        "admins": {},
+        SPACES: {},
+        MEETING_ROOMS: {},
+        "registration_count": 0,
+        "segment_size": segment_size,
+        "shards": {SPACES: {}, MEETING_ROOMS: {}, REGISTRATIONS: []},
+    }
+
+
+def _generation(index, kind, key):
+    shards = index["shards"][kind]
+    if kind == REGISTRATIONS:
+        return shards[key] if key < len(shards) else None
+    return shards.get(key)
+
+
+class ShardedStorage(JsonStorage):
+    """
+    Storage backend keeping one file per space, meeting room and segment of
+    registrations under ``directory``, plus an index file.
+
+    The index is cached like ``JsonStorage`` caches its document (revalidated
+    with an ``os.stat``), and every shard that has been read is cached until
+    the index points at a newer generation of it.
+    """
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE, data_format="json"):
+        super().__init__(os.path.join(directory, "index.json"), data_format=data_format)
+        self.directory = directory
+        self.segment_size = segment_size
+        self._shards = {}  # (kind, key) -> (generation, content)
+        self._registration_list = ((), [])  # (segment generations, registrations)
+
+    def _shard_path(self, kind, key, generation):
+        return os.path.join(self.directory, kind, f"{key}.{generation}.json")
+
+    def init(self):
+        """Create the index and shards of the default data if they don't exist."""
+        if os.path.exists(self.path):
+            return
+        with self._writer_lock():
+            if os.path.exists(self.path):
+                return
+            for kind in (SPACES, MEETING_ROOMS, REGISTRATIONS):
+                os.makedirs(os.path.join(self.directory, kind), exist_ok=True)
+            self._save(_empty_index(self.segment_size), default_data())
+
+    def _writer_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return super()._writer_lock()
+
+    def _read(self):
+        """Read the index and forget cached shards it no longer points at."""
+        start = time.perf_counter()
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        index = serialization.loads(raw)
+        self._shards = {
+            (kind, key): shard
+            for (kind, key), shard in self._shards.items()
+            if _generation(index, kind, key) == shard[0]
+        }
+        if self.observer is not None:
+            self.observer("load", time.perf_counter() - start, len(raw))
+        return index
+
+    def _shard(self, kind, key):
+        """Return the content of a shard, or None if there is no such shard."""
+        with self._lock:
+            for _ in range(CAS_RETRIES):
+                index = self._current()
+                generation = _generation(index, kind, key)
+                if generation is None:
+                    return None
+                cached = self._shards.get((kind, key))
+                if cached is not None and cached[0] == generation:
+                    return cached[1]
+                try:
+                    content = self._read_shard(kind, key, generation)
+                except FileNotFoundError:
+                    # Replaced by another process since the index was read
+                    self._data = None
+                    continue
+                self._shards[(kind, key)] = (generation, content)
+                return content
+            raise ConflictError(key)
+
+    def _read_shard(self, kind, key, generation):
+        start = time.perf_counter()
+        with open(self._shard_path(kind, key, generation), "rb") as f:
+            raw = f.read()
+        data = serialization.loads(raw)
+        if kind == REGISTRATIONS:
+            content = data[REGISTRATIONS]
+        else:
+            content = data[kind][key]
+            if kind == SPACES:
+                content = compact_space(content)
+        if self.observer is not None:
+            self.observer("load", time.perf_counter() - start, len(raw))
+        return content
+
+    def _registrations(self):
+        """
+        Return all registrations. Only the segments that changed are read, and
+        while registrations are just appended the same list is extended, so the
+        registration index catches up instead of being rebuilt.
+        """
+        with self._lock:
+            for _ in range(CAS_RETRIES):
+                index = self._current()
+                generations = tuple(index["shards"][REGISTRATIONS])
+                cached_generations, registrations = self._registration_list
+                if generations == cached_generations:
+                    return registrations
+                first = 0
+                while (
+                    first < min(len(generations), len(cached_generations))
+                    and generations[first] == cached_generations[first]
+                ):
+                    first += 1
+                loaded = [
+                    registration
+                    for segment in range(first, len(generations))
+                    for registration in self._shard(REGISTRATIONS, segment)
+                ]
+                if self._current() is not index:
+                    continue  # re-read while the segments were read
+                start = first * index["segment_size"]
+                kept = registrations[start:]
+                if loaded[: len(kept)] == kept:
+                    registrations.extend(loaded[len(kept) :])
+                else:
+                    registrations = registrations[:start] + loaded
+                self._registration_list = (generations, registrations)
+                return registrations
+            raise ConflictError(REGISTRATIONS)
+
+    def _dataset(self):
+        index = self._current()
+        return {
+            SPACES: {key: self._shard(SPACES, key) for key in index[SPACES]},
+            MEETING_ROOMS: {
+                key: self._shard(MEETING_ROOMS, key) for key in index[MEETING_ROOMS]
+            },
+            "admins": index["admins"],
+            REGISTRATIONS: self._registrations(),
+        }
+
+    def load(self):
+        """Return a private, mutable copy of the whole dataset (reads every shard)."""
+        with self._lock:
+            return copy.deepcopy(self._dataset())
+
+    def view(self):
+        """Return a read-only view of the whole dataset (reads every shard)."""
+        with self._lock:
+            return freeze(self._dataset())
+
+    def _mutate(self, change):
+        with self._writer_lock():
+            return Storage._mutate(self, change)
+
+    def save(self, data):
+        """Replace the whole dataset, rewriting only the shards that differ."""
+        with self._writer_lock():
+            self._save(self._current(), thaw(data))
+
+    def _save(self, index, data):
+        changes = {}
+        for kind in (SPACES, MEETING_ROOMS):
+            records = data.get(kind, {})
+            for key, record in records.items():
+                if kind == SPACES:
+                    record = compact_space(record)
+                if key not in index[kind] or self._shard(kind, key) != record:
+                    changes[(kind, key)] = record
+            for key in index[kind]:
+                if key not in records:
+                    changes[(kind, key)] = None
+
+        registrations = data[REGISTRATIONS]
+        size = index["segment_size"]
+        stored = self._registrations() if index["registration_count"] else []
+        segment_count = -(-len(registrations) // size)
+        for segment in range(segment_count):
+            records = registrations[segment * size : (segment + 1) * size]
+            if stored[segment * size : (segment + 1) * size] != records:
+                changes[(REGISTRATIONS, segment)] = records
+        for segment in range(segment_count, len(index["shards"][REGISTRATIONS])):
+            changes[(REGISTRATIONS, segment)] = None
+
+        self._commit(
+            index,
+            changes,
+            admins=data["admins"],
+            registration_count=len(registrations),
+        )
+
+    def _commit(self, index, changes, **fields):
+        """
+        Write the changed shards ``changes`` (``{(kind, key): content}``, None to
+        delete a shard), then a new index pointing at them, as one commit.
+        ``fields`` replace top-level fields of the index.
+        """
+        start = time.perf_counter()
+        revision = index.get("revision", 0) + 1
+        shards = index["shards"]
+        # A new index, so that readers of the old one don't see the change
+        index = {
+            **index,
+            **fields,
+            "revision": revision,
+            SPACES: dict(index[SPACES]),
+            MEETING_ROOMS: dict(index[MEETING_ROOMS]),
+            "shards": {
+                SPACES: dict(shards[SPACES]),
+                MEETING_ROOMS: dict(shards[MEETING_ROOMS]),
+                REGISTRATIONS: list(shards[REGISTRATIONS]),
+            },
+        }
+        written = 0
+        obsolete = []
+        for (kind, key), content in changes.items():
+            generation = _generation(index, kind, key)
+            if generation is not None:
+                obsolete.append(self._shard_path(kind, key, generation))
+            if content is None:
+                if kind == REGISTRATIONS:
+                    index["shards"][kind][key] = None
+                else:
+                    del index["shards"][kind][key]
+                    del index[kind][key]
+                continue
+            document = {kind: content if kind == REGISTRATIONS else {key: content}}
+            raw = serialization.dumps(document, self.data_format)
+            replace_file(self._shard_path(kind, key, revision), raw)
+            written += len(raw)
+            if kind == REGISTRATIONS:
+                segments = index["shards"][kind]
+                segments.extend([None] * (key + 1 - len(segments)))
+                segments[key] = revision
+            else:
+                index["shards"][kind][key] = revision
+                index[kind][key] = summary(content)
+        segments = index["shards"][REGISTRATIONS]
+        while segments and segments[-1] is None:
+            segments.pop()
+
+        raw = serialization.dumps(index, "json")
+        replace_file(self.path, raw)
+        written += len(raw)
+        self._signature = self._stat_signature()
+        self._data = index
+        self.version += 1
+        for (kind, key), content in changes.items():
+            if content is None:
+                self._shards.pop((kind, key), None)
+            else:
+                self._shards[(kind, key)] = (revision, content)
+        for path in obsolete:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        if self.observer is not None:
+            self.observer("save", time.perf_counter() - start, written)
+
+    def _appended(self, index, registration):
+        """
+        Return the id of a new registration and the changed segment storing it.
+        Ids are consecutive, so the id is also the new number of registrations.
+        """
+        registration = {"id": index["registration_count"] + 1, **registration}
+        segment = index["registration_count"] // index["segment_size"]
+        records = list(self._shard(REGISTRATIONS, segment) or ())
+        records.append(registration)
+        return registration["id"], {(REGISTRATIONS, segment): records}
+
+    # Reads
+
+    def admin_password(self, username):
+        return self._current()["admins"].get(username)
+
+    def list_spaces(self):
+        return freeze(self._current()[SPACES])
+
+    def get_space(self, space_id):
+        return freeze(self._shard(SPACES, space_id))
+
+    def list_meeting_rooms(self):
+        return freeze(self._current()[MEETING_ROOMS])
+
+    def get_meeting_room(self, room_id):
+        return freeze(self._shard(MEETING_ROOMS, room_id))
+
+    def count_meeting_rooms(self):
+        return len(self._current()[MEETING_ROOMS])
+
+    def list_registrations(self):
+        return freeze(self._registrations())
+
+    # Writes
+
+    def modify_space(self, space_id, change, registration=None):
+        for _ in range(CAS_RETRIES):
+            current = self.get_space(space_id)
+            if current is None:
+                return None
+            space = copy.deepcopy(thaw(current))
+            change(space)
+            expected_version = space.get("version", 0)
+            space["version"] = expected_version + 1
+            with self._writer_lock():
+                stored = self._shard(SPACES, space_id)
+                if stored is None:
+                    return None
+                if stored.get("version", 0) != expected_version:
+                    continue
+                index = self._current()
+                changes = {(SPACES, space_id): space}
+                result = True
+                fields = {}
+                if registration is not None:
+                    result, segment = self._appended(index, registration)
+                    changes.update(segment)
+                    fields["registration_count"] = result
+                self._commit(index, changes, **fields)
+                return result
+        raise ConflictError(space_id)
+
+    def add_space(self, space):
+        with self._writer_lock():
+            index = self._current()
+            new_id = str(len(index[SPACES]) + 1)
+            self._commit(index, {(SPACES, new_id): space_record(space)})
+            return new_id
+
+    def delete_space(self, space_id):
+        with self._writer_lock():
+            index = self._current()
+            if space_id not in index[SPACES]:
+                return False
+            self._commit(index, {(SPACES, space_id): None})
+            return True
+
+    def add_meeting_room(self, room):
+        with self._writer_lock():
+            index = self._current()
+            new_id = str(len(index[MEETING_ROOMS]) + 1)
+            self._commit(index, {(MEETING_ROOMS, new_id): room})
+            return new_id
+
+    def update_meeting_room(self, room_id, **fields):
+        with self._writer_lock():
+            room = self._shard(MEETING_ROOMS, room_id)
+            if room is None:
+                return False
+            self._commit(
+                self._current(), {(MEETING_ROOMS, room_id): {**room, **fields}}
+            )
+            return True
+
+    def add_registration(self, registration):
+        if not registration["is_meeting_room"]:
+            return super().add_registration(registration)
+        room_id = registration["space_id"][3:]
+        with self._writer_lock():
+            index = self._current()
+            room = self._shard(MEETING_ROOMS, room_id)
+            if room is None:
+                raise KeyError(room_id)
+            registration_id, changes = self._appended(index, registration)
+            changes[(MEETING_ROOMS, room_id)] = booked_room(
+                room, registration, registration_id
+            )
+            self._commit(index, changes, registration_count=registration_id)
+            return registration_id
+
+
+def migrate_json(json_path, directory, data_format="json"):
+    """Copy the dataset from a JSON data file into sharded storage."""
+    data = JsonStorage(json_path).load()
+    storage = ShardedStorage(directory, data_format=data_format)
+    storage.init()
+    storage.save(data)
+    return data
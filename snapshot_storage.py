@@ -0,0 +1,393 @@
+"""
+Memory-mapped snapshot storage backend.
+
+The committed dataset is one immutable snapshot file that every worker maps
+read-only, so the operating system keeps a single copy of it in its page cache
+however many workers there are. Each record (space, meeting room or
+registration) is stored as its own compact JSON blob, and an offset index
+finds the blob of an entity id; records are only decoded when they are read::
+
+    b"CWKMMAP" <version: u8>
+    <registration blobs> <space blobs> <meeting room blobs>
+    <registration offsets: u64 * (count + 1)>   padded to 8 bytes
+    <header: JSON>   revision, admins, and the offset, length and listing
+                     fields (see ``sharded_storage.summary``) of every space
+                     and meeting room
+    <header offset: u64> <header length: u32>
+
+A commit writes a new snapshot next to the current one and renames it over
+it; blobs of unchanged records are copied from the current mapping without
+being decoded, and registrations are only ever appended after the existing
+ones. Readers notice the new file with an ``os.stat`` and map it, while
+mappings of the old one stay valid for the requests still using it.
+"""
+
+import copy
+import json
+import mmap
+import struct
+import time
+from array import array
+from collections.abc import Sequence
+
+import serialization
+from seats import compact_space
+from sharded_storage import MEETING_ROOMS, SPACES, summary
+from storage import (
+    CAS_RETRIES,
+    ConflictError,
+    JsonStorage,
+    Storage,
+    booked_room,
+    freeze,
+    replace_file,
+    space_record,
+    thaw,
+)
+
+MAGIC = b"CWKMMAP"
+VERSION = 1
+_FOOTER = struct.Struct("<QI")
+_START = len(MAGIC) + 1
+
+
+class Snapshot:
+    """A read-only mapping of a snapshot file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a snapshot file: {path}")
+        if self._map[len(MAGIC)] != VERSION:
+            raise ValueError(f"Unsupported snapshot version: {self._map[len(MAGIC)]}")
+        offset, length = _FOOTER.unpack_from(self._map, len(self._map) - _FOOTER.size)
+        header = json.loads(self._map[offset : offset + length])
+        self.size = len(self._map)
+        self.revision = header["revision"]
+        self.epoch = header["registrations_epoch"]
+        self.admins = header["admins"]
+        self.entries = {kind: header[kind] for kind in (SPACES, MEETING_ROOMS)}
+        self.summaries = {
+            kind: {key: entry[2] for key, entry in entries.items()}
+            for kind, entries in self.entries.items()
+        }
+        table, self.registration_count = header["registrations"]
+        self.bounds = memoryview(self._map)[
+            table : table + 8 * (self.registration_count + 1)
+        ].cast("Q")
+
+    def blob(self, kind, key):
+        """Return the encoded record of a space or meeting room, or None."""
+        entry = self.entries[kind].get(key)
+        if entry is None:
+            return None
+        return memoryview(self._map)[entry[0] : entry[0] + entry[1]]
+
+    def record(self, kind, key):
+        """Decode a space or meeting room, or return None if there is none."""
+        entry = self.entries[kind].get(key)
+        if entry is None:
+            return None
+        record = json.loads(self._map[entry[0] : entry[0] + entry[1]])
+        return compact_space(record) if kind == SPACES else record
+
+    def registration(self, position):
+        return json.loads(self._map[self.bounds[position] : self.bounds[position + 1]])
+
+
+class SnapshotRegistrations(Sequence):
+    """
+    The registrations of the current snapshot, decoded on access.
+
+    While registrations are only appended, the storage keeps this sequence and
+    points it at each new snapshot, so the registration index catches up
+    instead of being rebuilt.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return self.snapshot.registration_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.snapshot.registration(index)
+
+
+def dump(revision, epoch, admins, records, registrations, base=None):
+    """
+    Return the chunks of a snapshot file.
+
+    ``records`` maps ``SPACES`` and ``MEETING_ROOMS`` to ``{id: record}``, where
+    a record of None is copied from snapshot ``base``. ``registrations`` are
+    appended after those of ``base``.
+    """
+    chunks = [MAGIC, bytes([VERSION])]
+    offset = _START
+    if base is None:
+        bounds = array("Q", [offset])
+    else:
+        bounds = array("Q")
+        bounds.frombytes(base.bounds.cast("B"))
+        region = memoryview(base._map)[_START : base.bounds[-1]]
+        chunks.append(region)
+        offset += len(region)
+    for registration in registrations:
+        blob = serialization.dumps(registration)
+        chunks.append(blob)
+        offset += len(blob)
+        bounds.append(offset)
+
+    header = {
+        "revision": revision,
+        "registrations_epoch": epoch,
+        "admins": admins,
+    }
+    for kind in (SPACES, MEETING_ROOMS):
+        entries = header[kind] = {}
+        for key, record in records[kind].items():
+            if record is None:
+                blob = base.blob(kind, key)
+                fields = base.summaries[kind][key]
+            else:
+                blob = serialization.dumps(record)
+                fields = summary(record)
+            chunks.append(blob)
+            entries[key] = [offset, len(blob), fields]
+            offset += len(blob)
+
+    padding = -offset % 8
+    chunks.append(bytes(padding))
+    offset += padding
+    header["registrations"] = [offset, len(bounds) - 1]
+    table = bounds.tobytes()
+    raw = json.dumps(header, separators=(",", ":")).encode()
+    chunks += [table, raw, _FOOTER.pack(offset + len(table), len(raw))]
+    return chunks
+
+
+class SnapshotStorage(JsonStorage):
+    """
+    Storage backend keeping the dataset in a memory-mapped snapshot file.
+
+    Only the header of a snapshot (listing fields of spaces and meeting rooms)
+    is decoded when it is mapped; each read decodes just the records it
+    returns. Changes are applied under the writer lock of ``JsonStorage``.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._registration_list = None
+
+    def _write(self, data):
+        # Only used for the default data of a new snapshot
+        records = {
+            SPACES: {
+                key: compact_space(space)
+                for key, space in data["coworking_spaces"].items()
+            },
+            MEETING_ROOMS: dict(data["meeting_rooms"]),
+        }
+        self._publish(dump(0, 0, data["admins"], records, data["registrations"]))
+
+    def _read(self):
+        start = time.perf_counter()
+        snapshot = Snapshot(self.path)
+        if self.observer is not None:
+            # Only the header is read; records are paged in as they are decoded
+            self.observer("load", time.perf_counter() - start, None)
+        return snapshot
+
+    def _publish(self, chunks):
+        start = time.perf_counter()
+        replace_file(self.path, *chunks)
+        self._signature = self._stat_signature()
+        self._data = Snapshot(self.path)
+        self.version += 1
+        if self.observer is not None:
+            self.observer("save", time.perf_counter() - start, self._data.size)
+
+    def revision(self):
+        return self._current().revision
+
+    def _registrations(self):
+        with self._lock:
+            snapshot = self._current()
+            registrations = self._registration_list
+            if registrations is None or registrations.snapshot.epoch != snapshot.epoch:
+                registrations = self._registration_list = SnapshotRegistrations(
+                    snapshot
+                )
+            else:
+                registrations.snapshot = snapshot
+            return registrations
+
+    def _dataset(self):
+        snapshot = self._current()
+        data = {
+            kind: {key: snapshot.record(kind, key) for key in snapshot.entries[kind]}
+            for kind in (SPACES, MEETING_ROOMS)
+        }
+        data["admins"] = snapshot.admins
+        data["registrations"] = list(self._registrations())
+        return data
+
+    def load(self):
+        """Return a private, mutable copy of the whole dataset (decodes it all)."""
+        return copy.deepcopy(self._dataset())
+
+    def view(self):
+        """Return a read-only view of the whole dataset (decodes it all)."""
+        return freeze(self._dataset())
+
+    def _mutate(self, change):
+        with self._writer_lock():
+            return Storage._mutate(self, change)
+
+    def save(self, data):
+        """Replace the whole dataset with ``data`` in a new snapshot."""
+        data = thaw(data)
+        with self._writer_lock():
+            revision = self._current().revision + 1
+            records = {
+                SPACES: {
+                    key: compact_space(space)
+                    for key, space in data["coworking_spaces"].items()
+                },
+                MEETING_ROOMS: dict(data.get("meeting_rooms", {})),
+            }
+            # A new registrations epoch: they weren't just appended to
+            self._publish(
+                dump(revision, revision, data["admins"], records, data["registrations"])
+            )
+
+    def _commit(self, changes, registrations=()):
+        """
+        Publish the current snapshot with ``changes`` (``{(kind, id): record}``,
+        None to delete) applied and ``registrations`` appended.
+        """
+        snapshot = self._current()
+        records = {
+            kind: dict.fromkeys(snapshot.entries[kind])
+            for kind in (SPACES, MEETING_ROOMS)
+        }
+        for (kind, key), record in changes.items():
+            if record is None:
+                del records[kind][key]
+            else:
+                records[kind][key] = record
+        self._publish(
+            dump(
+                snapshot.revision + 1,
+                snapshot.epoch,
+                snapshot.admins,
+                records,
+                registrations,
+                base=snapshot,
+            )
+        )
+
+    # Reads
+
+    def admin_password(self, username):
+        return self._current().admins.get(username)
+
+    def list_spaces(self):
+        return freeze(self._current().summaries[SPACES])
+
+    def get_space(self, space_id):
+        return freeze(self._current().record(SPACES, space_id))
+
+    def list_meeting_rooms(self):
+        return freeze(self._current().summaries[MEETING_ROOMS])
+
+    def get_meeting_room(self, room_id):
+        return freeze(self._current().record(MEETING_ROOMS, room_id))
+
+    def count_meeting_rooms(self):
+        return len(self._current().entries[MEETING_ROOMS])
+
+    def list_registrations(self):
+        return freeze(list(self._registrations()))
+
+    # Writes
+
+    def modify_space(self, space_id, change, registration=None):
+        for _ in range(CAS_RETRIES):
+            current = self.get_space(space_id)
+            if current is None:
+                return None
+            space = copy.deepcopy(thaw(current))
+            change(space)
+            expected_version = space.get("version", 0)
+            space["version"] = expected_version + 1
+            with self._writer_lock():
+                snapshot = self._current()
+                stored = snapshot.record(SPACES, space_id)
+                if stored is None:
+                    return None
+                if stored.get("version", 0) != expected_version:
+                    continue
+                if registration is None:
+                    self._commit({(SPACES, space_id): space})
+                    return True
+                registration = {"id": snapshot.registration_count + 1, **registration}
+                self._commit({(SPACES, space_id): space}, [registration])
+                return registration["id"]
+        raise ConflictError(space_id)
+
+    def add_space(self, space):
+        with self._writer_lock():
+            new_id = str(len(self._current().entries[SPACES]) + 1)
+            self._commit({(SPACES, new_id): space_record(space)})
+            return new_id
+
+    def delete_space(self, space_id):
+        with self._writer_lock():
+            if space_id not in self._current().entries[SPACES]:
+                return False
+            self._commit({(SPACES, space_id): None})
+            return True
+
+    def add_meeting_room(self, room):
+        with self._writer_lock():
+            new_id = str(len(self._current().entries[MEETING_ROOMS]) + 1)
+            self._commit({(MEETING_ROOMS, new_id): room})
+            return new_id
+
+    def update_meeting_room(self, room_id, **fields):
+        with self._writer_lock():
+            room = self._current().record(MEETING_ROOMS, room_id)
+            if room is None:
+                return False
+            self._commit({(MEETING_ROOMS, room_id): {**room, **fields}})
+            return True
+
+    def add_registration(self, registration):
+        if not registration["is_meeting_room"]:
+            return super().add_registration(registration)
+        room_id = registration["space_id"][3:]
+        with self._writer_lock():
+            snapshot = self._current()
+            room = snapshot.record(MEETING_ROOMS, room_id)
+            if room is None:
+                raise KeyError(room_id)
+            registration = {"id": snapshot.registration_count + 1, **registration}
+            room = booked_room(room, registration, registration["id"])
+            self._commit({(MEETING_ROOMS, room_id): room}, [registration])
+            return registration["id"]
+
+
+def migrate_json(json_path, snapshot_path):
+    """Copy the dataset from a JSON data file into a snapshot file."""
+    data = JsonStorage(json_path).load()
+    storage = SnapshotStorage(snapshot_path)
+    storage.save(data)
+    return data
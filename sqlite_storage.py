@@ -0,0 +1,797 @@
+"""
+SQLite storage backend.
+
+Every entity lives in its own table, so each route runs the targeted, indexed
+query it needs instead of parsing and rewriting the whole dataset.
+
+Each thread (or greenlet, under gevent) leases a connection from a pool of the
+storage and gives it back when it ends; the schema is created or migrated once,
+by the first. A write transaction that finds the database locked by another
+process retries with ``time.sleep`` until ``BUSY_TIMEOUT`` instead of waiting
+in SQLite, so under gevent the other greenlets of the worker run meanwhile.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from bookings import BookingConflictError
+from importer import apply_import
+from indexes import EQUALITY_FILTERS
+from seats import SeatMap
+from storage import (
+    CAS_RETRIES,
+    ConflictError,
+    JsonStorage,
+    SeatUnavailableError,
+    Storage,
+    default_data,
+    space_record,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS coworking_spaces (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    current_occupancy INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    seat_rows INTEGER NOT NULL DEFAULT 0,
+    seat_cols INTEGER NOT NULL DEFAULT 0,
+    uuid TEXT
+);
+
+-- Only seats that aren't available or have changed (with the space version
+-- of the change); the grid size is on the space
+CREATE TABLE IF NOT EXISTS seats (
+    space_id TEXT NOT NULL REFERENCES coworking_spaces (id) ON DELETE CASCADE,
+    seat_id TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    col INTEGER NOT NULL,
+    available INTEGER NOT NULL DEFAULT 1,
+    reserved_by TEXT,
+    changed_version INTEGER,
+    PRIMARY KEY (space_id, seat_id)
+);
+CREATE INDEX IF NOT EXISTS seats_space_available ON seats (space_id, available);
+
+CREATE TABLE IF NOT EXISTS equipment (
+    id INTEGER PRIMARY KEY,
+    space_id TEXT NOT NULL REFERENCES coworking_spaces (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS equipment_space ON equipment (space_id);
+
+CREATE TABLE IF NOT EXISTS meeting_rooms (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    current_occupancy INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS registrations (
+    id INTEGER PRIMARY KEY,
+    first_name TEXT,
+    last_name TEXT,
+    email TEXT,
+    phone TEXT,
+    company TEXT,
+    space_id TEXT NOT NULL,
+    space_name TEXT,
+    membership_type TEXT,
+    start_date TEXT,
+    additional_info TEXT,
+    submitted_at TEXT,
+    is_meeting_room INTEGER NOT NULL DEFAULT 0,
+    selected_seat TEXT,
+    booking_start TEXT,
+    booking_end TEXT
+);
+CREATE INDEX IF NOT EXISTS registrations_space ON registrations (space_id);
+CREATE INDEX IF NOT EXISTS registrations_email ON registrations (email);
+CREATE INDEX IF NOT EXISTS registrations_start_date ON registrations (start_date);
+CREATE INDEX IF NOT EXISTS registrations_membership_type
+    ON registrations (membership_type);
+
+CREATE TABLE IF NOT EXISTS admins (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+
+-- Number of committed write transactions
+CREATE TABLE IF NOT EXISTS data_revision (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    revision INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO data_revision (id, revision) VALUES (1, 0);
+"""
+
+ENTITY_COLUMNS = ("name", "location", "capacity", "current_occupancy")
+REGISTRATION_COLUMNS = (
+    "first_name",
+    "last_name",
+    "email",
+    "phone",
+    "company",
+    "space_id",
+    "space_name",
+    "membership_type",
+    "start_date",
+    "additional_info",
+    "submitted_at",
+    "is_meeting_room",
+    "selected_seat",
+    "booking_start",
+    "booking_end",
+)
+
+
+# Registrations read per query when iterating over all of them
+EXPORT_BATCH_SIZE = 500
+
+# Seconds a write transaction waits for the database to be unlocked, and
+# between attempts, from the first to the longest
+BUSY_TIMEOUT = 30
+BUSY_POLL_INTERVAL = 0.001
+BUSY_POLL_MAX_INTERVAL = 0.05
+
+# Connections kept open in the pool while no thread uses them
+IDLE_CONNECTIONS = 16
+
+
+def _filter_conditions(filters):
+    """Return SQL conditions and parameters for registration listing filters."""
+    conditions, params = [], []
+    for field in EQUALITY_FILTERS:
+        if field in filters:
+            conditions.append(f"{field} = ?")
+            params.append(filters[field])
+    if "submitted_from" in filters:
+        conditions.append("substr(submitted_at, 1, 10) >= ?")
+        params.append(filters["submitted_from"])
+    if "submitted_to" in filters:
+        conditions.append("substr(submitted_at, 1, 10) <= ?")
+        params.append(filters["submitted_to"])
+    return conditions, params
+
+
+def _position(seat_id):
+    row, col = seat_id.split("-")
+    return int(row), int(col)
+
+
+def _entity(row):
+    return {column: row[column] for column in ENTITY_COLUMNS}
+
+
+def _space_entity(row):
+    space = {**_entity(row), "version": row["version"]}
+    if row["uuid"] is not None:
+        space["uuid"] = row["uuid"]
+    return space
+
+
+def _registration(row):
+    registration = {"id": row["id"]}
+    for column in REGISTRATION_COLUMNS:
+        registration[column] = row[column]
+    registration["is_meeting_room"] = bool(registration["is_meeting_room"])
+    for column in ("selected_seat", "booking_start", "booking_end"):
+        if registration[column] is None:
+            del registration[column]
+    return registration
+
+
+def _retry_busy(execute):
+    """
+    Return ``execute()``, retried while the database is locked by another
+    connection, sleeping in between, for up to ``BUSY_TIMEOUT`` seconds.
+    """
+    deadline = time.monotonic() + BUSY_TIMEOUT
+    delay = BUSY_POLL_INTERVAL
+    while True:
+        try:
+            return execute()
+        except sqlite3.OperationalError as e:
+            if e.sqlite_errorcode != sqlite3.SQLITE_BUSY:
+                raise
+            if time.monotonic() >= deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, BUSY_POLL_MAX_INTERVAL)
+
+
+class _Lease:
+    """A pooled connection used by one thread, given back when it ends."""
+
+    def __init__(self, conn, idle):
+        self.conn = conn
+        self.idle = idle
+
+    def __del__(self):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        if len(self.idle) < IDLE_CONNECTIONS:
+            self.idle.append(self.conn)
+        else:
+            self.conn.close()
+
+
+class SqliteStorage(Storage):
+    """Storage backend keeping normalized, indexed tables in a SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._idle = []
+        self._schema_lock = threading.Lock()
+        self._schema_created = False
+
+    @property
+    def _conn(self):
+        # sqlite3 connections can't be used by two threads at once, so each
+        # thread leases its own until it ends
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            try:
+                conn = self._idle.pop()
+            except IndexError:
+                conn = self._connect()
+            lease = self._local.lease = _Lease(conn, self._idle)
+        return lease.conn
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path, isolation_level=None, timeout=0, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        with self._schema_lock:
+            if not self._schema_created:
+                _retry_busy(lambda: conn.execute("PRAGMA journal_mode = WAL"))
+                self._create_schema(conn)
+                self._schema_created = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn
+        start = time.perf_counter()
+        _retry_busy(lambda: conn.execute("BEGIN IMMEDIATE"))
+        try:
+            yield conn
+            conn.execute("UPDATE data_revision SET revision = revision + 1")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        if self.observer is not None:
+            # SQLite doesn't tell how many bytes a transaction wrote
+            self.observer("save", time.perf_counter() - start, None)
+
+    def _create_schema(self, conn):
+        # One write transaction: workers starting at the same time wait for
+        # each other, so only the first creates or migrates the schema
+        _retry_busy(lambda: conn.executescript("BEGIN IMMEDIATE;" + SCHEMA))
+        try:
+            self._migrate_schema(conn)
+            if conn.execute("SELECT 1 FROM admins LIMIT 1").fetchone() is None:
+                conn.executemany(
+                    "INSERT INTO admins (username, password) VALUES (?, ?)",
+                    default_data()["admins"].items(),
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _migrate_schema(self, conn):
+        columns = {
+            row["name"] for row in conn.execute("PRAGMA table_info(coworking_spaces)")
+        }
+        if "version" not in columns:
+            # Databases created before spaces were versioned
+            conn.execute(
+                "ALTER TABLE coworking_spaces "
+                "ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+            )
+        if "seat_rows" not in columns:
+            # Databases that stored a row for every seat of the grid
+            for column, size in (("seat_rows", "row"), ("seat_cols", "col")):
+                conn.execute(
+                    f"ALTER TABLE coworking_spaces "
+                    f"ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+                )
+                conn.execute(
+                    f"UPDATE coworking_spaces SET {column} = COALESCE(("
+                    f"SELECT MAX({size}) FROM seats "
+                    f"WHERE seats.space_id = coworking_spaces.id), 0)"
+                )
+            conn.execute("DELETE FROM seats WHERE available = 1")
+        if "uuid" not in columns:
+            # Databases created before spaces had a uuid
+            conn.execute("ALTER TABLE coworking_spaces ADD COLUMN uuid TEXT")
+        seat_columns = {row["name"] for row in conn.execute("PRAGMA table_info(seats)")}
+        if "changed_version" not in seat_columns:
+            conn.execute("ALTER TABLE seats ADD COLUMN changed_version INTEGER")
+        registration_columns = {
+            row["name"] for row in conn.execute("PRAGMA table_info(registrations)")
+        }
+        if "booking_start" not in registration_columns:
+            # Databases created before meeting rooms were booked by time slot
+            for column in ("booking_start", "booking_end"):
+                conn.execute(f"ALTER TABLE registrations ADD COLUMN {column} TEXT")
+        # The bookings of each meeting room in order, for conflict checks
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS registrations_booking "
+            "ON registrations (space_id, booking_start) "
+            "WHERE booking_start IS NOT NULL"
+        )
+
+    def init(self):
+        # Connecting creates the schema and the default admin
+        self._conn
+
+    # Whole dataset
+
+    def load(self):
+        conn = self._conn
+        rooms = self.list_meeting_rooms()
+        for row in conn.execute(
+            "SELECT space_id, booking_start, booking_end, id FROM registrations "
+            "WHERE booking_start IS NOT NULL ORDER BY space_id, booking_start"
+        ):
+            room = rooms.get(row["space_id"][3:])
+            if room is not None:
+                room.setdefault("bookings", []).append(list(row)[1:])
+        return {
+            "coworking_spaces": self._all_spaces(conn),
+            "meeting_rooms": rooms,
+            "admins": {
+                row["username"]: row["password"]
+                for row in conn.execute("SELECT * FROM admins ORDER BY rowid")
+            },
+            "registrations": self.list_registrations(),
+        }
+
+    def view(self):
+        return self.load()
+
+    def _all_spaces(self, conn):
+        return {
+            row["id"]: self._space(conn, row)
+            for row in conn.execute("SELECT * FROM coworking_spaces ORDER BY rowid")
+        }
+
+    def save(self, data):
+        with self._transaction() as conn:
+            for table in (
+                "coworking_spaces",
+                "meeting_rooms",
+                "registrations",
+                "admins",
+            ):
+                conn.execute(f"DELETE FROM {table}")
+            for space_id, space in data["coworking_spaces"].items():
+                self._insert_space(conn, space_id, space)
+            for room_id, room in data.get("meeting_rooms", {}).items():
+                self._insert_meeting_room(conn, room_id, room)
+            for registration in data["registrations"]:
+                self._insert_registration(conn, registration)
+            conn.executemany(
+                "INSERT INTO admins (username, password) VALUES (?, ?)",
+                data["admins"].items(),
+            )
+
+    def revision(self):
+        return self._conn.execute("SELECT revision FROM data_revision").fetchone()[0]
+
+    # Reads
+
+    def admin_password(self, username):
+        row = self._conn.execute(
+            "SELECT password FROM admins WHERE username = ?", (username,)
+        ).fetchone()
+        return row["password"] if row else None
+
+    def list_spaces(self):
+        rows = self._conn.execute("SELECT * FROM coworking_spaces ORDER BY rowid")
+        return {row["id"]: _space_entity(row) for row in rows}
+
+    def get_space(self, space_id):
+        conn = self._conn
+        row = conn.execute(
+            "SELECT * FROM coworking_spaces WHERE id = ?", (space_id,)
+        ).fetchone()
+        return self._space(conn, row) if row else None
+
+    def _space(self, conn, row):
+        space = _space_entity(row)
+        space["equipment"] = [
+            {"name": item["name"], "quantity": item["quantity"]}
+            for item in conn.execute(
+                "SELECT name, quantity FROM equipment WHERE space_id = ? ORDER BY id",
+                (row["id"],),
+            )
+        ]
+        if row["seat_rows"]:
+            seat_map = SeatMap(row["seat_rows"], row["seat_cols"])
+            for seat in conn.execute(
+                "SELECT seat_id, available, reserved_by, changed_version "
+                "FROM seats WHERE space_id = ?",
+                (row["id"],),
+            ):
+                seat_map.set(
+                    seat["seat_id"],
+                    bool(seat["available"]),
+                    seat["reserved_by"],
+                    seat["changed_version"],
+                )
+            space["seat_map"] = seat_map
+        return space
+
+    def list_meeting_rooms(self):
+        rows = self._conn.execute("SELECT * FROM meeting_rooms ORDER BY rowid")
+        return {row["id"]: _entity(row) for row in rows}
+
+    def get_meeting_room(self, room_id):
+        row = self._conn.execute(
+            "SELECT * FROM meeting_rooms WHERE id = ?", (room_id,)
+        ).fetchone()
+        return _entity(row) if row else None
+
+    def count_meeting_rooms(self):
+        return self._conn.execute("SELECT COUNT(*) FROM meeting_rooms").fetchone()[0]
+
+    def list_registrations(self):
+        rows = self._conn.execute("SELECT * FROM registrations ORDER BY id")
+        return [_registration(row) for row in rows]
+
+    def find_registrations(self, **criteria):
+        unknown = set(criteria) - set(REGISTRATION_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown registration fields: {sorted(unknown)}")
+        where = " AND ".join(f"{column} = ?" for column in criteria) or "1"
+        rows = self._conn.execute(
+            f"SELECT * FROM registrations WHERE {where} ORDER BY id",
+            tuple(criteria.values()),
+        )
+        return [_registration(row) for row in rows]
+
+    def page_registrations(self, limit, before_id=None, **filters):
+        conditions, params = _filter_conditions(filters)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        where = " AND ".join(conditions) or "1"
+        rows = self._conn.execute(
+            f"SELECT * FROM registrations WHERE {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit + 1),
+        )
+        page = [_registration(row) for row in rows]
+        if len(page) > limit:
+            return page[:limit], page[limit - 1]["id"]
+        return page, None
+
+    def iter_registrations(self, **filters):
+        # Read in short keyset batches instead of one long-lived cursor, so a
+        # slow download doesn't hold a read transaction open
+        conditions, params = _filter_conditions(filters)
+        where = " AND ".join(conditions + ["id > ?"])
+        last_id = 0
+        while True:
+            rows = self._conn.execute(
+                f"SELECT * FROM registrations WHERE {where} ORDER BY id LIMIT ?",
+                (*params, last_id, EXPORT_BATCH_SIZE),
+            ).fetchall()
+            for row in rows:
+                yield _registration(row)
+            if len(rows) < EXPORT_BATCH_SIZE:
+                return
+            last_id = rows[-1]["id"]
+
+    # Writes
+
+    def _insert_space(self, conn, space_id, space):
+        seat_map = space.get("seat_map")
+        conn.execute(
+            "INSERT INTO coworking_spaces (id, name, location, capacity, "
+            "current_occupancy, version, seat_rows, seat_cols, uuid) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                space_id,
+                space["name"],
+                space["location"],
+                space["capacity"],
+                space.get("current_occupancy", 0),
+                space.get("version", 0),
+                seat_map.rows if seat_map else 0,
+                seat_map.cols if seat_map else 0,
+                space.get("uuid"),
+            ),
+        )
+        self._insert_space_children(conn, space_id, space)
+
+    def _insert_space_children(self, conn, space_id, space):
+        conn.executemany(
+            "INSERT INTO equipment (space_id, name, quantity) VALUES (?, ?, ?)",
+            [
+                (space_id, item["name"], item["quantity"])
+                for item in space.get("equipment", [])
+            ],
+        )
+        seat_map = space.get("seat_map")
+        if seat_map is not None:
+            taken = dict(seat_map.unavailable())
+            conn.executemany(
+                "INSERT INTO seats (space_id, seat_id, row, col, available, "
+                "reserved_by, changed_version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        space_id,
+                        seat_id,
+                        *_position(seat_id),
+                        seat_id not in taken,
+                        taken.get(seat_id),
+                        seat_map.changed.get(seat_id),
+                    )
+                    for seat_id in {**taken, **seat_map.changed}
+                ],
+            )
+
+    def _insert_meeting_room(self, conn, room_id, room):
+        conn.execute(
+            "INSERT INTO meeting_rooms (id, name, location, capacity, "
+            "current_occupancy) VALUES (?, ?, ?, ?, ?)",
+            (
+                room_id,
+                room["name"],
+                room["location"],
+                room["capacity"],
+                room.get("current_occupancy", 0),
+            ),
+        )
+
+    def _insert_registration(self, conn, registration):
+        cursor = conn.execute(
+            f"INSERT INTO registrations (id, {', '.join(REGISTRATION_COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' for _ in REGISTRATION_COLUMNS)})",
+            (
+                registration.get("id"),
+                *(registration.get(column) for column in REGISTRATION_COLUMNS),
+            ),
+        )
+        return cursor.lastrowid
+
+    def _update(self, table, entity_id, fields):
+        unknown = set(fields) - set(ENTITY_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown {table} fields: {sorted(unknown)}")
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        if table == "coworking_spaces":
+            assignments += ", version = version + 1"
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE {table} SET {assignments} WHERE id = ?",
+                (*fields.values(), entity_id),
+            )
+        return cursor.rowcount == 1
+
+    def add_space(self, space):
+        with self._transaction() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM coworking_spaces").fetchone()[0]
+            new_id = str(count + 1)
+            # Same id scheme as the JSON backend, which overwrites on reuse
+            conn.execute("DELETE FROM coworking_spaces WHERE id = ?", (new_id,))
+            self._insert_space(conn, new_id, space_record(space))
+        return new_id
+
+    def update_space(self, space_id, **fields):
+        return self._update("coworking_spaces", space_id, fields)
+
+    def modify_space(self, space_id, change, registration=None):
+        for _ in range(CAS_RETRIES):
+            space = self.get_space(space_id)
+            if space is None:
+                return None
+            change(space)
+            try:
+                with self._transaction() as conn:
+                    cursor = conn.execute(
+                        "UPDATE coworking_spaces SET name = ?, location = ?, "
+                        "capacity = ?, current_occupancy = ?, "
+                        "version = version + 1 WHERE id = ? AND version = ?",
+                        (
+                            space["name"],
+                            space["location"],
+                            space["capacity"],
+                            space["current_occupancy"],
+                            space_id,
+                            space["version"],
+                        ),
+                    )
+                    if cursor.rowcount != 1:
+                        # Changed (or deleted) since it was read: roll back
+                        # rather than commit a new revision with no change
+                        raise ConflictError(space_id)
+                    conn.execute("DELETE FROM seats WHERE space_id = ?", (space_id,))
+                    conn.execute(
+                        "DELETE FROM equipment WHERE space_id = ?", (space_id,)
+                    )
+                    self._insert_space_children(conn, space_id, space)
+                    if registration is None:
+                        return True
+                    return self._insert_registration(conn, registration)
+            except ConflictError:
+                continue
+        raise ConflictError(space_id)
+
+    def import_records(self, records):
+        with self._transaction() as conn:
+            # Validate against the spaces and rooms as of the write lock; new
+            # registrations get their ids from SQLite, so existing ones aren't
+            # needed
+            data = {
+                "coworking_spaces": self._all_spaces(conn),
+                "meeting_rooms": self.list_meeting_rooms(),
+                "registrations": [],
+            }
+            versions = {
+                space_id: space["version"]
+                for space_id, space in data["coworking_spaces"].items()
+            }
+            rooms = data["meeting_rooms"]
+            result = apply_import(data, records)
+
+            for space_id, space in data["coworking_spaces"].items():
+                if space_id not in versions:
+                    self._insert_space(conn, space_id, space)
+                elif space["version"] != versions[space_id]:
+                    conn.execute(
+                        "UPDATE coworking_spaces SET current_occupancy = ?, "
+                        "version = ? WHERE id = ?",
+                        (space["current_occupancy"], space["version"], space_id),
+                    )
+                    conn.execute("DELETE FROM seats WHERE space_id = ?", (space_id,))
+                    conn.execute(
+                        "DELETE FROM equipment WHERE space_id = ?", (space_id,)
+                    )
+                    self._insert_space_children(conn, space_id, space)
+            for room_id, room in data["meeting_rooms"].items():
+                if room_id not in rooms:
+                    self._insert_meeting_room(conn, room_id, room)
+                elif room is not rooms[room_id]:
+                    conn.execute(
+                        "UPDATE meeting_rooms SET current_occupancy = ? WHERE id = ?",
+                        (room["current_occupancy"], room_id),
+                    )
+            for registration in data["registrations"]:
+                self._insert_registration(conn, {**registration, "id": None})
+            return result
+
+    def delete_space(self, space_id):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM coworking_spaces WHERE id = ?", (space_id,)
+            )
+        return cursor.rowcount == 1
+
+    def add_equipment(self, space_id, item):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE coworking_spaces SET version = version + 1 WHERE id = ?",
+                (space_id,),
+            )
+            if cursor.rowcount != 1:
+                return False
+            conn.execute(
+                "INSERT INTO equipment (space_id, name, quantity) VALUES (?, ?, ?)",
+                (space_id, item["name"], item["quantity"]),
+            )
+        return True
+
+    def add_meeting_room(self, room):
+        with self._transaction() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM meeting_rooms").fetchone()[0]
+            new_id = str(count + 1)
+            conn.execute("DELETE FROM meeting_rooms WHERE id = ?", (new_id,))
+            self._insert_meeting_room(conn, new_id, room)
+        return new_id
+
+    def update_meeting_room(self, room_id, **fields):
+        return self._update("meeting_rooms", room_id, fields)
+
+    def _reserve_seat(self, conn, registration):
+        # The upsert is the compare-and-swap: it succeeds for only one of
+        # several concurrent bookings of a seat
+        space_id = registration["space_id"]
+        seat_id = registration["selected_seat"]
+        space = conn.execute(
+            "SELECT seat_rows, seat_cols, version FROM coworking_spaces WHERE id = ?",
+            (space_id,),
+        ).fetchone()
+        if space is None or seat_id not in SeatMap(
+            space["seat_rows"], space["seat_cols"]
+        ):
+            raise SeatUnavailableError(seat_id)
+        cursor = conn.execute(
+            "INSERT INTO seats (space_id, seat_id, row, col, available, "
+            "reserved_by, changed_version) VALUES (?, ?, ?, ?, 0, ?, ?) "
+            "ON CONFLICT (space_id, seat_id) DO UPDATE SET available = 0, "
+            "reserved_by = excluded.reserved_by, "
+            "changed_version = excluded.changed_version WHERE seats.available = 1",
+            (
+                space_id,
+                seat_id,
+                *_position(seat_id),
+                f"{registration['first_name']} {registration['last_name']}",
+                # The space is committed with the next version
+                space["version"] + 1,
+            ),
+        )
+        if cursor.rowcount != 1:
+            raise SeatUnavailableError(seat_id)
+
+    def room_bookings(self, room_id, start, end):
+        conn = self._conn
+        if self.get_meeting_room(room_id) is None:
+            return None
+        # Bookings don't overlap, so those overlapping the range start with
+        # the last one starting before it: a range scan of the index
+        rows = conn.execute(
+            "SELECT booking_start, booking_end, id FROM registrations "
+            "WHERE space_id = :room AND booking_start >= COALESCE(("
+            "SELECT booking_start FROM registrations WHERE space_id = :room "
+            "AND booking_start IS NOT NULL AND booking_start <= :start "
+            "ORDER BY booking_start DESC LIMIT 1), :start) "
+            "AND booking_start < :end ORDER BY booking_start",
+            {"room": f"mr_{room_id}", "start": start, "end": end},
+        )
+        return [list(row) for row in rows if row["booking_end"] > start]
+
+    def _book_room(self, conn, registration):
+        # Checked within the write transaction, so of two overlapping
+        # bookings made at the same time only the first one commits
+        start, end = registration["booking_start"], registration["booking_end"]
+        previous = conn.execute(
+            "SELECT booking_end FROM registrations WHERE space_id = ? "
+            "AND booking_start IS NOT NULL AND booking_start < ? "
+            "ORDER BY booking_start DESC LIMIT 1",
+            (registration["space_id"], end),
+        ).fetchone()
+        if previous is not None and previous["booking_end"] > start:
+            raise BookingConflictError(start, end)
+
+    def add_registration(self, registration):
+        space_id = registration["space_id"]
+        with self._transaction() as conn:
+            if registration.get("selected_seat"):
+                self._reserve_seat(conn, registration)
+            if registration.get("booking_start"):
+                self._book_room(conn, registration)
+            registration_id = self._insert_registration(conn, registration)
+            if registration["is_meeting_room"]:
+                conn.execute(
+                    "UPDATE meeting_rooms SET current_occupancy = current_occupancy + 1 "
+                    "WHERE id = ?",
+                    (space_id[3:],),
+                )
+            else:
+                conn.execute(
+                    "UPDATE coworking_spaces SET current_occupancy = current_occupancy "
+                    "+ 1, version = version + 1 WHERE id = ?",
+                    (space_id,),
+                )
+        return registration_id
+
+
+def migrate_json(json_path, sqlite_path):
+    """Copy the dataset from a JSON data file into a SQLite database."""
+    data = JsonStorage(json_path).load()
+    storage = SqliteStorage(sqlite_path)
+    storage.save(data)
+    return data
@@ -0,0 +1,188 @@
+"""
+Dashboard statistics, maintained incrementally.
+
+``DashboardStats`` holds the totals shown on the dashboard: capacity and
+occupancy of all spaces and meeting rooms, the utilization of each space and
+the number of registrations per membership type. It is built from storage
+once and then updated by the routes that change the data, so serving it
+doesn't depend on the number of spaces or registrations.
+
+Every commit bumps the storage ``revision()``. ``StatsCache`` applies a
+route's update only if the revision moved by exactly that one commit; if
+anything else was committed in between (e.g. by another worker) the stats are
+rebuilt on the next read instead, or brought up to date by the cache's
+``catch_up(stats, storage)`` if it has one. Updates change the stats in place, so
+readers use them through ``StatsCache.read``, under the same lock.
+"""
+
+import threading
+from collections import Counter
+
+
+def utilization(occupancy, capacity):
+    """Return occupancy as a percentage of capacity (0 without capacity)."""
+    return occupancy / capacity * 100 if capacity > 0 else 0.0
+
+
+class DashboardStats:
+    """Totals over spaces, meeting rooms and registrations."""
+
+    def __init__(self, revision=None):
+        self.revision = revision
+        self.spaces = {}  # space id -> {"name", "capacity", "occupancy"}
+        self.meeting_rooms = {}  # room id -> (capacity, occupancy)
+        self.space_capacity = 0
+        self.space_occupancy = 0
+        self.room_capacity = 0
+        self.room_occupancy = 0
+        self.registrations = 0
+        self.membership_types = Counter()
+
+    @classmethod
+    def build(cls, storage):
+        """Compute the statistics of everything in ``storage``."""
+        stats = cls(storage.revision())
+        for space_id, space in storage.list_spaces().items():
+            stats.set_space(space_id, space)
+        for room_id, room in storage.list_meeting_rooms().items():
+            stats.set_meeting_room(room_id, room)
+        for registration in storage.iter_registrations():
+            stats.add_registration(registration)
+        return stats
+
+    def set_space(self, space_id, space):
+        """Account for a new, changed or (with ``space=None``) deleted space."""
+        old = self.spaces.pop(space_id, None)
+        if old is not None:
+            self.space_capacity -= old["capacity"]
+            self.space_occupancy -= old["occupancy"]
+        if space is not None:
+            self.spaces[space_id] = {
+                "name": space["name"],
+                "capacity": space["capacity"],
+                "occupancy": space["current_occupancy"],
+            }
+            self.space_capacity += space["capacity"]
+            self.space_occupancy += space["current_occupancy"]
+
+    def set_meeting_room(self, room_id, room):
+        """Account for a new or changed meeting room."""
+        capacity, occupancy = self.meeting_rooms.pop(room_id, (0, 0))
+        self.room_capacity -= capacity
+        self.room_occupancy -= occupancy
+        if room is not None:
+            self.meeting_rooms[room_id] = (room["capacity"], room["current_occupancy"])
+            self.room_capacity += room["capacity"]
+            self.room_occupancy += room["current_occupancy"]
+
+    def add_registration(self, registration):
+        self.registrations += 1
+        self.membership_types[registration.get("membership_type") or "unspecified"] += 1
+
+    def to_json(self):
+        return {
+            "spaces": {
+                "count": len(self.spaces),
+                "capacity": self.space_capacity,
+                "occupancy": self.space_occupancy,
+                "utilization": utilization(self.space_occupancy, self.space_capacity),
+                "by_id": {
+                    space_id: {
+                        **space,
+                        "utilization": utilization(
+                            space["occupancy"], space["capacity"]
+                        ),
+                    }
+                    for space_id, space in self.spaces.items()
+                },
+            },
+            "meeting_rooms": {
+                "count": len(self.meeting_rooms),
+                "capacity": self.room_capacity,
+                "occupancy": self.room_occupancy,
+                "utilization": utilization(self.room_occupancy, self.room_capacity),
+            },
+            "registrations": {
+                "count": self.registrations,
+                "by_membership_type": dict(self.membership_types),
+            },
+        }
+
+
+class StatsCache:
+    """
+    The current ``DashboardStats`` of a storage, kept up to date by routes, or
+    other statistics built by ``build(storage)`` with a ``revision`` attribute.
+    ``catch_up(stats, storage)``, if given, applies the commits made since
+    ``stats.revision`` and returns True, or False if they must be rebuilt; it
+    may be called with some of those commits already applied.
+    """
+
+    def __init__(self, get_storage, build=DashboardStats.build, catch_up=None):
+        self.get_storage = get_storage
+        self.build = build
+        self.catch_up = catch_up
+        self._stats = None
+        self._storage = None
+        self._lock = threading.Lock()
+
+    def _current(self, storage):
+        revision = storage.revision()
+        stats = self._stats
+        if (
+            stats is not None
+            and storage is self._storage
+            and revision is not None
+            and stats.revision is not None
+        ):
+            if stats.revision == revision:
+                return stats
+            if (
+                self.catch_up is not None
+                and revision > stats.revision
+                and self.catch_up(stats, storage)
+            ):
+                stats.revision = revision
+                return stats
+        self._stats = self.build(storage)
+        self._storage = storage
+        return self._stats
+
+    def get(self):
+        """Return the current stats; ``read`` them to use them while routes run."""
+        storage = self.get_storage()
+        with self._lock:
+            return self._current(storage)
+
+    def read(self, function):
+        """
+        Return ``function(stats)`` of the current stats, called while holding
+        the lock so that no route's update changes them meanwhile.
+        """
+        storage = self.get_storage()
+        with self._lock:
+            return function(self._current(storage))
+
+    def changed(self, update):
+        """
+        Call after committing one change: apply ``update(stats)`` if nothing
+        else was committed since the stats were computed, else drop them (or
+        leave them to be caught up on the next read).
+        """
+        storage = self.get_storage()
+        revision = storage.revision()
+        with self._lock:
+            stats = self._stats
+            if stats is None or storage is not self._storage:
+                return
+            if revision is None or stats.revision is None:
+                self._stats = None
+            elif revision == stats.revision + 1:
+                update(stats)
+                stats.revision = revision
+            elif revision != stats.revision and self.catch_up is None:
+                self._stats = None
+
+    def invalidate(self):
+        with self._lock:
+            self._stats = None
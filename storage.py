@@ -0,0 +1,744 @@
+"""
+Storage layer for the Coworking Admin Panel.
+
+Routes talk to a ``Storage`` backend through targeted operations (get one
+space, add one registration, ...). The base class implements every operation
+on top of the whole dataset (``view``/``load``/``save``); backends override the
+ones they can do cheaper.
+
+The default backend keeps the whole dataset in a single JSON document. Parsing
+it on every request is the dominant cost of most routes, so the parsed
+document is kept in memory and only re-read when the file on disk actually
+changed.
+"""
+
+import copy
+import os
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager
+
+import serialization
+from bookings import book, overlapping
+from indexes import RegistrationIndex, registration_matches
+from seats import SeatMap, compact_space
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def default_data():
+    """Return the dataset a fresh installation starts with."""
+    return {
+        "coworking_spaces": {},
+        "meeting_rooms": {},
+        "admins": {"admin": "password"},  # Simple auth for demo purposes
+        "registrations": [],
+    }
+
+
+def new_space(name, location, capacity, rows, cols):
+    """Return a new coworking space with an empty ``rows`` x ``cols`` seat grid."""
+    return {
+        "name": name,
+        "location": location,
+        "capacity": capacity,
+        "current_occupancy": 0,
+        "equipment": [],
+        "seat_map": SeatMap(rows, cols),
+    }
+
+
+def space_record(space):
+    """
+    Return the stored record of a space being added: at version 0 (unless it
+    has one) and with a new ``uuid``. A new space may be given the id of a
+    deleted one, and starts over at the same versions; the uuid tells them
+    apart.
+    """
+    return {
+        **compact_space(space),
+        "version": space.get("version", 0),
+        "uuid": uuid.uuid4().hex,
+    }
+
+
+class ReadOnlyDict(Mapping):
+    """Read-only view over a dict; nested containers are wrapped on access."""
+
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getitem__(self, key):
+        return freeze(self._target[key])
+
+    def __iter__(self):
+        return iter(self._target)
+
+    def __len__(self):
+        return len(self._target)
+
+    def __contains__(self, key):
+        return key in self._target
+
+    def __eq__(self, other):
+        return self._target == thaw(other)
+
+    def __repr__(self):
+        return f"ReadOnlyDict({self._target!r})"
+
+
+class ReadOnlyList(Sequence):
+    """Read-only view over a list; nested containers are wrapped on access."""
+
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ReadOnlyList(self._target[index])
+        return freeze(self._target[index])
+
+    def __len__(self):
+        return len(self._target)
+
+    def __eq__(self, other):
+        return self._target == thaw(other)
+
+    def __repr__(self):
+        return f"ReadOnlyList({self._target!r})"
+
+
+def freeze(value):
+    """Wrap ``value`` in a read-only view without copying it."""
+    if isinstance(value, dict):
+        return ReadOnlyDict(value)
+    if isinstance(value, list):
+        return ReadOnlyList(value)
+    return value
+
+
+def thaw(value):
+    """Return the plain object behind a read-only view (no copy is made)."""
+    if isinstance(value, (ReadOnlyDict, ReadOnlyList)):
+        return value._target
+    return value
+
+
+# How often a conflicting change to one space is retried before giving up
+CAS_RETRIES = 50
+
+# Membership types a registration may have, and the days each takes a seat for
+MEMBERSHIP_DAYS = {"daily": 1, "weekly": 7, "monthly": 30, "annual": 365}
+MEMBERSHIP_TYPES = tuple(MEMBERSHIP_DAYS)
+
+# The umask of the process, which new files are created with (read while
+# importing, as reading it means setting it)
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+# Seconds between attempts to take a file lock held by another process, from
+# the first to the longest
+LOCK_POLL_INTERVAL = 0.001
+LOCK_POLL_MAX_INTERVAL = 0.05
+
+
+class SeatUnavailableError(Exception):
+    """Raised when a registration asks for a seat that is taken or doesn't exist."""
+
+
+class ConflictError(Exception):
+    """Raised when a space keeps changing concurrently and a change can't commit."""
+
+
+class Storage:
+    """
+    Base class for storage backends.
+
+    Read operations may return read-only views; callers must not mutate them.
+
+    If ``observer`` is set, backends call ``observer(operation, seconds, size)``
+    after reading (``"load"``) or writing (``"save"``) data, with the number of
+    bytes if they know it.
+    """
+
+    observer = None
+
+    def init(self):
+        """Create the storage with default data if it doesn't exist."""
+
+    def flush(self):
+        """Write any buffered changes to disk."""
+
+    def load(self):
+        """Return a private, mutable copy of the whole dataset."""
+        raise NotImplementedError
+
+    def view(self):
+        """Return a read-only view of the whole dataset."""
+        raise NotImplementedError
+
+    def save(self, data):
+        """Replace the whole dataset with ``data``."""
+        raise NotImplementedError
+
+    def revision(self):
+        """
+        Return a number that grows by one with every commit, by any process, or
+        None if the backend doesn't count commits.
+        """
+        return None
+
+    # Reads
+
+    def admin_password(self, username):
+        return self.view()["admins"].get(username)
+
+    def list_spaces(self):
+        return self.view()["coworking_spaces"]
+
+    def get_space(self, space_id):
+        return self.view()["coworking_spaces"].get(space_id)
+
+    def list_meeting_rooms(self):
+        return self.view()["meeting_rooms"]
+
+    def get_meeting_room(self, room_id):
+        return self.view()["meeting_rooms"].get(room_id)
+
+    def count_meeting_rooms(self):
+        return len(self.view()["meeting_rooms"])
+
+    def list_registrations(self):
+        return self.view()["registrations"]
+
+    def room_bookings(self, room_id, start, end):
+        """
+        Return the ``[start, end, registration_id]`` bookings of a meeting room
+        that overlap ``start`` to ``end``, or None if the room doesn't exist.
+        """
+        room = self.get_meeting_room(room_id)
+        if room is None:
+            return None
+        return overlapping(room.get("bookings", []), start, end)
+
+    def find_registrations(self, **criteria):
+        """Return registrations whose fields equal ``criteria``, in id order."""
+        return [
+            reg
+            for reg in self.view()["registrations"]
+            if all(reg.get(field) == value for field, value in criteria.items())
+        ]
+
+    def space_registrations(self, space_id):
+        return self.find_registrations(space_id=space_id)
+
+    def page_registrations(self, limit, before_id=None, **filters):
+        """
+        Return up to ``limit`` registrations matching ``filters`` (see
+        ``indexes.registration_matches``) with an id below ``before_id``, newest
+        first, and the ``before_id`` of the next page or None on the last one.
+        """
+        page = []
+        for reg in reversed(thaw(self.view()["registrations"])):
+            if before_id is not None and reg["id"] >= before_id:
+                continue
+            if registration_matches(reg, filters):
+                if len(page) == limit:
+                    return freeze(page), page[-1]["id"]
+                page.append(reg)
+        return freeze(page), None
+
+    def iter_registrations(self, **filters):
+        """Yield registrations matching ``filters`` in id order, one at a time."""
+        for reg in thaw(self.view()["registrations"]):
+            if registration_matches(reg, filters):
+                yield reg
+
+    # Writes
+
+    def _mutate(self, change):
+        """Apply ``change(data)`` to the latest whole dataset, save it and return
+        the result of ``change``. ``change`` must raise before modifying anything.
+        """
+        data = self.load()
+        result = change(data)
+        self.save(data)
+        return result
+
+    def modify_space(self, space_id, change, registration=None):
+        """
+        Change one space with optimistic concurrency control.
+
+        ``change(space)`` edits a private copy of the space, which is committed
+        only if the stored space still has the ``version`` the copy was made
+        from (compare-and-swap); the version is bumped on every commit. On a
+        conflict only this space is re-read and the change retried; changes to
+        other spaces never conflict. ``registration`` (if given) is stored in
+        the same commit.
+
+        Returns the new registration id (or True without a registration), or
+        None if the space doesn't exist. Exceptions raised by ``change`` (e.g.
+        ``SeatUnavailableError``) propagate without committing anything.
+        """
+        for _ in range(CAS_RETRIES):
+            current = self.get_space(space_id)
+            if current is None:
+                return None
+            space = copy.deepcopy(thaw(current))
+            change(space)
+            expected_version = space.get("version", 0)
+            space["version"] = expected_version + 1
+            try:
+                return self._mutate(
+                    lambda data: _swap_space(
+                        data, space_id, expected_version, space, registration
+                    )
+                )
+            except ConflictError:
+                continue
+        raise ConflictError(space_id)
+
+    def add_space(self, space):
+        """Store a new coworking space and return its id."""
+
+        def change(data):
+            spaces = data["coworking_spaces"]
+            new_id = str(len(spaces) + 1)
+            # A new dict, so that readers iterating over the old one don't break
+            data["coworking_spaces"] = {**spaces, new_id: space_record(space)}
+            return new_id
+
+        return self._mutate(change)
+
+    def update_space(self, space_id, **fields):
+        """Update fields of a space; return False if it doesn't exist."""
+        return (
+            self.modify_space(space_id, lambda space: space.update(fields)) is not None
+        )
+
+    def delete_space(self, space_id):
+        """Delete a space; return False if it doesn't exist."""
+
+        def change(data):
+            spaces = data["coworking_spaces"]
+            if space_id not in spaces:
+                return False
+            data["coworking_spaces"] = {
+                key: value for key, value in spaces.items() if key != space_id
+            }
+            return True
+
+        return self._mutate(change)
+
+    def add_equipment(self, space_id, item):
+        """Append an equipment item to a space; return False if it doesn't exist."""
+        return (
+            self.modify_space(space_id, lambda space: space["equipment"].append(item))
+            is not None
+        )
+
+    def add_meeting_room(self, room):
+        """Store a new meeting room and return its id."""
+
+        def change(data):
+            rooms = data["meeting_rooms"]
+            new_id = str(len(rooms) + 1)
+            data["meeting_rooms"] = {**rooms, new_id: room}
+            return new_id
+
+        return self._mutate(change)
+
+    def update_meeting_room(self, room_id, **fields):
+        """Update fields of a meeting room; return False if it doesn't exist."""
+
+        def change(data):
+            rooms = data["meeting_rooms"]
+            if room_id not in rooms:
+                return False
+            rooms[room_id] = {**rooms[room_id], **fields}
+            return True
+
+        return self._mutate(change)
+
+    def add_registration(self, registration):
+        """
+        Store a registration and return its id.
+
+        See ``apply_registration`` for the seat, booking and occupancy side
+        effects. For coworking spaces the seat is reserved with
+        ``modify_space``, so two concurrent bookings of the same seat can't both
+        succeed; meeting rooms are booked within one ``_mutate``.
+        """
+        if registration["is_meeting_room"]:
+            return self._mutate(lambda data: apply_registration(data, registration))[
+                "id"
+            ]
+
+        def reserve(space):
+            _reserve_seat(space, registration)
+            space["current_occupancy"] += 1
+
+        return self.modify_space(registration["space_id"], reserve, registration)
+
+    def import_records(self, records):
+        """
+        Import parsed ``records`` in a single save; see ``importer.apply_import``.
+        """
+        # importer builds on this module, so it can only be imported here
+        from importer import apply_import
+
+        return self._mutate(lambda data: apply_import(data, records))
+
+
+def _reserve_seat(space, registration):
+    seat_id = registration.get("selected_seat")
+    if not seat_id:
+        return
+    seat_map = space.get("seat_map")
+    if seat_map is None or not seat_map.is_available(seat_id):
+        raise SeatUnavailableError(seat_id)
+    # A new map, so that readers of the old one don't see the change. The
+    # space is committed with the next version.
+    space["seat_map"] = seat_map.reserved(
+        seat_id,
+        f"{registration['first_name']} {registration['last_name']}",
+        space.get("version", 0) + 1,
+    )
+
+
+def booked_room(room, registration, registration_id):
+    """
+    Return a copy of meeting ``room`` with one more occupant and the time slot
+    of ``registration`` (``booking_start`` to ``booking_end``, if any) booked.
+    Raises ``BookingConflictError`` if the slot overlaps another booking.
+    """
+    room = {**room, "current_occupancy": room["current_occupancy"] + 1}
+    if registration.get("booking_start"):
+        room["bookings"] = book(
+            room.get("bookings", []),
+            registration["booking_start"],
+            registration["booking_end"],
+            registration_id,
+        )
+    return room
+
+
+def _append_registration(data, registration):
+    registration = {"id": len(data["registrations"]) + 1, **registration}
+    data["registrations"].append(registration)
+    return registration
+
+
+def _swap_space(data, space_id, expected_version, space, registration):
+    """
+    Replace a space if its version still matches, else raise ConflictError
+    (before changing anything, so nothing is saved); see
+    ``Storage.modify_space``.
+    """
+    current = data["coworking_spaces"].get(space_id)
+    if current is None:
+        return None
+    if current.get("version", 0) != expected_version:
+        raise ConflictError(space_id)
+    data["coworking_spaces"][space_id] = space
+    if registration is None:
+        return True
+    return _append_registration(data, registration)["id"]
+
+
+def apply_registration(data, registration):
+    """
+    Add ``registration`` to the whole dataset ``data`` and return the stored record.
+
+    Reserves ``registration["selected_seat"]`` (if any) for the registrant and
+    increments the occupancy of the space or meeting room (whose id has the
+    ``mr_`` prefix), booking its time slot (see ``booked_room``). Raises
+    ``SeatUnavailableError`` or ``BookingConflictError`` before changing
+    anything if the seat or slot is taken. A registration that already has an
+    id (e.g. when replaying it) keeps it.
+    """
+    space_id = registration["space_id"]
+    if registration["is_meeting_room"]:
+        rooms = data["meeting_rooms"]
+        rooms[space_id[3:]] = booked_room(
+            rooms[space_id[3:]],
+            registration,
+            registration.get("id", len(data["registrations"]) + 1),
+        )
+    else:
+        space = dict(data["coworking_spaces"][space_id])
+        _reserve_seat(space, registration)
+        space["current_occupancy"] += 1
+        space["version"] = space.get("version", 0) + 1
+        data["coworking_spaces"][space_id] = space
+    return _append_registration(data, registration)
+
+
+class JsonStorage(Storage):
+    """
+    JSON file storage with a version-aware read-through cache.
+
+    The parsed document is cached together with a cheap signature of the file
+    (inode, size and modification time). Every read only needs an ``os.stat``
+    to revalidate it; the file is re-parsed only when the signature changes,
+    e.g. after another process wrote to it.
+
+    Writes go to a temporary file that is fsynced and atomically renamed over
+    the data file, so a crash never leaves a half-written file behind. With a
+    positive ``flush_interval`` (seconds) saves are write-behind: the cache is
+    updated immediately and all saves made within the interval are merged into
+    a single write, so a save reaches the disk at most ``flush_interval``
+    seconds after it was made. Write-behind is only coherent with a single
+    process writing the file.
+
+    Changes are applied to the latest data under a lock file, so writers in
+    different processes never overwrite each other's changes.
+
+    The file is written in ``data_format`` (see ``serialization.FORMATS``);
+    files in any of the formats are read.
+    """
+
+    def __init__(self, path, flush_interval=0.0, data_format="json"):
+        if data_format not in serialization.FORMATS:
+            raise ValueError(f"Unknown data format: {data_format}")
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.flush_interval = flush_interval
+        self.data_format = data_format
+        self.version = 0
+        self._data = None
+        self._signature = None
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._registration_index = None
+
+    @contextmanager
+    def _writer_lock(self):
+        """Exclusive lock against writers in this and other processes (reentrant)."""
+        with self._lock:
+            if self._lock_file is not None:
+                # Already held by this thread
+                yield
+                return
+            with open(self.lock_path, "a") as f:
+                if fcntl is not None:
+                    lock_file(f)
+                self._lock_file = f
+                try:
+                    yield
+                finally:
+                    self._lock_file = None
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def init(self):
+        """Create the data file with default data if it doesn't exist."""
+        if not os.path.exists(self.path):
+            # Workers may start at the same time; only the first one writes it
+            with self._writer_lock():
+                if not os.path.exists(self.path):
+                    self._write(default_data())
+
+    def _read(self):
+        start = time.perf_counter()
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        # Any format can be read, whatever this storage writes
+        data = serialization.loads(raw)
+        # Ensure meeting_rooms key exists for backward compatibility
+        data.setdefault("meeting_rooms", {})
+        data["coworking_spaces"] = {
+            space_id: compact_space(space)
+            for space_id, space in data["coworking_spaces"].items()
+        }
+        if self.observer is not None:
+            self.observer("load", time.perf_counter() - start, len(raw))
+        return data
+
+    def _current(self):
+        """Return the cached document, re-parsing the file only if it changed."""
+        with self._lock:
+            if self._dirty:
+                # Unflushed saves are newer than anything on disk
+                return self._data
+            signature = self._stat_signature()
+            if signature is None:
+                self.init()
+                signature = self._stat_signature()
+            if self._data is None or signature != self._signature:
+                self._data = self._read()
+                self._signature = signature
+                self.version += 1
+            return self._data
+
+    def _registrations(self):
+        return self._current()["registrations"]
+
+    def _index(self):
+        """Return the registration index of the registrations, caught up."""
+        with self._lock:
+            registrations = self._registrations()
+            index = self._registration_index
+            if (
+                index is None
+                or index.registrations is not registrations
+                or len(registrations) < index.indexed
+            ):
+                index = self._registration_index = RegistrationIndex(registrations)
+            else:
+                index.refresh()
+            return index
+
+    def find_registrations(self, **criteria):
+        return freeze(self._index().find(**criteria))
+
+    def page_registrations(self, limit, before_id=None, **filters):
+        page, next_id = self._index().page(limit, before_id, **filters)
+        return freeze(page), next_id
+
+    def iter_registrations(self, **filters):
+        return self._index().iter(**filters)
+
+    def revision(self):
+        with self._lock:
+            return self._current().get("revision", 0)
+
+    def load(self):
+        """Return a private, mutable copy of the dataset."""
+        return copy.deepcopy(self._current())
+
+    def view(self):
+        """Return a read-only view of the cached dataset without copying it."""
+        return freeze(self._current())
+
+    def _mutate(self, change):
+        # Changes are applied in place to the cached document instead of a deep
+        # copy of it; entries that readers may be iterating over are replaced
+        # rather than added or removed
+        with self._writer_lock():
+            data = self._current()
+            result = change(data)
+            try:
+                self.save(data)
+            except BaseException:
+                # The cache is ahead of the disk now; re-read it next time
+                self._data = None
+                raise
+            return result
+
+    def save(self, data):
+        """Make ``data`` the cached document and write it to disk."""
+        data = thaw(data)
+        with self._writer_lock():
+            # _mutate saves the cached document itself; a copy from load() may
+            # be older than it
+            current = self._data.get("revision", 0) if self._data is not None else 0
+            data["revision"] = max(data.get("revision", 0), current) + 1
+            if self.flush_interval <= 0:
+                self._write(data)
+            else:
+                self._dirty = True
+                self._schedule_flush()
+            self._data = data
+            self.version += 1
+
+    def _schedule_flush(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write pending write-behind saves to disk."""
+        if not self._dirty:
+            # Nothing to write (e.g. at exit), so don't even take the lock
+            return
+        with self._writer_lock():
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty:
+                self._write(self._data)
+                self._dirty = False
+
+    def _write(self, data):
+        start = time.perf_counter()
+        raw = serialization.dumps(data, self.data_format)
+        replace_file(self.path, raw)
+        self._signature = self._stat_signature()
+        if self.observer is not None:
+            self.observer("save", time.perf_counter() - start, len(raw))
+
+
+def lock_file(f):
+    """
+    Take an exclusive ``flock`` on the open file ``f``. A lock held elsewhere
+    is polled for with ``time.sleep`` rather than waited for in the kernel, so
+    under gevent the other greenlets of the worker run meanwhile.
+    """
+    delay = LOCK_POLL_INTERVAL
+    while True:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(delay)
+            delay = min(delay * 2, LOCK_POLL_MAX_INTERVAL)
+
+
+def replace_file(path, *chunks):
+    """
+    Atomically replace the file at ``path`` with the bytes ``chunks``: they are
+    written to a temporary file that is fsynced and renamed over ``path``. The
+    file keeps its permissions (a new one gets those ``open`` would give it),
+    rather than the owner-only ones of the temporary file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~UMASK
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".data-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.writelines(chunks)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory):
+    """Persist a rename by syncing the directory entry (not possible on Windows)."""
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,238 @@
+from datetime import date
+
+import pytest
+
+import analytics as analytics_module
+import app as app_module
+from analytics import Calendar, UtilizationAnalytics, percentile
+from stats import StatsCache
+from tests.conftest import BACKENDS, make_registration, make_space, open_storage
+
+
+def registration(space_id, membership_type, start_date):
+    return {
+        **make_registration(space_id),
+        "membership_type": membership_type,
+        "start_date": start_date,
+    }
+
+
+@pytest.fixture
+def storage(storage):
+    storage.add_space(make_space("First", rows=2, cols=5))
+    storage.add_space(make_space("Second", rows=1, cols=10))
+    return storage
+
+
+def test_calendar():
+    """Test running sums inside, before and after the counted days"""
+    calendar = Calendar()
+    calendar.add(0, 10)
+    calendar.add(0, 12, -1)
+    calendar.add(1, 5)
+    assert list(calendar.running(0, 8, 14)) == [0, 0, 1, 1, 0, 0]
+    assert list(calendar.running(1, 3, 7)) == [0, 0, 1, 1]
+    assert list(calendar.running(2, 3, 5)) == [0, 0]
+    assert list(calendar.running(0, 10**6, 10**6 + 2)) == [0, 0]
+    assert calendar.total(0, 0, 11) == 1
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 99) == 4
+
+
+def test_report():
+    """Test utilization by day, space, membership type and week"""
+    analytics = UtilizationAnalytics()
+    analytics.set_space("1", {"name": "First", "capacity": 4})
+    analytics.set_space("2", {"name": "Second", "capacity": 6})
+    for registration_id, (space_id, membership_type, start_date) in enumerate(
+        (
+            ("1", "daily", "2025-10-06"),
+            ("1", "daily", "2025-10-06"),
+            ("1", "weekly", "2025-10-01"),
+            ("2", "monthly", "2025-10-08"),
+            ("2", "annual", "2024-01-01"),  # Over before the report
+            ("2", "daily", "not a date"),
+        ),
+        1,
+    ):
+        analytics.add_registration(
+            {
+                **registration(space_id, membership_type, start_date),
+                "id": registration_id,
+            }
+        )
+    # Counted once
+    analytics.add_registration({**registration("1", "annual", "2025-10-01"), "id": 3})
+    analytics.add_registration(
+        {**make_registration("mr_1", is_meeting_room=True), "id": 7}
+    )
+
+    # Wednesday 2025-10-01 to Sunday 2025-10-12
+    report = analytics.report(date(2025, 10, 1), date(2025, 10, 12), window=2)
+    assert report["capacity"] == 10
+    assert [day["occupied"] for day in report["daily"]] == (
+        [1, 1, 1, 1, 1, 3, 1, 1, 1, 1, 1, 1]
+    )
+    assert report["daily"][5]["utilization"] == 30.0
+    assert report["daily"][5]["rolling_utilization"] == 20.0
+    assert report["daily"][0]["rolling_utilization"] == 10.0
+    assert report["seat_days"] == 14
+    assert report["registrations"] == 4
+
+    first, second = report["spaces"]
+    assert (first["seat_days"], first["registrations"]) == (9, 3)
+    assert first["utilization"] == 9 / 48 * 100
+    assert (first["p50"], first["peak"]) == (25.0, 75.0)
+    assert (second["seat_days"], second["registrations"]) == (5, 1)
+
+    by_type = {row["membership_type"]: row for row in report["membership_types"]}
+    assert by_type["weekly"]["seat_days"] == 7
+    assert by_type["daily"]["seat_days"] == 2
+    assert by_type["monthly"]["share"] == 5 / 14 * 100
+    assert by_type["annual"]["seat_days"] == 0
+
+    assert [(week["week"], week["days"]) for week in report["weeks"]] == [
+        ("2025-10-01", 5),
+        ("2025-10-06", 7),
+    ]
+    assert report["weeks"][0]["seat_days"] == 5
+    assert report["weeks"][1]["by_membership_type"]["daily"] == 2 / 70 * 100
+
+    # Deleted spaces are left out
+    analytics.set_space("2", None)
+    report = analytics.report(date(2025, 10, 1), date(2025, 10, 12))
+    assert [space["space_id"] for space in report["spaces"]] == ["1"]
+    assert report["capacity"] == 4
+
+
+def assert_same_reports(actual, expected):
+    for first_day, last_day in (
+        (date(2025, 1, 1), date(2025, 12, 31)),
+        (date(2024, 12, 1), date(2025, 2, 28)),
+        (date(2026, 6, 1), date(2026, 6, 30)),
+    ):
+        expected_report = expected.report(first_day, last_day)
+        actual_report = actual.report(first_day, last_day)
+        for report in (expected_report, actual_report):
+            report["membership_types"].sort(key=lambda row: row["membership_type"])
+            for week in report["weeks"]:
+                week["by_membership_type"] = sorted(week["by_membership_type"].items())
+        assert actual_report == expected_report
+
+
+def test_build_matches_updates(storage):
+    """Test that loading all registrations gives what adding them one by one does"""
+    registrations = [
+        registration(str(i % 2 + 1), membership_type, f"2025-0{i % 9 + 1}-1{i % 10}")
+        for i, membership_type in enumerate(
+            ["daily", "monthly", "annual", "weekly", None] * 20
+        )
+    ]
+    incremental = UtilizationAnalytics()
+    for space_id, space in storage.list_spaces().items():
+        incremental.set_space(space_id, space)
+    # The last is of a membership type only the space deleted below has
+    registrations.append(registration("2", "quarterly", "2025-03-01"))
+    for reg in registrations:
+        incremental.add_registration({**reg, "id": storage.add_registration(reg)})
+
+    built = UtilizationAnalytics.build(storage)
+    assert "unspecified" in built.membership_types
+    assert_same_reports(built, incremental)
+
+    storage.delete_space("2")
+    incremental.set_space("2", None, storage.iter_registrations(space_id="2"))
+    assert_same_reports(UtilizationAnalytics.build(storage), incremental)
+    report = incremental.report(date(2025, 1, 1), date(2025, 12, 31))
+    assert sum(row["share"] for row in report["membership_types"]) == pytest.approx(100)
+    assert "quarterly" not in [
+        row["membership_type"] for row in report["membership_types"]
+    ]
+
+    # Added back, under the same id, it has its registrations again
+    storage.add_space(make_space("Second", rows=1, cols=10))
+    incremental.set_space(
+        "2", storage.get_space("2"), storage.iter_registrations(space_id="2")
+    )
+    assert_same_reports(UtilizationAnalytics.build(storage), incremental)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_catch_up_with_other_workers(storage, backend, tmp_path, monkeypatch):
+    """Test that commits of another worker are counted in without a rebuild"""
+    monkeypatch.setattr(analytics_module, "CATCH_UP_PAGE_SIZE", 2)
+    cache = StatsCache(
+        lambda: storage, UtilizationAnalytics.build, UtilizationAnalytics.catch_up
+    )
+    storage.add_registration(registration("2", "monthly", "2025-10-01"))
+    analytics = cache.get()
+    cache.build = lambda storage: pytest.fail("rebuilt")
+
+    other = open_storage(backend, tmp_path)
+    for day in range(1, 6):
+        other.add_registration(registration("1", "weekly", f"2025-10-0{day}"))
+    other.update_space("1", name="Renamed")
+    other.delete_space("2")
+    other.add_space(make_space("Third"))  # Under the id of the deleted one
+    # A commit of this worker after those is caught up with too
+    storage.add_registration(registration("1", "daily", "2025-10-06"))
+    cache.changed(lambda analytics: pytest.fail("applied over missed commits"))
+
+    assert cache.get() is analytics
+    assert [space["name"] for space in analytics.spaces] == ["Renamed", "Third"]
+    assert analytics.last_registration_id == 7
+    assert_same_reports(UtilizationAnalytics.build(storage), analytics)
+
+
+def test_analytics_routes(client, storage):
+    """Test the report page and API, kept up to date by the routes"""
+    url = "/api/analytics?from=2025-10-01&to=2025-10-31"
+    assert client.get(url).json["seat_days"] == 0
+    analytics = app_module.utilization_analytics.get()
+
+    client.post(
+        "/submit_registration",
+        data={
+            "firstName": "Jane",
+            "lastName": "Doe",
+            "email": "jane@example.com",
+            "phone": "",
+            "company": "",
+            "space": "1",
+            "membershipType": "monthly",
+            "startDate": "2025-10-10",
+            "additionalInfo": "",
+        },
+    )
+    client.post("/add_space", data=dict(name="Third", location="C", capacity=5))
+
+    rv = client.get(url)
+    assert rv.status_code == 200
+    assert rv.json["seat_days"] == 22
+    assert rv.json["capacity"] == 25
+    assert [space["name"] for space in rv.json["spaces"]] == [
+        "First",
+        "Second",
+        "Third",
+    ]
+    # Updated in place rather than rebuilt
+    assert app_module.utilization_analytics.get() is analytics
+
+    rv = client.get("/analytics?from=2025-10-01&to=2025-10-31&window=3")
+    assert rv.status_code == 200
+    assert b"Utilization Analytics" in rv.data
+    assert b"3-day average" in rv.data
+    assert b"monthly" in rv.data
+
+    for query in (
+        "from=2025-13-01",
+        "from=2025-10-07&to=2025-10-06",
+        "from=2020-01-01&to=2025-01-01",
+        "window=0",
+        "window=x",
+    ):
+        rv = client.get(f"/api/analytics?{query}")
+        assert rv.status_code == 400, query
+        assert rv.json["error"]
+    rv = client.get("/analytics?window=x", follow_redirects=True)
+    assert b"window must be an integer" in rv.data
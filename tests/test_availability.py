@@ -0,0 +1,133 @@
+from datetime import date
+
+import pytest
+
+import app as app_module
+from availability import RoomAvailability
+from tests.conftest import make_meeting_room, make_registration
+
+
+def make_booking(room_id, day, start, end):
+    return {
+        **make_registration(f"mr_{room_id}", is_meeting_room=True),
+        "booking_start": f"{day}T{start}",
+        "booking_end": f"{day}T{end}",
+    }
+
+
+@pytest.fixture
+def storage(storage):
+    storage.add_meeting_room(make_meeting_room("Board", "Top", 12))
+    storage.add_meeting_room(make_meeting_room("Huddle", "Top", 4))
+    storage.add_meeting_room(make_meeting_room("Studio", "Ground", 8))
+    return storage
+
+
+def test_day_bitmaps():
+    """Test that bookings set the bits of the slots they overlap"""
+    availability = RoomAvailability("08:00", "20:00", 30)
+    availability.set_meeting_room(
+        "1", {"name": "Board", "location": "Top", "capacity": 8}
+    )
+    availability.add_registration(make_booking("1", "2025-10-07", "09:00", "10:00"))
+    availability.add_registration(make_booking("1", "2025-10-07", "14:00", "14:30"))
+    # Not a booking
+    availability.add_registration(make_registration("mr_1", is_meeting_room=True))
+
+    assert availability.slots == 24
+    assert availability.busy == {"1": {"2025-10-07": 0b1 << 12 | 0b11 << 2}}
+    assert availability._mask("09:15", "09:45") == 0b1100
+
+    (room,) = availability.search(
+        date(2025, 10, 7), date(2025, 10, 8), "08:00", "15:00"
+    )
+    assert room["free"] is False
+    assert room["slots"] == {
+        "2025-10-07": [
+            ["2025-10-07T08:00", "2025-10-07T09:00"],
+            ["2025-10-07T10:00", "2025-10-07T14:00"],
+            ["2025-10-07T14:30", "2025-10-07T15:00"],
+        ],
+        "2025-10-08": [["2025-10-08T08:00", "2025-10-08T15:00"]],
+    }
+
+
+def test_search_filters_and_orders(storage, client):
+    """Test capacity and location filters and free rooms first, smallest first"""
+    storage.add_registration(make_booking("3", "2025-10-07", "14:00", "15:00"))
+    storage.add_registration(make_booking("2", "2025-10-07", "08:00", "20:00"))
+
+    rv = client.get(
+        "/api/meeting_rooms/availability?from=2025-10-07&start=14:00&end=16:00"
+    )
+    assert rv.status_code == 200
+    assert [(room["room_id"], room["free"]) for room in rv.json["rooms"]] == [
+        ("1", True),
+        ("3", False),
+    ]
+    assert rv.json["rooms"][1]["slots"] == {
+        "2025-10-07": [["2025-10-07T15:00", "2025-10-07T16:00"]]
+    }
+
+    rv = client.get(
+        "/api/meeting_rooms/availability?from=2025-10-07&to=2025-10-08"
+        "&start=14:00&end=16:00&capacity=8&location=ground"
+    )
+    (room,) = rv.json["rooms"]
+    assert room["name"] == "Studio"
+    assert list(room["slots"]) == ["2025-10-07", "2025-10-08"]
+
+    rv = client.get("/api/meeting_rooms/availability?from=2025-10-07&capacity=20")
+    assert rv.json["rooms"] == []
+
+
+def test_bookings_update_the_bitmaps(storage, client):
+    """Test that a booking through the form updates the cached bitmaps"""
+    url = "/api/meeting_rooms/availability?from=2025-10-07&start=09:00&end=10:00"
+    assert len(client.get(url).json["rooms"]) == 3
+    availability = app_module.room_availability.get()
+
+    client.post(
+        "/submit_registration",
+        data={
+            "firstName": "Jane",
+            "lastName": "Doe",
+            "email": "jane@example.com",
+            "phone": "",
+            "company": "",
+            "space": "mr_1",
+            "membershipType": "daily",
+            "startDate": "2025-10-07",
+            "additionalInfo": "",
+            "bookingStart": "09:00",
+            "bookingEnd": "10:00",
+        },
+    )
+
+    assert [room["room_id"] for room in client.get(url).json["rooms"]] == ["2", "3"]
+    # Updated in place rather than rebuilt
+    assert app_module.room_availability.get() is availability
+
+    # A booking made elsewhere is picked up by a rebuild
+    storage.add_registration(make_booking("3", "2025-10-07", "09:30", "10:00"))
+    rooms = client.get(url).json["rooms"]
+    assert [(room["room_id"], room["free"]) for room in rooms] == [
+        ("2", True),
+        ("3", False),
+    ]
+
+
+def test_search_errors(client):
+    """Test that bad dates, ranges and times are rejected"""
+    for query in (
+        "",
+        "from=2025-13-01",
+        "from=2025-10-07&to=2025-10-06",
+        "from=2025-10-07&to=2026-10-07",
+        "from=2025-10-07&start=07:00",
+        "from=2025-10-07&start=10:10&end=11:00",
+        "from=2025-10-07&start=12:00&end=11:00",
+    ):
+        rv = client.get(f"/api/meeting_rooms/availability?{query}")
+        assert rv.status_code == 400, query
+        assert rv.json["error"]
@@ -0,0 +1,56 @@
+import json
+
+import app as app_module
+import benchmark
+from storage import JsonStorage
+
+
+def test_generated_dataset_is_consistent(tmp_path):
+    """Test that the generated dataset loads and its occupancy adds up"""
+    data = benchmark.generate_dataset(spaces=3, rows=2, cols=2, registrations=40)
+    storage = JsonStorage(tmp_path / "data.json")
+    storage.save(data)
+
+    spaces = storage.list_spaces()
+    space_registrations = [r for r in data["registrations"] if not r["is_meeting_room"]]
+    assert len(storage.list_registrations()) == 40
+    assert sum(space["current_occupancy"] for space in spaces.values()) == len(
+        space_registrations
+    )
+    # 36 registrations for spaces take all 12 seats
+    assert all(space["seat_map"].available_count() == 0 for space in spaces.values())
+    assert sum("selected_seat" in r for r in space_registrations) == 12
+
+
+def test_benchmark_writes_results(tmp_path, monkeypatch):
+    """Test a tiny benchmark run end to end"""
+    monkeypatch.setattr(app_module, "storage", app_module.storage)
+    output = tmp_path / "results.json"
+    benchmark.main(
+        [
+            "--spaces", "2", "--rows", "2", "--cols", "3", "--registrations", "10",
+            "--requests", "3", "--output", str(output),
+        ]
+    )  # fmt: skip
+
+    results = json.loads(output.read_text())
+    assert results["dataset"] == {
+        "spaces": 2,
+        "rows": 2,
+        "cols": 3,
+        "registrations": 10,
+    }
+    route = results["routes"]["space_detail"]
+    assert route["statuses"] == {"200": 3}
+    assert route["p50_ms"] <= route["p99_ms"] <= route["max_ms"]
+    assert route["throughput_rps"] > 0
+    assert "api_seat_events" in results["skipped"]
+    assert not [
+        endpoint
+        for endpoint, reason in results["skipped"].items()
+        if reason == "no benchmark defined"
+    ]
+    assert all(
+        not any(status.startswith("5") for status in route["statuses"])
+        for route in results["routes"].values()
+    )
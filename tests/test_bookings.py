@@ -0,0 +1,168 @@
+import pytest
+
+from bookings import (
+    BookingConflictError,
+    book,
+    booking_interval,
+    conflict,
+    free_slots,
+    overlapping,
+)
+from tests.conftest import BACKENDS, make_meeting_room, make_registration
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def storage(storage, backend):
+    storage.add_meeting_room(make_meeting_room())
+    return storage
+
+
+def make_booking(start, end, room_id="1"):
+    return {
+        **make_registration(f"mr_{room_id}", is_meeting_room=True),
+        "booking_start": f"2025-10-07T{start}",
+        "booking_end": f"2025-10-07T{end}",
+    }
+
+
+def test_booking_interval():
+    """Test that booking times are checked against slots and opening hours"""
+    assert booking_interval("2025-10-07", "9:30", "11:00", 30, "08:00", "20:00") == (
+        "2025-10-07T09:30",
+        "2025-10-07T11:00",
+    )
+    for start, end, error in (
+        ("10:00", "10:00", "end after"),
+        ("07:00", "09:00", "from 08:00 to 20:00"),
+        ("19:00", "21:00", "from 08:00 to 20:00"),
+        ("10:15", "11:00", "30 minute slots"),
+        ("10:00", "", "date and start and end"),
+    ):
+        with pytest.raises(ValueError, match=error):
+            booking_interval("2025-10-07", start, end, 30, "08:00", "20:00")
+    with pytest.raises(ValueError):
+        booking_interval("2025-02-30", "10:00", "11:00", 30, "08:00", "20:00")
+
+
+def test_conflicts_and_free_slots():
+    """Test conflict checks, overlap queries and free slots of a sorted list"""
+    bookings = []
+    for start, end, registration_id in (
+        ("2025-10-07T12:00", "2025-10-07T13:00", 1),
+        ("2025-10-07T09:00", "2025-10-07T10:00", 2),
+        ("2025-10-08T09:00", "2025-10-08T18:00", 3),
+        ("2025-10-07T10:00", "2025-10-07T11:00", 4),
+    ):
+        bookings = book(bookings, start, end, registration_id)
+    assert [booking[2] for booking in bookings] == [2, 4, 1, 3]
+
+    assert conflict(bookings, "2025-10-07T11:00", "2025-10-07T12:00") is None
+    assert conflict(bookings, "2025-10-07T08:00", "2025-10-07T09:00") is None
+    assert conflict(bookings, "2025-10-07T10:30", "2025-10-07T12:30")[2] == 1
+    assert conflict(bookings, "2025-10-07T08:00", "2025-10-07T20:00") is not None
+    with pytest.raises(BookingConflictError):
+        book(bookings, "2025-10-07T09:30", "2025-10-07T10:30", 5)
+
+    day = overlapping(bookings, "2025-10-07T08:00", "2025-10-07T20:00")
+    assert [booking[2] for booking in day] == [2, 4, 1]
+    assert free_slots(bookings, "2025-10-07", "08:00", "20:00") == [
+        ["2025-10-07T08:00", "2025-10-07T09:00"],
+        ["2025-10-07T11:00", "2025-10-07T12:00"],
+        ["2025-10-07T13:00", "2025-10-07T20:00"],
+    ]
+    assert free_slots(bookings, "2025-10-08", "09:00", "18:00") == []
+    assert free_slots([], "2025-10-09", "08:00", "20:00") == [
+        ["2025-10-09T08:00", "2025-10-09T20:00"]
+    ]
+
+
+def test_storage_rejects_overlapping_bookings(storage):
+    """Test that every backend stores bookings and refuses overlapping ones"""
+    first = storage.add_registration(make_booking("10:00", "11:00"))
+    storage.add_registration(make_booking("11:00", "12:00"))
+    # Registrations without a time slot still just count as occupants
+    storage.add_registration(make_registration("mr_1", is_meeting_room=True))
+    with pytest.raises(BookingConflictError):
+        storage.add_registration(make_booking("10:30", "11:30"))
+
+    assert len(storage.list_registrations()) == 3
+    assert storage.get_meeting_room("1")["current_occupancy"] == 3
+    assert storage.list_registrations()[0]["booking_start"] == "2025-10-07T10:00"
+    assert storage.room_bookings("1", "2025-10-07T10:30", "2025-10-07T20:00") == [
+        ["2025-10-07T10:00", "2025-10-07T11:00", first],
+        ["2025-10-07T11:00", "2025-10-07T12:00", first + 1],
+    ]
+    assert storage.room_bookings("1", "2025-10-07T12:00", "2025-10-07T20:00") == []
+    assert storage.room_bookings("9", "2025-10-07T08:00", "2025-10-07T20:00") is None
+    assert storage.load()["meeting_rooms"]["1"]["bookings"][0][0] == (
+        "2025-10-07T10:00"
+    )
+
+
+def test_slots_api(client, storage):
+    """Test the free slots endpoint of a meeting room"""
+    storage.add_registration(make_booking("09:00", "10:30"))
+
+    rv = client.get("/api/meeting_rooms/1/slots?date=2025-10-07")
+    assert rv.status_code == 200
+    assert rv.json["bookings"] == [
+        {"start": "2025-10-07T09:00", "end": "2025-10-07T10:30", "registration_id": 1}
+    ]
+    assert rv.json["free"] == [
+        ["2025-10-07T08:00", "2025-10-07T09:00"],
+        ["2025-10-07T10:30", "2025-10-07T20:00"],
+    ]
+    assert rv.json["slot_minutes"] == 30
+
+    assert client.get("/api/meeting_rooms/1/slots?date=x").status_code == 400
+    assert client.get("/api/meeting_rooms/9/slots?date=2025-10-07").status_code == 404
+
+
+def test_submit_booking(client, storage):
+    """Test booking a time slot through the registration form"""
+    form = {
+        "firstName": "Jane",
+        "lastName": "Doe",
+        "email": "jane@example.com",
+        "phone": "",
+        "company": "",
+        "space": "mr_1",
+        "membershipType": "daily",
+        "startDate": "2025-10-07",
+        "additionalInfo": "",
+        "bookingStart": "14:00",
+        "bookingEnd": "16:00",
+    }
+    rv = client.post("/submit_registration", data=form, follow_redirects=True)
+    assert b"Registration submitted successfully" in rv.data
+
+    rv = client.post(
+        "/submit_registration",
+        data={**form, "bookingStart": "15:00", "bookingEnd": "17:00"},
+        follow_redirects=True,
+    )
+    assert b"already booked at that time" in rv.data
+    rv = client.post(
+        "/submit_registration",
+        data={**form, "bookingStart": "15:10", "bookingEnd": "17:00"},
+        follow_redirects=True,
+    )
+    assert b"30 minute slots" in rv.data
+
+    assert [
+        (reg["booking_start"], reg["booking_end"])
+        for reg in storage.list_registrations()
+    ] == [("2025-10-07T14:00", "2025-10-07T16:00")]
+
+
+def test_room_pages_with_bookings(client, storage):
+    """Test that the meeting room pages are cached by fields, not bookings"""
+    storage.add_registration(make_booking("09:00", "10:00"))
+
+    assert b"Board" in client.get("/meeting_rooms").data
+    assert b"Board" in client.get("/meeting_room/1").data
@@ -0,0 +1,159 @@
+import threading
+
+import pytest
+
+import storage as storage_module
+from storage import ConflictError, SeatUnavailableError
+from tests.conftest import BACKENDS, make_registration, make_space, open_storage
+
+
+@pytest.fixture(params=BACKENDS)
+def workers(request, tmp_path):
+    """Independent storage instances on the same files, like gunicorn workers"""
+    first = open_storage(request.param, tmp_path)
+    first.init()
+    first.add_space(make_space("First", rows=4, cols=5))
+    first.add_space(make_space("Second", rows=4, cols=5))
+    return [first] + [open_storage(request.param, tmp_path) for _ in range(3)]
+
+
+def run_in_threads(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_same_seat_is_booked_once(workers):
+    """Test that concurrent bookings of one seat by several workers can't all win"""
+    results = []
+
+    def book(worker):
+        try:
+            results.append(worker.add_registration(make_registration("1", "1-1")))
+        except SeatUnavailableError:
+            results.append(None)
+
+    run_in_threads([lambda worker=worker: book(worker) for worker in workers])
+
+    assert len([result for result in results if result is not None]) == 1
+    assert len(workers[0].list_registrations()) == 1
+    assert workers[0].get_space("1")["current_occupancy"] == 1
+
+
+def test_concurrent_bookings_are_not_lost(workers):
+    """Test that bookings by different workers don't overwrite each other"""
+
+    def book(worker, space_id, row):
+        for col in range(1, 6):
+            worker.add_registration(make_registration(space_id, f"{row}-{col}"))
+
+    run_in_threads(
+        [
+            lambda worker=worker, index=index: book(
+                worker, str(index % 2 + 1), index // 2 + 1
+            )
+            for index, worker in enumerate(workers)
+        ]
+    )
+
+    registrations = workers[0].list_registrations()
+    assert len(registrations) == 20
+    assert sorted(reg["id"] for reg in registrations) == list(range(1, 21))
+    for space_id in ("1", "2"):
+        space = workers[0].get_space(space_id)
+        assert space["current_occupancy"] == 10
+        assert len(list(space["seat_map"].unavailable())) == 10
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_workers_starting_together(backend, tmp_path):
+    """Test that workers creating the storage at once don't lose each other's data"""
+
+    def start(index):
+        worker = open_storage(backend, tmp_path)
+        worker.init()
+        worker.add_space(make_space(f"Space {index}"))
+
+    run_in_threads([lambda index=index: start(index) for index in range(8)])
+
+    spaces = open_storage(backend, tmp_path).list_spaces()
+    assert sorted(space["name"] for space in spaces.values()) == [
+        f"Space {index}" for index in range(8)
+    ]
+
+
+def test_version_is_bumped_on_every_change(workers):
+    """Test that each committed change to a space bumps its version"""
+    storage = workers[0]
+    version = storage.get_space("1")["version"]
+    storage.update_space("1", current_occupancy=3)
+    storage.add_equipment("1", {"name": "Projector", "quantity": 1})
+    storage.add_registration(make_registration("1", "1-1"))
+
+    assert storage.get_space("1")["version"] == version + 3
+    assert storage.get_space("2")["version"] == version
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def storage(storage, backend):
+    storage.add_space(make_space("First"))
+    storage.add_space(make_space("Second"))
+    return storage
+
+
+def test_conflict_retries_only_the_affected_space(storage, backend, tmp_path):
+    """Test that a concurrent change to the same space causes a retry"""
+    other = open_storage(backend, tmp_path)
+    revision = storage.revision()
+    attempts = []
+
+    def change(space):
+        attempts.append(space["version"])
+        if len(attempts) == 1:
+            # Another worker changes this space between our read and commit
+            other.update_space("1", current_occupancy=1)
+        space["capacity"] = 100
+
+    assert storage.modify_space("1", change)
+    assert attempts == [0, 1]
+    space = storage.get_space("1")
+    assert space["capacity"] == 100
+    assert space["current_occupancy"] == 1
+    assert space["version"] == 2
+    # The attempt that conflicted isn't committed
+    assert storage.revision() == revision + 2
+
+
+def test_change_to_other_space_does_not_conflict(storage, backend, tmp_path):
+    """Test that a concurrent change to another space merges without a retry"""
+    other = open_storage(backend, tmp_path)
+    attempts = []
+
+    def change(space):
+        attempts.append(space["version"])
+        other.update_space("2", name="Renamed")
+        space["capacity"] = 100
+
+    storage.modify_space("1", change)
+    assert len(attempts) == 1
+    assert storage.get_space("1")["capacity"] == 100
+    assert storage.get_space("2")["name"] == "Renamed"
+
+
+def test_conflict_error_after_retries(storage, backend, tmp_path, monkeypatch):
+    """Test that a space changing on every attempt eventually gives up"""
+    monkeypatch.setattr(storage_module, "CAS_RETRIES", 3)
+    other = open_storage(backend, tmp_path)
+
+    def change(space):
+        other.update_space("1", current_occupancy=space["version"] + 1)
+
+    with pytest.raises(ConflictError):
+        storage.modify_space("1", change)
@@ -0,0 +1,94 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+import export
+from tests.conftest import make_registration, make_space
+
+
+@pytest.fixture(params=["json", "journal", "sqlite"])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def storage(storage, backend):
+    storage.add_space(make_space("First", rows=4, cols=4))
+    storage.add_space(make_space("Second", rows=4, cols=4))
+    for day in range(1, 11):
+        storage.add_registration(
+            dict(
+                make_registration(
+                    "1" if day % 2 else "2", f"{day % 4 + 1}-{day // 4 + 1}"
+                ),
+                membership_type="daily" if day % 3 else "annual",
+                submitted_at=f"2025-09-{day:02d}T10:00:00",
+            )
+        )
+    return storage
+
+
+def test_iter_registrations(storage, monkeypatch):
+    """Test that all backends iterate filtered registrations in id order"""
+    monkeypatch.setattr("sqlite_storage.EXPORT_BATCH_SIZE", 3)
+    assert [reg["id"] for reg in storage.iter_registrations()] == list(range(1, 11))
+    found = storage.iter_registrations(space_id="1", submitted_to="2025-09-07")
+    assert [reg["id"] for reg in found] == [1, 3, 5, 7]
+
+
+def test_csv_export(client):
+    """Test the CSV export with filters"""
+    rv = client.get("/registrations/export?format=csv&space=2&membership_type=annual")
+    assert rv.mimetype == "text/csv"
+    assert "registrations.csv" in rv.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(rv.get_data(as_text=True))))
+    assert [row["id"] for row in rows] == ["6"]
+    assert rows[0]["email"] == "john.doe@example.com"
+    assert rows[0]["selected_seat"] == "3-2"
+
+
+def test_ndjson_export_gzip(client):
+    """Test the gzipped NDJSON export"""
+    rv = client.get("/registrations/export?format=ndjson&gzip=1")
+    assert rv.mimetype == "application/gzip"
+    assert "registrations.ndjson.gz" in rv.headers["Content-Disposition"]
+    lines = gzip.decompress(rv.data).decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == list(range(1, 11))
+
+    for flag in ("0", "false", "no"):
+        rv = client.get(f"/registrations/export?format=ndjson&gzip={flag}")
+        assert rv.mimetype == "application/x-ndjson"
+    assert client.get("/registrations/export?gzip=true").mimetype == "application/gzip"
+
+
+def test_export_errors(client):
+    """Test that bad formats and filters are rejected"""
+    assert client.get("/registrations/export?format=xml").status_code == 400
+    rv = client.get("/registrations/export?submitted_to=someday")
+    assert rv.status_code == 400
+
+
+def test_export_streams_in_chunks(monkeypatch):
+    """Test that exports are produced chunk by chunk instead of all at once"""
+    monkeypatch.setattr(export, "CHUNK_SIZE", 100)
+    consumed = []
+
+    def registrations():
+        for reg_id in range(1, 51):
+            consumed.append(reg_id)
+            yield dict(make_registration("1"), id=reg_id)
+
+    chunks = export.csv_chunks(registrations())
+    first = next(chunks)
+    assert len(consumed) < 50
+    rest = b"".join(chunks)
+    assert len((first + rest).splitlines()) == 51
+
+
+def test_csv_header_without_registrations():
+    """Test that an empty export still has the CSV header"""
+    data = b"".join(export.csv_chunks(iter([])))
+    assert data.decode().strip() == ",".join(export.REGISTRATION_FIELDS)
@@ -0,0 +1,144 @@
+import json
+import time
+
+import pytest
+
+import app as app_module
+from importer import ImportValidationError, parse_records
+from tests.conftest import BACKENDS, make_registration, make_space
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def storage(storage, backend):
+    storage.add_space(make_space("Existing"))
+    return storage
+
+
+def ndjson(*records):
+    return [json.dumps(record) + "\n" for record in records]
+
+
+def registration(**fields):
+    record = make_registration(None)
+    del record["space_id"], record["is_meeting_room"]
+    return {"type": "registration", **record, **fields}
+
+
+def test_import_all_kinds(storage):
+    """Test importing spaces, rooms and registrations that refer to them"""
+    records = parse_records(
+        ndjson(
+            {"type": "space", "name": "Hub", "location": "Top", "rows": 3, "cols": 4},
+            {"type": "meeting_room", "name": "Board", "capacity": 10},
+            registration(space_name="Hub", selected_seat="3-4"),
+            registration(space_id="1", selected_seat="1-1", membership_type="weekly"),
+            registration(space_name="Board"),
+        ),
+        "ndjson",
+    )
+    assert storage.import_records(records) == {
+        "spaces": 1,
+        "meeting_rooms": 1,
+        "registrations": 3,
+    }
+
+    hub = storage.get_space("2")
+    assert hub["capacity"] == 12
+    assert (hub["seat_map"].rows, hub["seat_map"].cols) == (3, 4)
+    assert hub["seat_map"].holders == {"3-4": "John Doe"}
+    assert hub["current_occupancy"] == 1
+    assert not storage.get_space("1")["seat_map"].is_available("1-1")
+    assert storage.get_meeting_room("1")["current_occupancy"] == 1
+
+    registrations = storage.list_registrations()
+    assert [reg["id"] for reg in registrations] == [1, 2, 3]
+    assert [reg["space_id"] for reg in registrations] == ["2", "1", "mr_1"]
+    assert registrations[0]["space_name"] == "Hub"
+    assert registrations[2]["is_meeting_room"] is True
+
+
+def test_invalid_rows_import_nothing(storage):
+    """Test that one invalid row rejects the batch and every error is reported"""
+    storage.add_registration(make_registration("1", "1-1"))
+    lines = ndjson(
+        {"type": "space", "name": "Fine"},
+        {"type": "space", "name": "Huge", "rows": 1000},
+        registration(space_id="1", selected_seat="1-1"),
+        registration(space_id="1", selected_seat="1-2"),
+        registration(space_id="1", selected_seat="1-2"),
+        registration(space_name="Nowhere"),
+        registration(space_id="1", membership_type="hourly"),
+        {"type": "desk"},
+    ) + ["{not json\n"]
+
+    with pytest.raises(ImportValidationError) as error:
+        storage.import_records(parse_records(lines, "ndjson"))
+
+    assert [line for line, _ in error.value.errors] == [2, 3, 5, 6, 7, 8, 9]
+    assert "rows must be at most 100" in error.value.errors[0][1]
+    assert "seat 1-1 is not available" in error.value.errors[1][1]
+    assert len(storage.list_spaces()) == 1
+    assert len(storage.list_registrations()) == 1
+
+
+def test_csv_import(storage):
+    """Test importing a CSV file of one record type"""
+    lines = [
+        "name,location,capacity\n",
+        "Room A,Floor 1,4\n",
+        "Room B,,8\n",
+    ]
+    records = parse_records(lines, "csv", "meeting_room")
+    assert storage.import_records(records)["meeting_rooms"] == 2
+    assert storage.get_meeting_room("2") == {
+        "name": "Room B",
+        "location": "",
+        "capacity": 8,
+        "current_occupancy": 0,
+    }
+    with pytest.raises(ValueError):
+        parse_records(lines, "csv")
+
+
+def test_large_import_is_fast(storage):
+    """Test that 10k registrations are imported in a single quick save"""
+    lines = ndjson(
+        {"type": "space", "name": "Big", "rows": 100, "cols": 100},
+        *(
+            registration(
+                space_name="Big", selected_seat=f"{i // 100 + 1}-{i % 100 + 1}"
+            )
+            for i in range(10000)
+        ),
+    )
+    start = time.perf_counter()
+    storage.import_records(parse_records(lines, "ndjson"))
+    assert time.perf_counter() - start < 10
+    assert storage.get_space("2")["current_occupancy"] == 10000
+    assert len(storage.list_registrations()) == 10000
+
+
+def test_import_api_and_cli(client, storage, tmp_path):
+    """Test the import endpoint and the import-data command"""
+    rv = client.post(
+        "/api/import?format=csv&type=space",
+        data="name,location,rows,cols\nNew,There,2,3\n",
+    )
+    assert rv.get_json() == {
+        "imported": {"spaces": 1, "meeting_rooms": 0, "registrations": 0}
+    }
+    rv = client.post("/api/import", data="".join(ndjson({"type": "space"})))
+    assert rv.status_code == 400
+    assert rv.get_json()["errors"] == [{"line": 1, "error": "name is required"}]
+
+    path = tmp_path / "rooms.ndjson"
+    path.write_text("".join(ndjson({"name": "Room", "capacity": 6})))
+    runner = app_module.app.test_cli_runner()
+    result = runner.invoke(args=["import-data", str(path), "--type", "meeting_room"])
+    assert "Imported 0 spaces, 1 meeting rooms" in result.output
+    assert storage.get_meeting_room("1")["name"] == "Room"
@@ -0,0 +1,101 @@
+import pytest
+
+from indexes import RegistrationIndex
+from storage import JsonStorage
+from tests.conftest import make_registration, make_space
+
+
+def registration(reg_id, space_id, email, start_date):
+    return {
+        "id": reg_id,
+        "space_id": space_id,
+        "email": email,
+        "start_date": start_date,
+        "membership_type": "monthly",
+    }
+
+
+@pytest.fixture
+def registrations():
+    return [
+        registration(1, "1", "a@example.com", "2025-10-01"),
+        registration(2, "2", "b@example.com", "2025-10-03"),
+        registration(3, "1", "b@example.com", "2025-10-02"),
+    ]
+
+
+def test_find_by_field(registrations):
+    """Test equality lookups on each indexed field"""
+    index = RegistrationIndex(registrations)
+    assert [reg["id"] for reg in index.find(space_id="1")] == [1, 3]
+    assert [reg["id"] for reg in index.find(email="b@example.com")] == [2, 3]
+    assert [reg["id"] for reg in index.find(start_date="2025-10-03")] == [2]
+    assert index.find(space_id="999") == []
+
+
+def test_find_combines_criteria(registrations):
+    """Test lookups with several criteria, including non-indexed fields"""
+    index = RegistrationIndex(registrations)
+    found = index.find(space_id="1", email="b@example.com")
+    assert [reg["id"] for reg in found] == [3]
+    assert len(index.find(membership_type="monthly")) == 3
+
+
+def test_appended_registrations_are_indexed(registrations):
+    """Test that the index catches up with appended registrations"""
+    index = RegistrationIndex(registrations)
+    registrations.append(registration(4, "1", "c@example.com", "2025-09-30"))
+    index.refresh()
+
+    assert [reg["id"] for reg in index.find(space_id="1")] == [1, 3, 4]
+    assert list(index.positions_between("start_date", "2025-09-30", "2025-10-01")) == [
+        0,
+        3,
+    ]
+    assert list(index.positions_between("start_date", low="2025-10-02")) == [1, 2]
+
+
+@pytest.fixture(params=["json", "journal"])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def storage(storage, backend):
+    storage.add_space(make_space("First"))
+    storage.add_space(make_space("Second"))
+    return storage
+
+
+def test_storage_index_follows_writes(storage, tmp_path):
+    """Test that the storage index is updated by registrations and reloads"""
+    storage.add_registration(make_registration("1"))
+    assert len(storage.space_registrations("1")) == 1
+    index = storage._index()
+
+    storage.add_registration(make_registration("2"))
+    storage.add_registration(make_registration("1"))
+    assert [reg["id"] for reg in storage.space_registrations("1")] == [1, 3]
+    assert storage._index() is index  # updated, not rebuilt
+
+    # A write by another process is picked up with a fresh index
+    other = JsonStorage(tmp_path / "data.json")
+    other.update_space("2", name="Renamed")
+    assert [reg["id"] for reg in storage.space_registrations("2")] == [2]
+    assert storage._index() is not index
+
+
+def test_registrations_email_search(client, storage):
+    """Test searching registrations by email on the registrations page"""
+    space_id = storage.add_space(make_space("Indexed Space"))
+    storage.add_registration(make_registration(space_id))
+    storage.add_registration(
+        dict(make_registration(space_id), email="jane@example.com", first_name="Jane")
+    )
+
+    rv = client.get("/registrations?email=jane@example.com")
+    assert b"jane@example.com" in rv.data
+    assert b"john.doe@example.com" not in rv.data
+
+    rv = client.get("/registrations?email=nobody@example.com")
+    assert b"No registrations found for nobody@example.com" in rv.data
@@ -0,0 +1,101 @@
+import json
+import os
+
+import pytest
+
+from journal_storage import JournalStorage
+from storage import SeatUnavailableError
+from tests.conftest import make_registration, make_space
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / "data.json", tmp_path / "data.journal"
+
+
+@pytest.fixture
+def storage(paths):
+    storage = JournalStorage(*paths)
+    storage.init()
+    storage.add_space(make_space())
+    return storage
+
+
+def read_snapshot(paths):
+    with open(paths[0]) as f:
+        return json.load(f)
+
+
+def test_registration_appends_one_line(storage, paths):
+    """Test that a registration is journaled without rewriting the snapshot"""
+    snapshot = read_snapshot(paths)
+    storage.add_registration(make_registration("1", "1-1"))
+    storage.add_registration(make_registration("1", "1-2"))
+
+    assert read_snapshot(paths) == snapshot
+    with open(paths[1]) as f:
+        events = [json.loads(line) for line in f]
+    assert [event["seq"] for event in events] == [1, 2]
+    assert events[1]["registration"]["selected_seat"] == "1-2"
+    assert storage.get_space("1")["current_occupancy"] == 2
+
+
+def test_state_is_rebuilt_from_snapshot_and_journal(storage, paths):
+    """Test that a new process replays the journal on top of the snapshot"""
+    storage.add_registration(make_registration("1", "2-2"))
+
+    restarted = JournalStorage(*paths)
+    space = restarted.get_space("1")
+    assert not space["seat_map"].is_available("2-2")
+    assert space["current_occupancy"] == 1
+    assert [reg["id"] for reg in restarted.list_registrations()] == [1]
+
+
+def test_other_process_appends_are_replayed(storage, paths):
+    """Test that appends by another process are picked up incrementally"""
+    other = JournalStorage(*paths)
+    assert other.list_registrations() == []
+
+    storage.add_registration(make_registration("1", "1-1"))
+    assert len(other.list_registrations()) == 1
+    with pytest.raises(SeatUnavailableError):
+        other.add_registration(make_registration("1", "1-1"))
+
+
+def test_compaction_folds_journal_into_snapshot(storage, paths):
+    """Test that compaction writes a snapshot and empties the journal"""
+    storage.add_registration(make_registration("1", "1-1"))
+    storage.compact()
+
+    assert os.path.getsize(paths[1]) == 0
+    snapshot = read_snapshot(paths)
+    assert snapshot["journal_seq"] == 1
+    assert len(snapshot["registrations"]) == 1
+    assert len(JournalStorage(*paths).list_registrations()) == 1
+
+
+def test_replay_after_interrupted_compaction(storage, paths):
+    """Test that events already in the snapshot are not applied twice"""
+    storage.add_registration(make_registration("1", "1-1"))
+    with open(paths[1], "rb") as f:
+        journal = f.read()
+    storage.compact()
+    # Simulate a crash between writing the snapshot and truncating the journal
+    with open(paths[1], "wb") as f:
+        f.write(journal)
+
+    restarted = JournalStorage(*paths)
+    assert len(restarted.list_registrations()) == 1
+    assert restarted.get_space("1")["current_occupancy"] == 1
+
+
+def test_threshold_triggers_background_compaction(paths):
+    """Test that crossing the size threshold compacts the journal"""
+    storage = JournalStorage(*paths, compact_threshold=1)
+    storage.init()
+    storage.add_space(make_space())
+    storage.add_registration(make_registration("1", "1-1"))
+    storage._compaction.join(5)
+
+    assert os.path.getsize(paths[1]) == 0
+    assert len(read_snapshot(paths)["registrations"]) == 1
@@ -0,0 +1,87 @@
+import subprocess
+import sys
+import textwrap
+
+import app as app_module
+from metrics import Histogram, Metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    """Test the Prometheus rendering of a histogram"""
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, (("endpoint", "index"),))
+
+    lines = list(histogram.render())
+    assert lines[:2] == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+    ]
+    assert lines[2:] == [
+        'latency_seconds_bucket{endpoint="index",le="0.1"} 2',
+        'latency_seconds_bucket{endpoint="index",le="1.0"} 3',
+        'latency_seconds_bucket{endpoint="index",le="+Inf"} 4',
+        'latency_seconds_sum{endpoint="index"} 3.65',
+        'latency_seconds_count{endpoint="index"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    """Test that quotes and backslashes in label values are escaped"""
+    metrics = Metrics()
+    metrics.observe_render('a"b\\c.html', 0.01)
+    assert 'template="a\\"b\\\\c.html"' in metrics.render()
+
+
+def test_metrics_endpoint(tmp_path):
+    """Test /metrics of an app started with metrics enabled"""
+    # Request hooks can only be installed before the first request, so this
+    # runs in a fresh interpreter
+    script = textwrap.dedent(
+        """
+        import base64
+        import app
+
+        client = app.app.test_client()
+        print(client.get("/metrics").status_code)
+        client.post("/login", data=dict(username="admin", password="password"))
+        client.post("/add_space", data=dict(name="A", location="B", capacity=4))
+        client.get("/spaces")
+        print(client.get("/metrics").data.decode())
+
+        client = app.app.test_client()
+        token = base64.b64encode(b"admin:password").decode()
+        print(client.get("/metrics", headers={"Authorization": f"Basic {token}"}).status_code)
+    """
+    )
+    env = {"METRICS_ENABLED": "1", "DATA_DIRECTORY": str(tmp_path), "PATH": ""}
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    output = result.stdout
+    assert output.startswith("401\n")
+    assert output.rstrip().endswith("200")
+    assert (
+        'http_requests_total{endpoint="add_space",method="POST",status="302"} 1'
+        in output
+    )
+    assert (
+        'http_request_duration_seconds_count{endpoint="spaces",method="GET"} 1'
+        in output
+    )
+    assert 'template_render_duration_seconds_count{template="spaces.html"} 1' in output
+    assert (
+        'storage_operation_duration_seconds_count{backend="json",operation="save"}'
+        in output
+    )
+    assert 'storage_bytes_total{backend="json",operation="save"}' in output
+
+
+def test_metrics_disabled(client):
+    """Test that /metrics is not found when metrics are disabled"""
+    assert app_module.metrics is None
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,106 @@
+import pytest
+
+import app as app_module
+from page_cache import ALL, PageCache
+from tests.conftest import (
+    make_meeting_room,
+    make_registration,
+    make_space,
+    open_storage,
+)
+
+
+@pytest.fixture
+def storage(storage, monkeypatch):
+    storage.add_space(make_space("First", rows=2, cols=2))
+    storage.add_meeting_room(make_meeting_room())
+    monkeypatch.setattr(app_module, "page_cache", PageCache(1024 * 1024))
+    return storage
+
+
+@pytest.fixture
+def client(client):
+    client.get("/")  # consume the login flash
+    return client
+
+
+def test_lru_eviction_and_memory_cap():
+    """Test that the least recently used pages go once the cap is reached"""
+    page = "x" * 1000
+    cache = PageCache(3 * len(page) + 200)
+    for key in "abc":
+        cache.put(key, page, [("space", key)])
+    assert cache.get("a") == page  # "b" is now the oldest
+    cache.put("d", page, [("space", "d")])
+
+    assert cache.get("b") is None
+    assert [cache.get(key) is not None for key in "acd"] == [True, True, True]
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"]) == (3, 1)
+    assert stats["bytes"] <= stats["max_bytes"]
+
+    cache.put("huge", "x" * 10000, [])
+    assert cache.get("huge") is None
+
+
+def test_invalidation_by_entity():
+    """Test that invalidating an entity drops its pages and the list pages"""
+    cache = PageCache(1024 * 1024)
+    cache.put("detail-1", "one", [("space", "1")])
+    cache.put("detail-2", "two", [("space", "2")])
+    cache.put("list", "all", [("space", ALL)])
+    cache.put("room", "room", [("meeting_room", "1")])
+
+    cache.invalidate("space", "1")
+    assert cache.get("detail-1") is None and cache.get("list") is None
+    assert cache.get("detail-2") == "two" and cache.get("room") == "room"
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_pages_are_cached_until_changed(client, storage):
+    """Test hits for unchanged data and fresh pages after a change"""
+    cache = app_module.page_cache
+    first = client.get("/space/1").data
+    assert client.get("/space/1").data == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    client.post("/add_equipment/1", data=dict(equipment_name="Lamp", quantity=1))
+    client.get("/spaces")  # consume the flash
+    assert b"Lamp" in client.get("/space/1").data
+    assert client.get("/api/page_cache").get_json()["invalidations"] == 1
+
+
+def test_changes_by_other_workers_miss(client, storage):
+    """Test that a change the routes didn't see still changes the key"""
+    assert b"Board" in client.get("/meeting_rooms").data
+    assert b"John" not in client.get("/space/1").data
+    storage.update_meeting_room("1", name="Boardroom")
+    storage.add_registration(make_registration("1", "1-1"))
+
+    assert b"Boardroom" in client.get("/meeting_rooms").data
+    assert b"Boardroom" in client.get("/meeting_room/1").data
+    assert b"John" in client.get("/space/1").data
+    storage.add_space(make_space("Second"))
+    assert b"Second" in client.get("/spaces").data
+
+
+def test_space_replaced_by_other_worker_misses(client, storage, backend, tmp_path):
+    """Test that a new space under the id of a deleted one isn't served stale"""
+    storage.add_space(make_space("Beta"))
+    assert b"Beta" in client.get("/space/2").data
+    assert b"Beta" in client.get("/spaces").data
+
+    other = open_storage(backend, tmp_path)
+    other.delete_space("2")
+    assert other.add_space(make_space("Gamma")) == "2"
+
+    assert b"Gamma" in client.get("/space/2").data
+    assert b"Gamma" in client.get("/spaces").data
+
+
+def test_flashed_messages_are_not_cached(client, storage):
+    """Test that a page showing a flashed message isn't cached"""
+    client.post("/update_occupancy/1", data=dict(occupancy=99))
+    assert b"Occupancy cannot exceed capacity" in client.get("/space/1").data
+    assert b"Occupancy cannot exceed capacity" not in client.get("/space/1").data
+    assert app_module.page_cache.stats()["entries"] == 1
@@ -0,0 +1,126 @@
+import pytest
+
+from indexes import RegistrationIndex
+from storage import Storage
+from tests.conftest import BACKENDS, make_registration, make_space
+
+
+def registration(reg_id, space_id, membership_type, submitted_at):
+    return dict(
+        make_registration(space_id),
+        id=reg_id,
+        membership_type=membership_type,
+        submitted_at=submitted_at,
+    )
+
+
+@pytest.fixture
+def registrations():
+    return [
+        registration(1, "1", "daily", "2025-09-01T10:00:00"),
+        registration(2, "2", "monthly", "2025-09-02T10:00:00"),
+        registration(3, "1", "monthly", "2025-09-03T10:00:00"),
+        registration(4, "1", "daily", "2025-09-04T10:00:00"),
+        registration(5, "2", "daily", "2025-09-05T10:00:00"),
+    ]
+
+
+def ids(page):
+    return [reg["id"] for reg in page]
+
+
+def test_index_pages_walk_backwards(registrations):
+    """Test that pages are newest first and the cursor leads to the next page"""
+    index = RegistrationIndex(registrations)
+    page, cursor = index.page(2)
+    assert (ids(page), cursor) == ([5, 4], 4)
+    page, cursor = index.page(2, cursor)
+    assert (ids(page), cursor) == ([3, 2], 2)
+    page, cursor = index.page(2, cursor)
+    assert (ids(page), cursor) == ([1], None)
+
+
+def test_index_page_filters(registrations):
+    """Test each listing filter and combinations of them"""
+    index = RegistrationIndex(registrations)
+    assert ids(index.page(10, space_id="1")[0]) == [4, 3, 1]
+    assert ids(index.page(10, membership_type="daily")[0]) == [5, 4, 1]
+    assert ids(index.page(10, space_id="1", membership_type="daily")[0]) == [4, 1]
+    page, _ = index.page(10, submitted_from="2025-09-02", submitted_to="2025-09-04")
+    assert ids(page) == [4, 3, 2]
+    page, _ = index.page(10, space_id="2", submitted_from="2025-09-03")
+    assert ids(page) == [5]
+    assert index.page(1, space_id="1", before_id=4) == ([registrations[2]], 3)
+
+
+def test_index_pages_by_submission_date(registrations):
+    """Test date range pages walking back from the cursor, dates in any order"""
+    # Imported late, submitted early
+    registrations.append(registration(6, "1", "daily", "2025-09-02T09:00:00"))
+    registrations.append(registration(7, "1", "daily", "2025-09-09T09:00:00"))
+    index = RegistrationIndex(registrations)
+    page, cursor = index.page(2, submitted_from="2025-09-02", submitted_to="2025-09-04")
+    assert (ids(page), cursor) == ([6, 4], 4)
+    page, cursor = index.page(
+        2, cursor, submitted_from="2025-09-02", submitted_to="2025-09-04"
+    )
+    assert (ids(page), cursor) == ([3, 2], None)
+    assert ids(index.page(10, submitted_to="2025-09-01")[0]) == [1]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+
+@pytest.fixture(params=["indexed", "scan"])
+def storage(request, storage, backend):
+    storage.add_space(make_space("First", rows=4, cols=4))
+    storage.add_space(make_space("Second", rows=4, cols=4))
+    for day in range(1, 11):
+        space_id = "1" if day % 2 else "2"
+        storage.add_registration(
+            dict(
+                make_registration(space_id),
+                membership_type="daily" if day % 3 else "annual",
+                submitted_at=f"2025-09-{day:02d}T10:00:00",
+            )
+        )
+    if request.param == "scan":
+        # The generic scan of the base class, on the same data
+        storage.page_registrations = Storage.page_registrations.__get__(storage)
+    return storage
+
+
+def test_storage_pages(storage):
+    """Test that all backends return the same filtered pages"""
+    page, cursor = storage.page_registrations(3)
+    assert (ids(page), cursor) == ([10, 9, 8], 8)
+    page, cursor = storage.page_registrations(3, before_id=cursor)
+    assert (ids(page), cursor) == ([7, 6, 5], 5)
+
+    page, cursor = storage.page_registrations(
+        2, space_id="1", membership_type="daily", submitted_from="2025-09-02"
+    )
+    assert (ids(page), cursor) == ([7, 5], None)
+    assert ids(storage.page_registrations(2, 5, space_id="1")[0]) == [3, 1]
+    page, cursor = storage.page_registrations(5, submitted_to="2025-09-02")
+    assert (ids(page), cursor) == ([2, 1], None)
+
+
+def test_registrations_pages(client):
+    """Test the registrations page and its JSON API with filters and a cursor"""
+    rv = client.get("/api/registrations?space=2&limit=2")
+    data = rv.get_json()
+    assert ids(data["registrations"]) == [10, 8]
+    assert data["next_cursor"] == 8
+
+    rv = client.get("/api/registrations?space=2&limit=2&before=8")
+    assert ids(rv.get_json()["registrations"]) == [6, 4]
+
+    rv = client.get("/api/registrations?submitted_from=yesterday")
+    assert rv.status_code == 400
+
+    rv = client.get("/registrations?membership_type=annual&limit=1")
+    assert b"before=9" in rv.data
+    assert b"Older" in rv.data
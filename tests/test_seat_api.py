@@ -0,0 +1,102 @@
+import pytest
+
+from seats import SeatMap
+from tests.conftest import BACKENDS, make_registration, make_space, open_storage
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def storage(storage, backend):
+    storage.add_space(make_space("First", rows=3, cols=3))
+    return storage
+
+
+def test_seat_changes_are_versioned(storage):
+    """Test that a reserved seat records the version it was reserved in"""
+    storage.add_registration(make_registration("1", "1-1"))
+    storage.update_space("1", name="Renamed")
+    storage.add_registration(make_registration("1", "2-2"))
+
+    seat_map = storage.get_space("1")["seat_map"]
+    assert storage.get_space("1")["version"] == 3
+    assert seat_map.changed == {"1-1": 1, "2-2": 3}
+    assert seat_map.changed_since(1) == ["2-2"]
+    assert seat_map.changed_since(3) == []
+
+
+def test_etag_and_not_modified(client, storage):
+    """Test that an unchanged space is answered with 304 Not Modified"""
+    rv = client.get("/api/seats/1")
+    etag = rv.headers["ETag"]
+    assert rv.status_code == 200
+    assert "no-cache" in rv.headers["Cache-Control"]
+
+    rv = client.get("/api/seats/1", headers={"If-None-Match": etag})
+    assert rv.status_code == 304
+    assert rv.data == b""
+
+    storage.add_registration(make_registration("1", "3-3"))
+    rv = client.get("/api/seats/1", headers={"If-None-Match": etag})
+    assert rv.status_code == 200
+    assert rv.headers["ETag"] != etag
+    assert rv.get_json()["seats"]["3-3"]["available"] is False
+
+
+def test_etag_of_space_under_reused_id(client, storage, backend, tmp_path):
+    """Test that a new space with the id of a deleted one has another ETag"""
+    storage.add_space(make_space("Second"))
+    etag = client.get("/api/seats/2").headers["ETag"]
+    groups_url = "/api/seats/2/groups?size=2"
+    groups_etag = client.get(groups_url).headers["ETag"]
+
+    other = open_storage(backend, tmp_path)
+    other.delete_space("2")
+    assert other.add_space(make_space("Third", rows=1, cols=1)) == "2"
+
+    rv = client.get("/api/seats/2", headers={"If-None-Match": etag})
+    assert rv.status_code == 200
+    assert list(rv.get_json()["seats"]) == ["1-1"]
+    rv = client.get(groups_url, headers={"If-None-Match": groups_etag})
+    assert rv.status_code == 200
+
+
+def test_delta_since_version(client, storage):
+    """Test that ?since returns only the seats changed after that version"""
+    version = client.get("/api/seats/1").get_json()["version"]
+    storage.add_registration(make_registration("1", "1-2"))
+    storage.add_registration(make_registration("1", "2-1"))
+
+    data = client.get(f"/api/seats/1?since={version}").get_json()
+    assert "seat_layout" not in data
+    assert data["version"] == version + 2
+    assert sorted(data["seats"]) == ["1-2", "2-1"]
+    assert data["seats"]["2-1"]["reserved_by"] == "John Doe"
+
+    data = client.get(f"/api/seats/1?since={version + 1}").get_json()
+    assert list(data["seats"]) == ["2-1"]
+    assert client.get(f"/api/seats/1?since={version + 2}").get_json()["seats"] == {}
+
+    # A version the space hasn't reached (e.g. it was recreated) gets everything
+    data = client.get("/api/seats/1?since=99").get_json()
+    assert len(data["seats"]) == 9 and "seat_layout" in data
+    assert client.get("/api/seats/1?since=latest").status_code == 400
+
+
+def test_released_seat_is_in_delta(storage):
+    """Test that releasing a seat is reported like a reservation"""
+    storage.add_registration(make_registration("1", "1-1"))
+
+    def release(space):
+        seat_map = space["seat_map"].copy()
+        seat_map.set("1-1", True, version=space["version"] + 1)
+        space["seat_map"] = seat_map
+
+    storage.modify_space("1", release)
+    seat_map = storage.get_space("1")["seat_map"]
+    assert seat_map.is_available("1-1")
+    assert seat_map.changed_since(1) == ["1-1"]
+    assert seat_map == SeatMap(3, 3, changed={"1-1": 2})
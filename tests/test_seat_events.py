@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+import app as app_module
+from events import SeatEvents, TooManySubscribersError
+from tests.conftest import make_registration, make_space
+
+
+@pytest.fixture
+def storage(storage):
+    storage.add_space(make_space("First", rows=3, cols=3))
+    return storage
+
+
+def parse(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+
+def test_changes_are_fanned_out(storage):
+    """Test that one check of a space queues its changes for every subscriber"""
+    hub = SeatEvents(storage.get_space, poll_interval=60)
+    subscriptions = [hub.subscribe("1") for _ in range(300)]
+    assert hub.subscribe("99") is None
+    assert hub.subscriber_count() == 300
+
+    storage.add_registration(make_registration("1", "2-3"))
+    hub.publish("1")
+    hub.publish("1")  # nothing new the second time
+    for subscription in subscriptions:
+        event = subscription.get(0)
+        assert event["event"] == "seat"
+        assert (event["id"], event["available"], event["version"]) == ("2-3", False, 1)
+        assert subscription.get(0) is None
+
+    for subscription in subscriptions:
+        hub.unsubscribe(subscription)
+    assert hub.subscriber_count() == 0
+
+
+def test_subscribers_are_limited(client, storage, monkeypatch):
+    """Test that a full hub refuses new streams until one is closed"""
+    hub = SeatEvents(storage.get_space, poll_interval=60, max_subscribers=2)
+    first = hub.subscribe("1")
+    hub.subscribe("1")
+    with pytest.raises(TooManySubscribersError):
+        hub.subscribe("1")
+    hub.unsubscribe(first)
+    assert hub.subscribe("1") is not None
+
+    monkeypatch.setattr(app_module, "seat_events", hub)
+    rv = client.get("/api/seats/1/events")
+    assert rv.status_code == 503
+    assert rv.headers["Retry-After"] == "30"
+
+
+def test_subscribe_since_catches_up(storage):
+    """Test that a client gets the changes made since the version it loaded"""
+    hub = SeatEvents(storage.get_space, poll_interval=60)
+    storage.add_registration(make_registration("1", "1-1"))
+    storage.add_registration(make_registration("1", "1-2"))
+
+    subscription = hub.subscribe("1", since=1)
+    assert subscription.get(0)["id"] == "1-2"
+    assert subscription.get(0) is None
+
+    # Changes it already got aren't sent again
+    hub.publish("1")
+    assert subscription.get(0) is None
+
+
+def test_slow_subscriber_is_told_to_resync(storage):
+    """Test that a full queue is replaced by a resync event"""
+    hub = SeatEvents(storage.get_space, poll_interval=60, queue_size=2)
+    subscription = hub.subscribe("1")
+    for seat_id in ("1-1", "1-2", "1-3"):
+        storage.add_registration(make_registration("1", seat_id))
+        hub.publish("1")
+
+    assert subscription.get(0)["event"] == "resync"
+    assert subscription.get(0) is None
+
+
+def test_event_stream(client, storage, monkeypatch):
+    """Test that the endpoint streams a reservation committed after connecting"""
+    hub = SeatEvents(storage.get_space, poll_interval=0.05)
+    monkeypatch.setattr(app_module, "seat_events", hub)
+    assert client.get("/api/seats/99/events").status_code == 404
+    assert client.get("/api/seats/1/events?since=x").status_code == 400
+
+    rv = client.get("/api/seats/1/events?since=0", buffered=False)
+    assert rv.mimetype == "text/event-stream"
+    assert "no-cache" in rv.headers["Cache-Control"]
+    chunks = iter(rv.response)
+    assert next(chunks).startswith(b"retry:")
+
+    storage.add_registration(make_registration("1", "3-1"))
+    chunk = next(chunks).decode()
+    assert chunk.startswith("id: 1\n")
+    event, data = parse(chunk)
+    assert event == "seat"
+    assert data["id"] == "3-1" and data["reserved_by"] == "John Doe"
+
+    rv.close()
+    assert hub.subscriber_count() == 0
+
+    # A reconnecting client resumes after the last event it got
+    rv = client.get(
+        "/api/seats/1/events", headers={"Last-Event-ID": "0"}, buffered=False
+    )
+    chunks = iter(rv.response)
+    next(chunks)
+    assert parse(next(chunks).decode())[1]["id"] == "3-1"
+    rv.close()
@@ -0,0 +1,162 @@
+import random
+
+import pytest
+
+from seat_groups import find_groups, free_runs, summed_area_table
+from seats import SeatMap
+from tests.conftest import make_registration, make_space
+
+
+@pytest.fixture
+def storage(storage):
+    storage.add_space(make_space("First", rows=3, cols=3))
+    return storage
+
+
+def seat_map_from(*rows):
+    """A seat map drawn as rows of "." (free) and "x" (taken) seats."""
+    seat_map = SeatMap(len(rows), len(rows[0]))
+    for row, line in enumerate(rows, 1):
+        for col, seat in enumerate(line, 1):
+            if seat == "x":
+                seat_map.set(f"{row}-{col}", False)
+    return seat_map
+
+
+def test_free_runs_and_summed_area_table():
+    """Test the free spans of each row and the free seat counts of rectangles"""
+    runs = free_runs(seat_map_from("..x..", "xxxxx", "x...x"))
+    assert runs == [[(0, 2), (3, 2)], [], [(1, 3)]]
+
+    table = summed_area_table(runs, 5)
+    assert len(table) == 4 * 6
+    assert table[-1] == 7
+    # Rows 1-2 (0-based 0-1) and all columns: the four seats of the first row
+    assert table[2 * 6 + 5] == 4
+
+
+def test_same_row_first_tightest_run_first():
+    """Test that groups sit in one row, in the tightest fitting run first"""
+    seat_map = seat_map_from(
+        "......",
+        "...x..",
+        "x....x",
+    )
+    groups = find_groups(seat_map, 3)
+
+    assert [group["seats"] for group in groups[:3]] == [
+        ["2-1", "2-2", "2-3"],
+        ["3-2", "3-3", "3-4"],
+        ["1-1", "1-2", "1-3"],
+    ]
+    assert groups[0] == {
+        "shape": "row",
+        "rows": 1,
+        "cols": 3,
+        "seats": ["2-1", "2-2", "2-3"],
+    }
+
+
+def test_rectangles_when_no_row_fits():
+    """Test that a group too large for any row gets a compact block of seats"""
+    seat_map = seat_map_from(
+        "x...x.",
+        "x...xx",
+        "......",
+        "xx.xx.",
+    )
+    groups = find_groups(seat_map, 6, limit=3)
+
+    assert groups[0]["shape"] == "row"
+    assert groups[1] == {
+        "shape": "block",
+        "rows": 2,
+        "cols": 3,
+        "seats": ["1-2", "1-3", "1-4", "2-2", "2-3", "2-4"],
+    }
+    # The blocks offered don't share seats
+    assert len(groups) == 2
+
+    # Spare seats of a block are left at its end
+    groups = find_groups(seat_map, 5, limit=3)
+    assert groups[-1]["seats"] == ["1-2", "1-3", "1-4", "2-2", "2-3"]
+
+
+def test_no_free_block():
+    """Test that a group gets nothing when no adjacent seats are free"""
+    seat_map = seat_map_from(".x.", "x.x", ".x.")
+    assert find_groups(seat_map, 2) == []
+    # Two seats one behind the other are adjacent too
+    assert find_groups(seat_map_from("x.x", "x.x"), 2)[0]["seats"] == ["1-2", "2-2"]
+    assert [group["seats"] for group in find_groups(seat_map, 1, limit=10)] == [
+        ["1-1"],
+        ["1-3"],
+        ["2-2"],
+        ["3-1"],
+        ["3-3"],
+    ]
+    with pytest.raises(ValueError):
+        find_groups(seat_map, 0)
+
+
+def test_groups_on_a_large_floor():
+    """Test that every block found on a busy 100x100 floor is free and adjacent"""
+    rng = random.Random(21)
+    seat_map = SeatMap(100, 100)
+    for seat in rng.sample(range(10000), 5000):
+        seat_map.set(f"{seat // 100 + 1}-{seat % 100 + 1}", False)
+
+    for size in (4, 8, 12):
+        groups = find_groups(seat_map, size, limit=20)
+        assert groups
+        seen = set()
+        for group in groups:
+            assert len(group["seats"]) == size
+            assert all(seat_map.is_available(seat) for seat in group["seats"])
+            cells = [tuple(map(int, seat.split("-"))) for seat in group["seats"]]
+            rows = {row for row, _ in cells}
+            cols = {col for _, col in cells}
+            assert len(rows) == group["rows"]
+            assert max(rows) - min(rows) + 1 == group["rows"]
+            assert max(cols) - min(cols) + 1 <= group["cols"]
+            assert seen.isdisjoint(cells)
+            seen.update(cells)
+
+
+def test_groups_api(client, storage):
+    """Test the seat group search endpoint, its errors and its ETag"""
+    storage.add_registration(make_registration("1", "1-2"))
+
+    rv = client.get("/api/seats/1/groups?size=3")
+    assert rv.status_code == 200
+    assert rv.json["size"] == 3
+    assert rv.json["version"] == 1
+    assert [group["seats"] for group in rv.json["groups"]] == [
+        ["2-1", "2-2", "2-3"],
+        ["3-1", "3-2", "3-3"],
+    ]
+
+    rv = client.get("/api/seats/1/groups?size=3&limit=1")
+    assert len(rv.json["groups"]) == 1
+    etag = rv.headers["ETag"]
+    rv = client.get(
+        "/api/seats/1/groups?size=3&limit=1", headers={"If-None-Match": etag}
+    )
+    assert rv.status_code == 304
+
+    assert client.get("/api/seats/9/groups?size=3").status_code == 404
+    for query in ("", "?size=0", "?size=x", "?size=51"):
+        rv = client.get(f"/api/seats/1/groups{query}")
+        assert rv.status_code == 400
+        assert "size" in rv.json["error"]
+
+
+def test_registration_form_preselects(client, storage):
+    """Test that the registration form pre-selects the space, seat and group"""
+    rv = client.get("/registration_form?space=1&seat=2-3&group_size=4")
+    page = rv.data.decode()
+
+    assert '<option value="1" selected>' in page
+    assert '"2-3"' in page
+    assert 'id="groupSize" min="2" max="50" placeholder="people" value="4"' in page
+    assert '<option value="1">' in client.get("/registration_form").data.decode()
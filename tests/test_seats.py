@@ -0,0 +1,168 @@
+import json
+import sqlite3
+
+import pytest
+
+import app as app_module
+from seats import SeatMap, compact_space
+from sqlite_storage import SqliteStorage
+from storage import JsonStorage, new_space
+
+
+def test_seat_map_availability():
+    """Test reserving seats and checking them, including unknown ids"""
+    seat_map = SeatMap(3, 5)
+    assert len(seat_map) == 15
+    assert seat_map.available_count() == 15
+    assert seat_map.is_available("3-5")
+    for seat_id in ("0-1", "4-1", "1-6", "x", "1-1-1", ""):
+        assert not seat_map.is_available(seat_id)
+
+    reserved = seat_map.reserved("2-3", "Jane Doe")
+    assert not reserved.is_available("2-3")
+    assert seat_map.is_available("2-3")  # the original is unchanged
+    assert list(reserved.unavailable()) == [("2-3", "Jane Doe")]
+
+    reserved.set("2-3", True)
+    assert reserved == seat_map
+    with pytest.raises(KeyError):
+        seat_map.set("9-9", False)
+
+
+def test_seat_map_adapters():
+    """Test the old seat_layout/seats shape produced for the API and templates"""
+    seat_map = SeatMap(2, 2).reserved("1-2", "John Doe")
+    assert seat_map.layout() == [["1-1", "1-2"], ["2-1", "2-2"]]
+    assert seat_map.seats()["1-2"] == {
+        "id": "1-2",
+        "row": 1,
+        "col": 2,
+        "available": False,
+        "reserved_by": "John Doe",
+    }
+    assert seat_map.seat("2-1")["available"] is True
+
+
+def test_seat_map_json_round_trip():
+    """Test that a seat map survives serialization"""
+    seat_map = SeatMap(7, 9).reserved("7-9", "Last Seat")
+    data = json.loads(json.dumps(seat_map.to_json()))
+    assert SeatMap.from_json(data) == seat_map
+    assert not SeatMap.from_json(data).is_available("7-9")
+
+
+def test_legacy_space_is_converted():
+    """Test converting a space with a dict per seat"""
+    space = {
+        "name": "Old",
+        "seat_layout": [["1-1", "1-2"], ["2-1", "2-2"]],
+        "seats": {
+            seat_id: {
+                "id": seat_id,
+                "row": int(seat_id[0]),
+                "col": int(seat_id[2]),
+                "available": seat_id != "2-1",
+                "reserved_by": "Old Holder" if seat_id == "2-1" else None,
+            }
+            for seat_id in ("1-1", "1-2", "2-1", "2-2")
+        },
+    }
+    compact = compact_space(space)
+    assert set(compact) == {"name", "seat_map"}
+    assert list(compact["seat_map"].unavailable()) == [("2-1", "Old Holder")]
+    assert compact_space({"name": "No seats"}) == {"name": "No seats"}
+
+
+def test_data_file_is_compact(tmp_path):
+    """Test that a 100x100 floor is stored in a few kilobytes"""
+    storage = JsonStorage(tmp_path / "data.json")
+    storage.init()
+    storage.add_space(new_space("Big", "Here", 10000, 100, 100))
+    assert (tmp_path / "data.json").stat().st_size < 20000
+
+    with open(tmp_path / "data.json") as f:
+        stored = json.load(f)["coworking_spaces"]["1"]["seat_map"]
+    assert (stored["rows"], stored["cols"], stored["holders"]) == (100, 100, {})
+
+
+def test_legacy_data_file_is_read(tmp_path, monkeypatch):
+    """Test that a data file with a dict per seat still works end to end"""
+    seats = {
+        "1-1": {"id": "1-1", "row": 1, "col": 1, "available": False,
+                "reserved_by": "Old Holder"},
+        "1-2": {"id": "1-2", "row": 1, "col": 2, "available": True,
+                "reserved_by": None},
+    }  # fmt: skip
+    space = {
+        "name": "Legacy",
+        "location": "Here",
+        "capacity": 2,
+        "current_occupancy": 1,
+        "equipment": [],
+        "seat_layout": [["1-1", "1-2"]],
+        "seats": seats,
+    }
+    with open(tmp_path / "data.json", "w") as f:
+        json.dump(
+            {
+                "coworking_spaces": {"1": space},
+                "meeting_rooms": {},
+                "admins": {"admin": "password"},
+                "registrations": [],
+            },
+            f,
+        )
+    monkeypatch.setattr(app_module, "storage", JsonStorage(tmp_path / "data.json"))
+
+    with app_module.app.test_client() as client:
+        client.post("/login", data=dict(username="admin", password="password"))
+        data = client.get("/api/seats/1").get_json()
+        assert data["seat_layout"] == [["1-1", "1-2"]]
+        assert data["seats"]["1-1"]["reserved_by"] == "Old Holder"
+        assert data["seats"]["1-2"]["available"] is True
+        rv = client.get("/space/1")
+        assert b'data-seat-id="1-2"' in rv.data
+        assert b"seat-occupied" in rv.data
+
+
+def test_sqlite_stores_only_taken_seats(tmp_path):
+    """Test that SQLite keeps the grid size and a row per taken seat only"""
+    storage = SqliteStorage(tmp_path / "data.sqlite3")
+    storage.init()
+    storage.add_space(new_space("Big", "Here", 10000, 100, 100))
+    storage.modify_space(
+        "1", lambda space: space.update(seat_map=space["seat_map"].reserved("5-5", "X"))
+    )
+    rows = storage._conn.execute("SELECT seat_id, reserved_by FROM seats").fetchall()
+    assert [tuple(row) for row in rows] == [("5-5", "X")]
+    seat_map = storage.get_space("1")["seat_map"]
+    assert (seat_map.rows, seat_map.cols) == (100, 100)
+    assert not seat_map.is_available("5-5")
+
+
+def test_sqlite_per_seat_database_is_migrated(tmp_path):
+    """Test that a database with a row for every seat is migrated on connect"""
+    path = tmp_path / "data.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE coworking_spaces (id TEXT PRIMARY KEY, name TEXT NOT NULL,
+            location TEXT NOT NULL, capacity INTEGER NOT NULL,
+            current_occupancy INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE seats (space_id TEXT NOT NULL, seat_id TEXT NOT NULL,
+            row INTEGER NOT NULL, col INTEGER NOT NULL,
+            available INTEGER NOT NULL DEFAULT 1, reserved_by TEXT,
+            PRIMARY KEY (space_id, seat_id));
+        INSERT INTO coworking_spaces VALUES ('1', 'Old', 'Here', 6, 1);
+        INSERT INTO seats VALUES ('1', '1-1', 1, 1, 1, NULL),
+            ('1', '1-2', 1, 2, 1, NULL), ('1', '1-3', 1, 3, 1, NULL),
+            ('1', '2-1', 2, 1, 1, NULL), ('1', '2-2', 2, 2, 0, 'Jane Doe'),
+            ('1', '2-3', 2, 3, 1, NULL);
+    """)  # fmt: skip
+    conn.commit()
+    conn.close()
+
+    storage = SqliteStorage(path)
+    seat_map = storage.get_space("1")["seat_map"]
+    assert (seat_map.rows, seat_map.cols) == (2, 3)
+    assert list(seat_map.unavailable()) == [("2-2", "Jane Doe")]
+    assert storage._conn.execute("SELECT COUNT(*) FROM seats").fetchone()[0] == 1
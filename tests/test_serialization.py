@@ -0,0 +1,78 @@
+import pytest
+
+import app as app_module
+import benchmark
+import serialization
+from journal_storage import JournalStorage
+from storage import JsonStorage
+from tests.conftest import make_registration, make_space
+
+
+def dataset():
+    return benchmark.generate_dataset(spaces=3, rows=4, cols=5, registrations=50)
+
+
+@pytest.mark.parametrize("fmt", serialization.FORMATS)
+def test_round_trip(tmp_path, fmt):
+    """Test that every format reads back the same dataset"""
+    storage = JsonStorage(tmp_path / "data.json", data_format=fmt)
+    storage.save(dataset())
+    storage.add_registration(make_registration("1", "4-5"))
+
+    reread = JsonStorage(tmp_path / "data.json").load()
+    assert reread == storage.load()
+    assert reread["coworking_spaces"]["1"]["seat_map"].holders["4-5"] == "John Doe"
+    assert serialization.detect((tmp_path / "data.json").read_bytes()) == (
+        "binary" if fmt == "binary" else "json"
+    )
+
+
+def test_formats_are_smaller():
+    """Test that compact JSON and the binary snapshot are smaller than indented JSON"""
+    data = dataset()
+    sizes = [len(serialization.dumps(data, fmt)) for fmt in serialization.FORMATS]
+    json_size, pretty_size, binary_size = sizes
+    assert binary_size < json_size < pretty_size
+
+
+def test_bad_binary_files_are_rejected():
+    """Test the version header and truncation checks"""
+    raw = serialization.dumps(dataset(), "binary")
+    with pytest.raises(ValueError, match="version"):
+        serialization.loads(serialization.MAGIC + b"\x02" + raw[8:])
+    with pytest.raises(ValueError, match="Truncated"):
+        serialization.loads(raw[:-10])
+    with pytest.raises(ValueError):
+        serialization.dumps({}, "yaml")
+
+
+def test_journal_snapshot_format(tmp_path):
+    """Test a journaled storage with a binary snapshot"""
+    storage = JournalStorage(
+        tmp_path / "data.json", tmp_path / "data.journal", data_format="binary"
+    )
+    storage.init()
+    storage.add_space(make_space("First"))
+    storage.add_registration(make_registration("1", "1-1"))
+    storage.compact()
+
+    assert (tmp_path / "data.json").read_bytes().startswith(serialization.MAGIC)
+    reread = JournalStorage(tmp_path / "data.json", tmp_path / "data.journal")
+    assert len(reread.list_registrations()) == 1
+
+
+def test_convert_command(tmp_path):
+    """Test converting a data file between formats"""
+    path = tmp_path / "data.json"
+    JsonStorage(path, data_format="pretty-json").save(dataset())
+    expected = JsonStorage(path).load()
+    runner = app_module.app.test_cli_runner()
+
+    result = runner.invoke(args=["convert-data", str(path), "--format", "binary"])
+    assert "from json to binary" in result.output
+    assert path.read_bytes().startswith(serialization.MAGIC)
+
+    runner.invoke(args=["convert-data", str(path), "--format", "json"])
+    converted = JsonStorage(path).load()
+    del converted["revision"], expected["revision"]
+    assert converted == expected
@@ -0,0 +1,121 @@
+import http.client
+import os
+import runpy
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+import app as app_module
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+CONFIG = os.path.join(ROOT, "gunicorn.conf.py")
+
+
+def test_healthz_needs_no_login(storage):
+    """Test that the health check answers without a session"""
+    with app_module.app.test_client() as client:
+        rv = client.get("/healthz")
+    assert rv.status_code == 200
+    assert rv.get_json() == {"status": "ok"}
+
+
+def test_healthz_reports_broken_storage(monkeypatch):
+    """Test that the health check fails when storage can't be read"""
+
+    class BrokenStorage:
+        def revision(self):
+            raise OSError("disk gone")
+
+    monkeypatch.setattr(app_module, "storage", BrokenStorage())
+    with app_module.app.test_client() as client:
+        rv = client.get("/healthz")
+    assert rv.status_code == 503
+    assert rv.get_json() == {"status": "unavailable"}
+
+
+def test_gunicorn_settings_from_environment(monkeypatch):
+    """Test the worker and thread counts of the gunicorn config"""
+    monkeypatch.setenv("GUNICORN_WORKERS", "3")
+    monkeypatch.setenv("GUNICORN_THREADS", "16")
+    settings = runpy.run_path(CONFIG)
+    assert (settings["workers"], settings["threads"]) == (3, 16)
+    assert settings["worker_class"] == "gevent"
+    assert settings["worker_connections"] == 1000
+    assert settings["preload_app"] is False
+    monkeypatch.setenv("GUNICORN_WORKER_CLASS", "gthread")
+    assert runpy.run_path(CONFIG)["worker_class"] == "gthread"
+
+
+def test_gunicorn_rejects_write_behind_with_several_workers(monkeypatch):
+    """Test that write-behind saves can't be combined with several workers"""
+    monkeypatch.setenv("SAVE_FLUSH_INTERVAL", "1")
+    monkeypatch.setenv("GUNICORN_WORKERS", "2")
+    with pytest.raises(RuntimeError, match="GUNICORN_WORKERS=1"):
+        runpy.run_path(CONFIG)
+    monkeypatch.setenv("GUNICORN_WORKERS", "1")
+    assert runpy.run_path(CONFIG)["workers"] == 1
+
+
+def request(port, method, path, body=None, cookie=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    if cookie:
+        headers["Cookie"] = cookie
+    connection.request(method, path, body and urlencode(body), headers)
+    return connection.getresponse()
+
+
+def test_event_streams_leave_workers_responsive(tmp_path):
+    """Test that more open event streams than threads don't hold up a worker"""
+    pytest.importorskip("gevent")
+    pytest.importorskip("gunicorn")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(
+        os.environ,
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        GUNICORN_WORKERS="1",
+        GUNICORN_THREADS="2",
+        GUNICORN_GRACEFUL_TIMEOUT="1",
+        DATA_DIRECTORY=str(tmp_path),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", CONFIG, "app:app"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    streams = []
+    try:
+        for _ in range(100):
+            try:
+                request(port, "GET", "/healthz").read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        rv = request(
+            port, "POST", "/login", dict(username="admin", password="password")
+        )
+        cookie = rv.getheader("Set-Cookie").split(";")[0]
+        request(
+            port, "POST", "/add_space", dict(name="A", location="B", capacity=4), cookie
+        ).read()
+
+        for _ in range(10):
+            rv = request(port, "GET", "/api/seats/1/events", cookie=cookie)
+            assert rv.status == 200
+            assert rv.readline().startswith(b"retry:")
+            streams.append(rv)
+        rv = request(port, "GET", "/healthz")
+        assert rv.status == 200
+    finally:
+        for rv in streams:
+            rv.close()
+        server.terminate()
+        server.wait()
@@ -0,0 +1,126 @@
+import os
+
+import pytest
+
+import app as app_module
+from sharded_storage import ShardedStorage
+from storage import JsonStorage
+from tests.conftest import make_meeting_room, make_registration, make_space
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return tmp_path / "shards"
+
+
+@pytest.fixture
+def storage(directory):
+    storage = ShardedStorage(directory, segment_size=2)
+    storage.init()
+    storage.add_space(make_space("First"))
+    storage.add_space(make_space("Second"))
+    for name in ("Board", "Huddle"):
+        storage.add_meeting_room(make_meeting_room(name))
+    return storage
+
+
+def shard_files(directory):
+    return {
+        kind: sorted(os.listdir(directory / kind))
+        for kind in ("coworking_spaces", "meeting_rooms", "registrations")
+    }
+
+
+def test_changes_rewrite_only_touched_shards(storage, directory):
+    """Test that editing a meeting room leaves every other shard alone"""
+    before = shard_files(directory)
+    storage.update_meeting_room("1", name="Boardroom")
+    after = shard_files(directory)
+
+    assert after["coworking_spaces"] == before["coworking_spaces"]
+    assert after["meeting_rooms"][1] == before["meeting_rooms"][1]
+    assert after["meeting_rooms"][0] != before["meeting_rooms"][0]
+    assert storage.get_meeting_room("1")["name"] == "Boardroom"
+
+    storage.add_equipment("2", {"name": "Lamp", "quantity": 1})
+    changed = shard_files(directory)["coworking_spaces"]
+    assert changed[0] == before["coworking_spaces"][0]
+    assert changed[1] != before["coworking_spaces"][1]
+
+
+def test_registrations_are_segmented(storage, directory):
+    """Test that a registration rewrites only the last segment"""
+    for seat in ("1-1", "1-2", "2-1"):
+        storage.add_registration(make_registration("1", seat))
+    segments = shard_files(directory)["registrations"]
+    assert len(segments) == 2
+
+    storage.add_registration(make_registration("mr_2", is_meeting_room=True))
+    assert shard_files(directory)["registrations"][0] == segments[0]
+    assert [reg["id"] for reg in storage.list_registrations()] == [1, 2, 3, 4]
+    assert storage.get_meeting_room("2")["current_occupancy"] == 1
+    assert [reg["id"] for reg in storage.find_registrations(space_id="1")] == [1, 2, 3]
+
+
+def test_listing_pages_read_only_the_index(storage, directory, monkeypatch):
+    """Test that the spaces and meeting rooms pages don't read any shard"""
+    reads = []
+    restarted = ShardedStorage(directory)
+    restarted.observer = lambda operation, seconds, size: reads.append(operation)
+    monkeypatch.setattr(app_module, "storage", restarted)
+
+    with app_module.app.test_client() as client:
+        client.post("/login", data=dict(username="admin", password="password"))
+        assert b"Second" in client.get("/spaces").data
+        assert b"Huddle" in client.get("/meeting_rooms").data
+
+    assert reads == ["load"]
+    assert "seat_map" not in restarted.list_spaces()["1"]
+    assert restarted.get_space("1")["seat_map"].rows == 2
+
+
+def test_changes_by_other_processes(storage, directory):
+    """Test that another instance sees changes and replaced shards are removed"""
+    other = ShardedStorage(directory)
+    assert other.get_space("1")["current_occupancy"] == 0
+
+    storage.add_registration(make_registration("1", "2-2"))
+    storage.delete_space("2")
+
+    space = other.get_space("1")
+    assert not space["seat_map"].is_available("2-2")
+    assert list(other.list_spaces()) == ["1"]
+    assert len(other.list_registrations()) == 1
+    assert len(shard_files(directory)["coworking_spaces"]) == 1
+    assert other.revision() == storage.revision()
+
+
+def test_save_rewrites_changed_shards(storage, directory):
+    """Test that saving the whole dataset writes only what differs"""
+    before = shard_files(directory)
+    data = storage.load()
+    data["coworking_spaces"]["1"]["name"] = "Renamed"
+    storage.save(data)
+
+    after = shard_files(directory)
+    assert after["coworking_spaces"][1] == before["coworking_spaces"][1]
+    assert after["meeting_rooms"] == before["meeting_rooms"]
+    assert ShardedStorage(directory).load() == data
+
+
+def test_migrate_cli(tmp_path, directory):
+    """Test the migrate-to-shards command"""
+    json_storage = JsonStorage(tmp_path / "data.json")
+    json_storage.init()
+    json_storage.add_space(make_space())
+    json_storage.add_registration(make_registration("1", "1-1"))
+
+    runner = app_module.app.test_cli_runner()
+    result = runner.invoke(
+        args=["migrate-to-shards", str(tmp_path / "data.json"), str(directory)]
+    )
+
+    assert "Migrated 1 spaces" in result.output
+    expected = json_storage.load()
+    del expected["revision"]
+    assert ShardedStorage(directory).load() == expected
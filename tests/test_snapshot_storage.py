@@ -0,0 +1,95 @@
+import pytest
+
+import app as app_module
+from snapshot_storage import MAGIC, Snapshot, SnapshotStorage
+from storage import JsonStorage
+from tests.conftest import make_meeting_room, make_registration, make_space
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "data.snapshot"
+
+
+@pytest.fixture
+def storage(path):
+    storage = SnapshotStorage(path)
+    storage.init()
+    storage.add_space(make_space("First"))
+    storage.add_space(make_space("Second"))
+    storage.add_meeting_room(make_meeting_room())
+    return storage
+
+
+def test_unchanged_records_are_copied(storage, path):
+    """Test that a commit copies the encoded records it doesn't change"""
+    before = Snapshot(path)
+    storage.update_space("1", name="Renamed")
+    after = Snapshot(path)
+
+    assert bytes(after.blob("coworking_spaces", "2")) == bytes(
+        before.blob("coworking_spaces", "2")
+    )
+    assert after.record("coworking_spaces", "1")["name"] == "Renamed"
+    assert after.summaries["coworking_spaces"]["1"]["name"] == "Renamed"
+    assert "seat_map" not in after.summaries["coworking_spaces"]["2"]
+    # The old mapping stays readable after the file was replaced
+    assert before.record("coworking_spaces", "1")["name"] == "First"
+
+
+def test_other_workers_swap_to_new_snapshots(storage, path):
+    """Test that another instance maps each newly committed snapshot"""
+    other = SnapshotStorage(path)
+    assert other.get_space("1")["current_occupancy"] == 0
+
+    storage.add_registration(make_registration("1", "2-1"))
+    storage.add_registration(make_registration("mr_1", is_meeting_room=True))
+
+    assert not other.get_space("1")["seat_map"].is_available("2-1")
+    assert other.get_meeting_room("1")["current_occupancy"] == 1
+    assert [reg["id"] for reg in other.list_registrations()] == [1, 2]
+    assert other.revision() == storage.revision()
+
+
+def test_registration_index_catches_up(storage):
+    """Test that appended registrations extend the index instead of rebuilding it"""
+    storage.add_registration(make_registration("1", "1-1"))
+    index = storage._index()
+    storage.add_registration(make_registration("2", "1-1"))
+
+    assert storage._index() is index
+    assert [reg["id"] for reg in storage.find_registrations(space_id="2")] == [2]
+
+    data = storage.load()
+    del data["registrations"][0]
+    storage.save(data)
+    assert storage._index() is not index
+    assert storage.find_registrations(space_id="1") == []
+
+
+def test_rejects_other_files(tmp_path, path):
+    """Test that files that aren't snapshots of this version are refused"""
+    (tmp_path / "data.json").write_text("{}")
+    with pytest.raises(ValueError, match="Not a snapshot"):
+        Snapshot(tmp_path / "data.json")
+    path.write_bytes(MAGIC + b"\x09" + bytes(20))
+    with pytest.raises(ValueError, match="version"):
+        Snapshot(path)
+
+
+def test_migrate_cli(tmp_path, path):
+    """Test the migrate-to-snapshot command"""
+    json_storage = JsonStorage(tmp_path / "data.json")
+    json_storage.init()
+    json_storage.add_space(make_space())
+    json_storage.add_registration(make_registration("1", "1-1"))
+
+    runner = app_module.app.test_cli_runner()
+    result = runner.invoke(
+        args=["migrate-to-snapshot", str(tmp_path / "data.json"), str(path)]
+    )
+
+    assert "Migrated 1 spaces" in result.output
+    expected = json_storage.load()
+    del expected["revision"]
+    assert SnapshotStorage(path).load() == expected
@@ -0,0 +1,239 @@
+import sqlite3
+import threading
+
+import pytest
+
+import app as app_module
+from sqlite_storage import SqliteStorage, migrate_json
+from storage import JsonStorage, SeatUnavailableError
+from tests.conftest import make_registration, make_space
+
+
+@pytest.fixture(params=["json", "sqlite", "sharded", "snapshot"])
+def backend(request):
+    return request.param
+
+
+def test_default_admin(storage):
+    """Test that the backends start with the default admin"""
+    assert storage.admin_password("admin") == "password"
+    assert storage.admin_password("nobody") is None
+
+
+def test_space_round_trip(storage):
+    """Test that a stored space comes back with its seat map"""
+    space = make_space()
+    space_id = storage.add_space(space)
+
+    assert space_id == "1"
+    stored = storage.get_space(space_id)
+    assert stored == {**space, "version": 0, "uuid": stored["uuid"]}
+    assert storage.get_space(storage.add_space(space))["uuid"] != stored["uuid"]
+    assert storage.list_spaces()[space_id]["name"] == "Test Space"
+    assert storage.get_space("999") is None
+
+
+def test_update_and_delete_space(storage):
+    """Test updating and deleting a space"""
+    space_id = storage.add_space(make_space())
+    assert storage.update_space(space_id, name="Renamed", current_occupancy=3)
+    assert storage.add_equipment(space_id, {"name": "Projector", "quantity": 2})
+
+    space = storage.get_space(space_id)
+    assert space["name"] == "Renamed"
+    assert space["current_occupancy"] == 3
+    assert space["equipment"] == [{"name": "Projector", "quantity": 2}]
+
+    assert storage.delete_space(space_id)
+    assert storage.get_space(space_id) is None
+    assert not storage.delete_space(space_id)
+    assert not storage.update_space(space_id, name="Gone")
+    assert not storage.add_equipment(space_id, {"name": "Desk", "quantity": 1})
+
+
+def test_meeting_rooms(storage):
+    """Test adding, updating and counting meeting rooms"""
+    room_id = storage.add_meeting_room(
+        {"name": "Room", "location": "Floor 1", "capacity": 8, "current_occupancy": 0}
+    )
+    assert storage.update_meeting_room(room_id, capacity=10)
+    assert storage.get_meeting_room(room_id)["capacity"] == 10
+    assert storage.count_meeting_rooms() == 1
+    assert storage.get_meeting_room("999") is None
+
+
+def test_add_registration_reserves_seat(storage):
+    """Test that a registration reserves its seat and bumps occupancy"""
+    space_id = storage.add_space(make_space())
+    registration_id = storage.add_registration(make_registration(space_id, "1-2"))
+
+    assert registration_id == 1
+    space = storage.get_space(space_id)
+    assert space["current_occupancy"] == 1
+    assert space["seat_map"].is_available("1-2") is False
+    assert space["seat_map"].holders == {"1-2": "John Doe"}
+    registrations = storage.space_registrations(space_id)
+    assert [reg["id"] for reg in registrations] == [1]
+    assert registrations[0]["selected_seat"] == "1-2"
+
+
+def test_add_registration_rejects_taken_seat(storage):
+    """Test that a taken or unknown seat is rejected without side effects"""
+    space_id = storage.add_space(make_space())
+    storage.add_registration(make_registration(space_id, "1-1"))
+
+    with pytest.raises(SeatUnavailableError):
+        storage.add_registration(make_registration(space_id, "1-1"))
+    with pytest.raises(SeatUnavailableError):
+        storage.add_registration(make_registration(space_id, "9-9"))
+
+    assert len(storage.list_registrations()) == 1
+    assert storage.get_space(space_id)["current_occupancy"] == 1
+
+
+def test_meeting_room_registration(storage):
+    """Test that a meeting room registration bumps the room occupancy"""
+    room_id = storage.add_meeting_room(
+        {"name": "Room", "location": "Floor 1", "capacity": 8, "current_occupancy": 0}
+    )
+    storage.add_registration(make_registration(f"mr_{room_id}", is_meeting_room=True))
+    assert storage.get_meeting_room(room_id)["current_occupancy"] == 1
+    assert storage.list_registrations()[0]["is_meeting_room"] is True
+    assert "selected_seat" not in storage.list_registrations()[0]
+
+
+def test_sqlite_indexes(tmp_path):
+    """Test that the lookup indexes exist in the SQLite schema"""
+    storage = SqliteStorage(tmp_path / "data.sqlite3")
+    storage.init()
+    indexes = {
+        row["name"]: row["sql"]
+        for row in storage._conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index'"
+        )
+    }
+    assert "registrations (space_id)" in indexes["registrations_space"]
+    assert "registrations (email)" in indexes["registrations_email"]
+    assert "seats (space_id, available)" in indexes["seats_space_available"]
+
+
+def test_threads_share_pooled_connections(tmp_path, monkeypatch):
+    """Test that threads reuse the connections of ended ones and the schema once"""
+    storage = SqliteStorage(tmp_path / "data.sqlite3")
+    connects, schemas = [], []
+    connect, create_schema = storage._connect, storage._create_schema
+    monkeypatch.setattr(storage, "_connect", lambda: connects.append(1) or connect())
+    monkeypatch.setattr(
+        storage, "_create_schema", lambda conn: schemas.append(1) or create_schema(conn)
+    )
+
+    for _ in range(10):
+        thread = threading.Thread(target=storage.list_spaces)
+        thread.start()
+        thread.join()
+    assert (len(connects), len(schemas)) == (1, 1)
+
+    # Threads running at the same time each need a connection of their own
+    barrier = threading.Barrier(3)
+
+    def read_together():
+        storage.list_spaces()
+        barrier.wait()
+
+    threads = [threading.Thread(target=read_together) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert (len(connects), len(schemas)) == (3, 1)
+
+
+def test_write_waits_for_other_writers(tmp_path):
+    """Test that a write waits for another process's transaction to commit"""
+    storage = SqliteStorage(tmp_path / "data.sqlite3")
+    storage.init()
+    other = sqlite3.connect(tmp_path / "data.sqlite3", isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    writer = threading.Thread(target=storage.add_space, args=(make_space(),))
+    writer.start()
+    writer.join(0.2)
+    assert writer.is_alive()
+
+    other.execute("COMMIT")
+    writer.join()
+    assert list(storage.list_spaces()) == ["1"]
+
+
+def test_migrate_json(tmp_path):
+    """Test that migrating a JSON data file preserves the whole dataset"""
+    json_storage = JsonStorage(tmp_path / "data.json")
+    json_storage.init()
+    space_id = json_storage.add_space(make_space())
+    json_storage.add_equipment(space_id, {"name": "Projector", "quantity": 2})
+    json_storage.add_meeting_room(
+        {"name": "Room", "location": "Floor 1", "capacity": 8, "current_occupancy": 0}
+    )
+    json_storage.add_registration(make_registration(space_id, "2-1"))
+
+    migrate_json(tmp_path / "data.json", tmp_path / "data.sqlite3")
+
+    expected = JsonStorage(tmp_path / "data.json").load()
+    del expected["revision"]  # the JSON backend's commit counter
+    assert SqliteStorage(tmp_path / "data.sqlite3").load() == expected
+
+
+def test_migrate_cli(tmp_path):
+    """Test the migrate-to-sqlite command"""
+    json_storage = JsonStorage(tmp_path / "data.json")
+    json_storage.init()
+    json_storage.add_space(make_space())
+
+    runner = app_module.app.test_cli_runner()
+    result = runner.invoke(
+        args=[
+            "migrate-to-sqlite",
+            str(tmp_path / "data.json"),
+            str(tmp_path / "data.sqlite3"),
+        ]
+    )
+
+    assert "Migrated 1 spaces" in result.output
+    assert SqliteStorage(tmp_path / "data.sqlite3").get_space("1") is not None
+
+
+def test_routes_with_sqlite_backend(tmp_path, monkeypatch):
+    """Test the main registration flow through the SQLite backend"""
+    storage = SqliteStorage(tmp_path / "data.sqlite3")
+    storage.init()
+    monkeypatch.setattr(app_module, "storage", storage)
+
+    with app_module.app.test_client() as client:
+        client.post("/login", data=dict(username="admin", password="password"))
+        client.post(
+            "/add_space",
+            data=dict(name="SQLite Space", location="Here", capacity=4, rows=2, cols=2),
+        )
+        rv = client.post(
+            "/submit_registration",
+            data=dict(
+                firstName="John",
+                lastName="Doe",
+                email="john.doe@example.com",
+                phone="123",
+                company="Test",
+                space="1",
+                membershipType="monthly",
+                startDate="2025-10-01",
+                additionalInfo="",
+                selectedSeat="1-1",
+            ),
+            follow_redirects=True,
+        )
+        assert b"Registration submitted successfully" in rv.data
+
+        rv = client.get("/space/1")
+        assert b"SQLite Space" in rv.data
+        assert b"john.doe@example.com" in rv.data
+
+        rv = client.get("/api/seats/1")
+        assert rv.get_json()["seats"]["1-1"]["available"] is False
@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+import app as app_module
+from stats import DashboardStats, StatsCache
+from tests.conftest import make_meeting_room, make_registration, make_space
+
+
+@pytest.fixture(params=["json", "journal", "sqlite"])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def storage(storage, backend):
+    storage.add_space(make_space("First", rows=2, cols=5))
+    storage.add_meeting_room(make_meeting_room())
+    return storage
+
+
+def test_revision_counts_commits(storage):
+    """Test that every commit bumps the storage revision by one"""
+    revision = storage.revision()
+    storage.add_registration(make_registration("1", "1-1"))
+    assert storage.revision() == revision + 1
+    storage.update_meeting_room("1", name="Boardroom")
+    storage.add_registration(make_registration("mr_1", is_meeting_room=True))
+    assert storage.revision() == revision + 3
+
+
+def test_stats_follow_routes(client, storage):
+    """Test that the dashboard stats are updated by the routes, not rebuilt"""
+    cache = app_module.dashboard_stats
+    stats = cache.get()
+    assert stats.to_json()["spaces"]["capacity"] == 10
+
+    client.post("/add_space", data=dict(name="Second", location="B", capacity=4))
+    client.post(
+        "/submit_registration",
+        data=dict(
+            firstName="Jane",
+            lastName="Doe",
+            email="jane@example.com",
+            phone="1",
+            company="",
+            space="1",
+            membershipType="daily",
+            startDate="2025-10-01",
+            additionalInfo="",
+            selectedSeat="1-2",
+        ),
+    )
+    client.post("/update_occupancy/2", data=dict(occupancy=3))
+    client.post(
+        "/edit_meeting_room/1", data=dict(name="Board", location="Top", capacity=10)
+    )
+    assert cache.get() is stats
+
+    data = client.get("/api/stats").get_json()
+    assert data == DashboardStats.build(storage).to_json()
+    assert data["spaces"]["count"] == 2
+    assert (data["spaces"]["capacity"], data["spaces"]["occupancy"]) == (14, 4)
+    assert data["spaces"]["by_id"]["1"]["utilization"] == 10.0
+    assert data["meeting_rooms"] == {
+        "count": 1,
+        "capacity": 10,
+        "occupancy": 0,
+        "utilization": 0.0,
+    }
+    assert data["registrations"] == {"count": 1, "by_membership_type": {"daily": 1}}
+    assert client.get("/api/meeting_rooms_count").get_json() == {"count": 1}
+
+    client.get("/delete_space/2")
+    assert cache.get() is stats
+    assert stats.to_json()["spaces"]["count"] == 1
+
+
+def test_changes_elsewhere_rebuild_stats(storage):
+    """Test that stats are rebuilt after a commit they weren't told about"""
+    cache = StatsCache(lambda: storage)
+    stats = cache.get()
+
+    storage.add_registration(make_registration("1", "2-2"))
+    storage.add_registration(make_registration("1", "2-3"))
+    cache.changed(lambda stats: pytest.fail("applied over a missed commit"))
+    rebuilt = cache.get()
+    assert rebuilt is not stats
+    assert rebuilt.registrations == 2
+    assert rebuilt.space_occupancy == 2
+
+
+def test_updates_wait_for_readers(storage):
+    """Test that a route's update isn't applied while the stats are being read"""
+    cache = StatsCache(lambda: storage)
+    updater = threading.Thread(
+        target=cache.changed, args=(lambda stats: stats.add_registration({}),)
+    )
+
+    def read(stats):
+        storage.add_registration(make_registration("1", "2-2"))
+        updater.start()
+        updater.join(0.1)
+        assert updater.is_alive()
+        return stats.to_json()
+
+    assert cache.read(read)["registrations"]["count"] == 0
+    updater.join()
+    assert cache.get().registrations == 1
+
+
+def test_dashboard_totals(client, storage):
+    """Test that the dashboard shows the totals over all spaces"""
+    storage.add_space(make_space("Second", rows=2, cols=5))
+    storage.update_space("1", current_occupancy=5)
+    storage.update_space("2", current_occupancy=2)
+    rv = client.get("/")
+    assert b"Total Coworking Spaces: 2" in rv.data
+    assert b"Total Meeting Rooms: 1" in rv.data
+    assert b"35.0%" in rv.data
@@ -0,0 +1,138 @@
+import json
+import os
+import stat
+
+import pytest
+
+from storage import UMASK, JsonStorage, ReadOnlyDict, ReadOnlyList
+
+
+def test_init_creates_default_data(storage):
+    """Test that a fresh storage is initialized with the default dataset"""
+    data = storage.load()
+    assert data["coworking_spaces"] == {}
+    assert data["meeting_rooms"] == {}
+    assert data["admins"] == {"admin": "password"}
+    assert data["registrations"] == []
+
+
+def test_cached_reads_do_not_reparse(storage):
+    """Test that repeated reads of an unchanged file are served from the cache"""
+    storage.view()
+    version = storage.version
+    storage.view()
+    storage.load()
+    assert storage.version == version
+
+
+def test_external_change_is_picked_up(storage):
+    """Test that a write by another process invalidates the cache"""
+    storage.view()
+    data = storage.load()
+    data["coworking_spaces"]["1"] = {"name": "External", "capacity": 10}
+    with open(storage.path, "w") as f:
+        json.dump(data, f)
+
+    assert storage.view()["coworking_spaces"]["1"]["name"] == "External"
+
+
+def test_save_updates_cache(storage):
+    """Test that saved data is visible without re-reading the file"""
+    data = storage.load()
+    data["meeting_rooms"]["1"] = {"name": "Room", "capacity": 4}
+    storage.save(data)
+    version = storage.version
+
+    assert storage.view()["meeting_rooms"]["1"]["name"] == "Room"
+    assert storage.version == version
+
+
+def test_load_returns_private_copy(storage):
+    """Test that mutating loaded data does not leak into the cache"""
+    data = storage.load()
+    data["admins"]["intruder"] = "secret"
+    assert "intruder" not in storage.view()["admins"]
+
+
+def test_view_is_read_only(storage):
+    """Test that the view wraps nested containers and rejects mutation"""
+    view = storage.view()
+    assert isinstance(view, ReadOnlyDict)
+    assert isinstance(view["registrations"], ReadOnlyList)
+    assert isinstance(view["admins"], ReadOnlyDict)
+    with pytest.raises(TypeError):
+        view["admins"]["intruder"] = "secret"
+
+
+def test_save_is_atomic(storage, tmp_path):
+    """Test that saving replaces the file without leaving temporary files"""
+    data = storage.load()
+    data["meeting_rooms"]["1"] = {"name": "Room", "capacity": 4}
+    storage.save(data)
+
+    assert not list(tmp_path.glob("*.tmp"))
+    with open(storage.path) as f:
+        assert json.load(f)["meeting_rooms"]["1"]["name"] == "Room"
+
+
+def test_save_keeps_file_mode(tmp_path):
+    """Test that saving keeps the permissions of the data file"""
+    storage = JsonStorage(tmp_path / "data.json")
+    storage.init()
+    assert stat.S_IMODE(os.stat(storage.path).st_mode) == 0o666 & ~UMASK
+
+    os.chmod(storage.path, 0o640)
+    storage.save(storage.load())
+    assert stat.S_IMODE(os.stat(storage.path).st_mode) == 0o640
+
+
+def test_failed_save_keeps_previous_file(storage, tmp_path):
+    """Test that a failing write leaves the previous data file intact"""
+    data = storage.load()
+    data["meeting_rooms"]["1"] = {"name": object()}  # not JSON serializable
+    with pytest.raises(TypeError):
+        storage.save(data)
+
+    assert not list(tmp_path.glob("*.tmp"))
+    with open(storage.path) as f:
+        assert json.load(f)["meeting_rooms"] == {}
+    assert storage.view()["meeting_rooms"] == {}
+
+
+def test_write_behind_coalesces_saves(tmp_path):
+    """Test that write-behind saves are merged into a single flush"""
+    storage = JsonStorage(tmp_path / "data.json", flush_interval=60)
+    storage.init()
+    for occupancy in range(5):
+        data = storage.load()
+        data["meeting_rooms"]["1"] = {"name": "Room", "current_occupancy": occupancy}
+        storage.save(data)
+
+    # Readers in this process see the latest save before it is flushed
+    assert storage.view()["meeting_rooms"]["1"]["current_occupancy"] == 4
+    with open(storage.path) as f:
+        assert json.load(f)["meeting_rooms"] == {}
+
+    storage.flush()
+    with open(storage.path) as f:
+        assert json.load(f)["meeting_rooms"]["1"]["current_occupancy"] == 4
+
+
+def test_flush_without_saves_takes_no_lock(tmp_path):
+    """Test that flushing with nothing pending doesn't create the lock file"""
+    storage = JsonStorage(tmp_path / "data.json")
+    storage.flush()
+    assert not os.path.exists(storage.lock_path)
+
+
+def test_write_behind_flushes_after_interval(tmp_path):
+    """Test that write-behind saves reach the disk within the flush interval"""
+    storage = JsonStorage(tmp_path / "data.json", flush_interval=0.05)
+    storage.init()
+    data = storage.load()
+    data["meeting_rooms"]["1"] = {"name": "Room"}
+    storage.save(data)
+
+    storage._timer.join(1)
+    with open(storage.path) as f:
+        assert json.load(f)["meeting_rooms"]["1"]["name"] == "Room"
@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import app as app_module
+from tests.conftest import make_registration
+from timeseries import TimeSeriesStore, bucket_bounds
+
+
+def ts(text):
+    return int(datetime.fromisoformat(text).replace(tzinfo=timezone.utc).timestamp())
+
+
+def test_bucket_bounds():
+    """Test hour, day, Monday week and calendar month buckets"""
+    start, end = ts("2025-01-30T10:20"), ts("2025-03-02T00:00")
+    assert bucket_bounds(start, end, "month") == [
+        ts("2025-01-01"),
+        ts("2025-02-01"),
+        ts("2025-03-01"),
+        ts("2025-04-01"),
+    ]
+    assert bucket_bounds(start, end, "week")[:2] == [ts("2025-01-27"), ts("2025-02-03")]
+    assert bucket_bounds(start, start + 1, "hour") == [
+        ts("2025-01-30T10:00"),
+        ts("2025-01-30T11:00"),
+    ]
+    assert len(bucket_bounds(start, end, "day")) == 32
+    with pytest.raises(ValueError):
+        bucket_bounds(start, end, "hour", max_buckets=100)
+
+
+def test_append_and_history(history, tmp_path):
+    """Test min/max/avg per bucket, carried over values and sorted timestamps"""
+    for time, value in (
+        ("2025-10-06T09:00", 4),
+        ("2025-10-06T12:00", 10),
+        ("2025-10-06T18:00", 1),
+        ("2025-10-08T09:30", 6),
+    ):
+        history.append("1", value, ts(time))
+    # Never before the last change
+    assert history.append("1", 3, ts("2025-10-08T09:00")) == ts("2025-10-08T09:30")
+    assert history.latest("1") == (ts("2025-10-08T09:30"), 3)
+
+    points = history.history("1", ts("2025-10-06"), ts("2025-10-09"), "day")
+    assert points == [
+        {
+            "start": "2025-10-06T00:00:00+00:00",
+            "min": 1,
+            "max": 10,
+            "avg": 5.0,
+            "count": 3,
+        },
+        # No changes: the value held all day
+        {
+            "start": "2025-10-07T00:00:00+00:00",
+            "min": 1,
+            "max": 1,
+            "avg": 1.0,
+            "count": 0,
+        },
+        # The value held at midnight counts too
+        {
+            "start": "2025-10-08T00:00:00+00:00",
+            "min": 1,
+            "max": 6,
+            "avg": 10 / 3,
+            "count": 2,
+        },
+    ]
+    (week,) = history.history("1", ts("2025-10-07"), ts("2025-10-08"), "week")
+    assert (week["min"], week["max"], week["count"]) == (1, 10, 5)
+
+    # Nothing before the first change, nothing for an unknown key
+    assert history.history("1", ts("2025-10-01"), ts("2025-10-05"), "day") == []
+    assert history.history("2", ts("2025-10-01"), ts("2025-10-09"), "day") == []
+    with pytest.raises(ValueError):
+        history.history("../1", ts("2025-10-01"), ts("2025-10-09"), "day")
+
+    # Another store (worker) reads the same files, and a torn append is cut off
+    with open(tmp_path / "occupancy" / "1.v", "ab") as values:
+        values.write(b"\x07\x00")
+    other = TimeSeriesStore(tmp_path / "occupancy")
+    assert other.latest("1") == (ts("2025-10-08T09:30"), 3)
+    other.append("1", 5, ts("2025-10-09T00:00"))
+    assert history.latest("1") == (ts("2025-10-09T00:00"), 5)
+    # The summary of an hour read before takes later changes of that hour
+    history.append("1", 9, ts("2025-10-09T00:10"))
+    (day,) = history.history("1", ts("2025-10-09"), ts("2025-10-10"), "day")
+    assert (day["min"], day["max"], day["avg"], day["count"]) == (5, 9, 7.0, 2)
+
+
+def test_occupancy_changes_are_recorded(client, storage, history):
+    """Test that new spaces, occupancy updates and registrations are recorded"""
+    client.post("/add_space", data={"name": "A", "location": "L", "capacity": "10"})
+    client.post("/update_occupancy/1", data={"occupancy": "7"})
+    client.post("/update_occupancy/1", data={"occupancy": "70"})
+    client.post(
+        "/add_meeting_room", data={"name": "B", "location": "L", "capacity": "6"}
+    )
+    storage.add_registration(make_registration("mr_1", is_meeting_room=True))
+    app_module.registration_added(storage.list_registrations()[-1])
+
+    assert list(history._caught_up("1").values) == [0, 7]
+    assert list(history._caught_up("mr_1").values) == [0, 1]
+
+
+def test_history_api(client, storage, history):
+    """Test the occupancy history endpoint and its errors"""
+    history.extend("1", [ts("2025-09-30T12:00"), ts("2025-10-06T12:00")], [2, 8])
+    client.post("/add_space", data={"name": "A", "location": "L", "capacity": "10"})
+
+    rv = client.get("/api/occupancy/1?bucket=week&from=2025-09-29&to=2025-10-12")
+    assert rv.status_code == 200
+    assert rv.json["capacity"] == 10
+    assert [(point["min"], point["max"]) for point in rv.json["points"]] == [
+        (2, 2),
+        (2, 8),
+    ]
+    rv = client.get("/api/occupancy/1?bucket=month&to=2025-12-31")
+    assert rv.json["from"] == "2025-01-01"
+    assert [point["start"][:10] for point in rv.json["points"]] == [
+        "2025-09-01",
+        "2025-10-01",
+        "2025-11-01",
+        "2025-12-01",
+    ]
+    # Recorded just now, when the space was added
+    assert client.get("/api/occupancy/1").json["points"][-1]["count"] == 1
+
+    assert client.get("/api/occupancy/9").status_code == 404
+    assert client.get("/api/occupancy/mr_9").status_code == 404
+    for query in (
+        "bucket=year",
+        "from=2025-13-01",
+        "from=2025-10-07&to=2025-10-06",
+        "bucket=hour&from=2024-01-01&to=2025-01-01",
+    ):
+        rv = client.get(f"/api/occupancy/1?{query}")
+        assert rv.status_code == 400, query
+        assert rv.json["error"]
@@ -0,0 +1,261 @@
+"""
+Append-only occupancy history of spaces and meeting rooms.
+
+Every occupancy change of a space (or meeting room, ``mr_<id>``) is appended
+to two column files of its own: ``<key>.t`` holds the timestamps (Unix
+seconds, int64) and ``<key>.v`` the new values (int32), in native byte order.
+Writers in any process append under a lock on the timestamp file and never
+let time go backwards, so the timestamps stay sorted.
+
+In memory a series is the same two columns as arrays (``array.array``), read
+with ``frombytes`` and then extended with whatever was appended since (by this
+or another worker); a year of minute-by-minute changes takes 6 MB. ``history``
+downsamples a time range into hour, day, week or calendar month buckets. As
+those are all whole hours, a series also keeps the ``min``, ``max`` and
+``sum`` of every hour, updated as changes are read, and buckets are reduced
+from these: a year by day merges 8760 hourly summaries rather than half a
+million changes, and the response has a point per bucket, not per change.
+
+The history isn't fsynced: a crash may lose the last changes, but a torn
+append is cut off before the next one.
+"""
+
+import os
+import pathlib
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+from storage import lock_file
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+BUCKETS = ("hour", "day", "week", "month")
+
+HOUR = 60 * 60
+
+_KEY = re.compile(r"^[\w-]+$")
+
+
+class Series:
+    """
+    The timestamp and value columns of one key read so far, and the ``min``,
+    ``max`` and ``sum`` of the values of every hour with changes.
+    """
+
+    __slots__ = ("timestamps", "values", "hours", "mins", "maxs", "sums")
+
+    def __init__(self):
+        self.timestamps = array("q")
+        self.values = array("i")
+        self.hours = array("q")
+        self.mins = array("i")
+        self.maxs = array("i")
+        self.sums = array("q")
+
+    def extend(self, timestamps, values):
+        """Add the changes read from the column files (``bytes``)."""
+        index = len(self.timestamps)
+        self.timestamps.frombytes(timestamps)
+        self.values.frombytes(values)
+        if self.hours and self.timestamps[index] < self.hours[-1] + HOUR:
+            # The last hour has more changes now
+            index = bisect_left(self.timestamps, self.hours.pop())
+            del self.mins[-1], self.maxs[-1], self.sums[-1]
+        while index < len(self.timestamps):
+            hour = self.timestamps[index] // HOUR * HOUR
+            end = bisect_left(self.timestamps, hour + HOUR, index)
+            changes = self.values[index:end]
+            self.hours.append(hour)
+            self.mins.append(min(changes))
+            self.maxs.append(max(changes))
+            self.sums.append(sum(changes))
+            index = end
+
+    def summary(self, start, end):
+        """
+        Return the ``min``, ``max`` and ``sum`` of the values recorded from
+        ``start`` to ``end`` (whole hours), or None if there are none.
+        """
+        first = bisect_left(self.hours, start)
+        last = bisect_left(self.hours, end, first)
+        if first == last:
+            return None
+        return (
+            min(self.mins[first:last]),
+            max(self.maxs[first:last]),
+            sum(self.sums[first:last]),
+        )
+
+
+def bucket_bounds(start, end, bucket, max_buckets=None):
+    """
+    Return the timestamps at which the ``bucket`` periods (in UTC) covering
+    ``start`` to ``end`` (timestamps) start, followed by the end of the last.
+    Raises ValueError for more than ``max_buckets`` periods.
+    """
+    moment = datetime.fromtimestamp(start, timezone.utc)
+    if bucket == "hour":
+        moment = moment.replace(minute=0, second=0, microsecond=0)
+    else:
+        moment = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "week":
+        moment -= timedelta(days=moment.weekday())
+    elif bucket == "month":
+        moment = moment.replace(day=1)
+    step = {"hour": timedelta(hours=1), "day": timedelta(days=1)}.get(
+        bucket, timedelta(weeks=1)
+    )
+
+    bounds = [int(moment.timestamp())]
+    while bounds[-1] < end:
+        if bucket == "month":
+            moment = (moment + timedelta(days=32)).replace(day=1)
+        else:
+            moment += step
+        bounds.append(int(moment.timestamp()))
+        if max_buckets is not None and len(bounds) > max_buckets + 1:
+            raise ValueError(f"A history has at most {max_buckets} {bucket}s")
+    return bounds
+
+
+class TimeSeriesStore:
+    """Occupancy series by key, kept in column files under ``directory``."""
+
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, key):
+        if not _KEY.match(key):
+            raise ValueError(f"Invalid series key: {key!r}")
+        return self.directory / f"{key}.t", self.directory / f"{key}.v"
+
+    def append(self, key, value, timestamp=None):
+        """
+        Record ``value`` for ``key`` at ``timestamp`` (default now, and never
+        before the last change recorded) and return the timestamp used.
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        return self.extend(key, [timestamp], [value])
+
+    def extend(self, key, timestamps, values):
+        """
+        Record the ``values`` of ``key`` at ``timestamps`` (sorted) in one
+        write, moving any before the last change recorded up to it. Returns
+        the last timestamp used.
+        """
+        timestamps = array("q", timestamps)
+        values = array("i", values)
+        times_path, values_path = self._paths(key)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(times_path, "a+b") as times_file, open(
+            values_path, "a+b"
+        ) as values_file:
+            if fcntl is not None:
+                lock_file(times_file)
+            count = min(
+                times_file.seek(0, os.SEEK_END) // 8,
+                values_file.seek(0, os.SEEK_END) // 4,
+            )
+            # Cut off a torn append (e.g. a crash between the two writes)
+            times_file.truncate(count * 8)
+            values_file.truncate(count * 4)
+            if count:
+                times_file.seek((count - 1) * 8)
+                last = array("q", times_file.read(8))[0]
+                for index, timestamp in enumerate(timestamps):
+                    if timestamp >= last:
+                        break
+                    timestamps[index] = last
+            values_file.write(values.tobytes())
+            values_file.flush()
+            times_file.write(timestamps.tobytes())
+            times_file.flush()
+        return timestamps[-1]
+
+    def _caught_up(self, key):
+        """Return the series of ``key`` with the changes appended since it was read."""
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = Series()
+        times_path, values_path = self._paths(key)
+        known = len(series.timestamps)
+        try:
+            with open(times_path, "rb") as times, open(values_path, "rb") as values:
+                # Only changes of which both columns are complete
+                count = min(
+                    os.fstat(times.fileno()).st_size // 8,
+                    os.fstat(values.fileno()).st_size // 4,
+                )
+                if count > known:
+                    times.seek(known * 8)
+                    values.seek(known * 4)
+                    series.extend(
+                        times.read((count - known) * 8),
+                        values.read((count - known) * 4),
+                    )
+        except FileNotFoundError:
+            pass
+        return series
+
+    def history(self, key, start, end, bucket, max_buckets=None):
+        """
+        Return the occupancy of ``key`` from ``start`` to ``end`` (timestamps)
+        in ``bucket`` periods, oldest first: the ``min``, ``max`` and mean
+        (``avg``) of the values recorded in each period and of the value held
+        when it starts, and the number of changes (``count``). Periods before
+        the first change are left out. Raises ValueError for an unknown
+        ``bucket`` or more than ``max_buckets`` periods.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+        bounds = bucket_bounds(start, end, bucket, max_buckets)
+        points = []
+        with self._lock:
+            series = self._caught_up(key)
+            timestamps, values = series.timestamps, series.values
+            first = bisect_left(timestamps, bounds[0])
+            held = values[first - 1] if first else None
+            for low, high in zip(bounds, bounds[1:]):
+                last = bisect_left(timestamps, high, first)
+                if last > first:
+                    lowest, highest, total = series.summary(low, high)
+                    samples = last - first
+                else:
+                    lowest, highest, total, samples = held, held, 0, 0
+                if held is not None and (samples == 0 or timestamps[first] > low):
+                    lowest, highest = min(lowest, held), max(highest, held)
+                    total += held
+                    samples += 1
+                if samples:
+                    points.append(
+                        {
+                            "start": datetime.fromtimestamp(
+                                low, timezone.utc
+                            ).isoformat(),
+                            "min": lowest,
+                            "max": highest,
+                            "avg": total / samples,
+                            "count": last - first,
+                        }
+                    )
+                if last > first:
+                    held = values[last - 1]
+                first = last
+        return points
+
+    def latest(self, key):
+        """Return the ``(timestamp, value)`` of the last change of ``key``, or None."""
+        with self._lock:
+            series = self._caught_up(key)
+            if not series.timestamps:
+                return None
+            return series.timestamps[-1], series.values[-1]